@@ -0,0 +1,95 @@
+"""
+Per-call cost of the hot queries: SQLAlchemy text() path vs raw asyncpg
+with named prepared statements (POSTGRES_HOT_PATH).
+
+    python -m benchmarks.bench_hot_path [--calls 2000] [--no-cache] [--json]
+
+Calls the service functions directly (no HTTP) on one connection at a
+time, alternating both paths over the same sampled (user, lesson) targets
+from POSTGRES_URL. Reports wall time and client CPU per call. `upsert`
+writes "seen" progress for the sampled users, run it on generated data
+(benchmarks.generate), not on data you care about.
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+from src.services import hot_path, lessons, postgres
+from benchmarks.loadtest import sample_targets
+
+OPERATIONS = {
+    "get_lesson": lambda db, t: lessons.get_lesson_json(
+        db, t["tenant_id"], t["user_id"], t["lesson_id"]
+    ),
+    "list_lessons": lambda db, t: lessons.list_lessons(
+        db, t["tenant_id"], t["user_id"], 0, 50
+    ),
+    "upsert": lambda db, t: lessons.upsert_progress(
+        db, t["tenant_id"], t["user_id"], t["lesson_id"], random.choice(t["block_ids"]), "seen"
+    ),
+}
+
+
+async def measure(db, operation, targets: list[dict], calls: int, cache: bool) -> dict:
+    wall = cpu = 0.0
+    for i in range(calls):
+        target = targets[i % len(targets)]
+        if not cache:
+            lessons.skeleton_cache.clear()
+        started, started_cpu = time.perf_counter(), time.process_time()
+        await operation(db, target)
+        wall += time.perf_counter() - started
+        cpu += time.process_time() - started_cpu
+    return {
+        "wall_us": round(wall / calls * 1e6, 1),
+        "cpu_us": round(cpu / calls * 1e6, 1),
+    }
+
+
+async def run(args) -> dict:
+    db = postgres.create_engine()
+    results = {}
+    try:
+        targets = await sample_targets(db, args.targets)
+        for name, operation in OPERATIONS.items():
+            if args.operations and name not in args.operations:
+                continue
+            results[name] = {}
+            # warm both paths first (pool, prepared statements, skeleton cache)
+            for hot in (False, True, False, True):
+                hot_path.conf.POSTGRES_HOT_PATH = hot
+                label = "asyncpg" if hot else "sqlalchemy"
+                warm = label not in results[name]
+                result = await measure(
+                    db, operation, targets, max(args.calls // 10, 1) if warm else args.calls,
+                    not args.no_cache,
+                )
+                results[name][label] = None if warm else result
+    finally:
+        await db.dispose()
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--calls", type=int, default=2000)
+    parser.add_argument("--targets", type=int, default=200)
+    parser.add_argument("--operations", nargs="*", choices=OPERATIONS)
+    parser.add_argument("--no-cache", action="store_true", help="clear the skeleton cache before each call")
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    args = parser.parse_args()
+
+    results = asyncio.run(run(args))
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    print(f"{'operation':<14}{'path':<12}{'wall us/call':>14}{'cpu us/call':>14}")
+    for name, paths in results.items():
+        for label, r in paths.items():
+            print(f"{name:<14}{label:<12}{r['wall_us']:>14}{r['cpu_us']:>14}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,202 @@
+"""
+user_block_progress before and after partitioning: statement latency under
+concurrency, table and index sizes, and VACUUM time after a write burst.
+
+    python -m benchmarks.bench_partitioning --label before
+    python -m src.commands.progress_partitioning prepare ...   # see benchmarks/README.md
+    python -m benchmarks.bench_partitioning --label after --compare benchmarks/results/<before>.json
+
+Calls the service functions directly (no HTTP) from --concurrency tasks
+over (user, lesson) targets sampled from POSTGRES_URL: `upsert` writes
+"seen" progress, `get_lesson` reads a lesson with its progress summary
+(skeleton cache cleared before each call, so every call queries). The
+burst then rewrites the progress rows of --burst-users users and every
+leaf table is vacuumed on its own, as autovacuum does: "vacuum_max_s" is
+the longest single VACUUM, the one that holds back a worker. Run it on
+generated data (benchmarks.generate), it writes progress.
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncEngine
+from src.services import lessons, postgres, progress_partitioning
+from benchmarks.loadtest import git_commit, sample_targets, summarize
+
+OPERATIONS = {
+    "get_lesson": lambda db, t: lessons.get_lesson_json(
+        db, t["tenant_id"], t["user_id"], t["lesson_id"]
+    ),
+    "upsert": lambda db, t: lessons.upsert_progress(
+        db, t["tenant_id"], t["user_id"], t["lesson_id"], random.choice(t["block_ids"]), "seen"
+    ),
+}
+
+LEAVES_SQL = text(
+    """
+    SELECT c.oid::regclass::text AS name,
+           pg_table_size(c.oid) AS table_bytes,
+           pg_indexes_size(c.oid) AS index_bytes,
+           greatest(c.reltuples, 0)::bigint AS rows
+    FROM (
+        -- the partitions, or the table itself when it is not partitioned
+        SELECT relid FROM pg_partition_tree('user_block_progress')
+        UNION SELECT 'user_block_progress'::regclass
+    ) t
+    JOIN pg_class c ON c.oid = t.relid
+    WHERE c.relkind = 'r'
+    """
+)
+
+BURST_SQL = text(
+    """
+    UPDATE user_block_progress SET updated_at = now()
+    WHERE user_id IN (SELECT id FROM users ORDER BY random() LIMIT :users)
+    """
+)
+
+
+async def measure(db: AsyncEngine, operation, targets: list[dict], calls: int, concurrency: int) -> dict:
+    latencies = []
+    errors = 0
+    remaining = [calls]
+
+    async def worker():
+        nonlocal errors
+        while remaining[0] > 0:
+            remaining[0] -= 1
+            target = random.choice(targets)
+            lessons.skeleton_cache.clear()
+            started = time.perf_counter()
+            try:
+                await operation(db, target)
+            except Exception:
+                errors += 1
+                continue
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return summarize(latencies, errors, time.perf_counter() - started)
+
+
+async def leaves(db: AsyncEngine) -> list[dict]:
+    async with db.connect() as conn:
+        return [dict(r) for r in (await conn.execute(LEAVES_SQL)).mappings()]
+
+
+async def vacuum_after_burst(db: AsyncEngine, users: int) -> dict:
+    async with db.begin() as conn:
+        await conn.execute(text("SET LOCAL statement_timeout = 0"))
+        updated = (await conn.execute(BURST_SQL, {"users": users})).rowcount
+    durations = []
+    async with db.connect() as conn:
+        conn = await conn.execution_options(isolation_level="AUTOCOMMIT")
+        await conn.execute(text("SET statement_timeout = 0"))
+        for leaf in await leaves(db):
+            started = time.perf_counter()
+            await conn.execute(text(f"VACUUM {leaf['name']}"))
+            durations.append(time.perf_counter() - started)
+    return {
+        "burst_rows": updated,
+        "vacuum_total_s": round(sum(durations), 2),
+        "vacuum_max_s": round(max(durations), 2),
+    }
+
+
+async def run(args) -> dict:
+    db = postgres.create_engine()
+    try:
+        layout = await progress_partitioning.status(db)
+        targets = await sample_targets(db, args.targets)
+        if not targets:
+            raise SystemExit("no users with lessons found; run benchmarks.generate first")
+        operations = {}
+        for name, operation in OPERATIONS.items():
+            await measure(db, operation, targets, max(args.calls // 10, 1), args.concurrency)
+            operations[name] = await measure(db, operation, targets, args.calls, args.concurrency)
+
+        tables = await leaves(db)
+        largest = max(tables, key=lambda t: t["table_bytes"] + t["index_bytes"])
+        storage = {
+            "rows": sum(t["rows"] for t in tables),
+            "table_mb": round(sum(t["table_bytes"] for t in tables) / 2**20, 1),
+            "index_mb": round(sum(t["index_bytes"] for t in tables) / 2**20, 1),
+            "largest_leaf_mb": round((largest["table_bytes"] + largest["index_bytes"]) / 2**20, 1),
+        }
+        vacuum = await vacuum_after_burst(db, args.burst_users) if args.burst_users else {}
+    finally:
+        await db.dispose()
+
+    return {
+        "label": args.label,
+        "git_commit": git_commit(),
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "config": {
+            "calls": args.calls,
+            "concurrency": args.concurrency,
+            "targets": len(targets),
+            "burst_users": args.burst_users,
+            "partitions": layout["partitions"],
+        },
+        "operations": operations,
+        "storage": {**storage, **vacuum},
+    }
+
+
+def print_report(result: dict, baseline: dict | None = None):
+    def cell(value, before):
+        text_ = "-" if value is None else f"{value}"
+        if value is not None and before:
+            text_ += f" ({(value - before) / before:+.0%})"
+        return f"{text_:>18}"
+
+    print(f"{result['label'] or '-'} @ {result['git_commit'] or '-'}  "
+          f"{result['config']['partitions'] or 'no'} partitions, "
+          f"concurrency {result['config']['concurrency']}")
+    columns = ("throughput_rps", "p50_ms", "p95_ms", "p99_ms")
+    print(f"{'operation':<12}" + "".join(f"{c:>18}" for c in columns))
+    for op, summary in result["operations"].items():
+        before = (baseline or {}).get("operations", {}).get(op, {})
+        print(f"{op:<12}" + "".join(cell(summary.get(c), before.get(c)) for c in columns))
+    before = (baseline or {}).get("storage", {})
+    for key, value in result["storage"].items():
+        print(f"{key:<18}" + cell(value, before.get(key)))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--calls", type=int, default=20000, help="timed calls per operation")
+    parser.add_argument("--concurrency", type=int, default=16, help="calls in flight")
+    parser.add_argument("--targets", type=int, default=2000)
+    parser.add_argument("--burst-users", type=int, default=50000,
+                        help="users whose progress is rewritten before VACUUM; 0 to skip")
+    parser.add_argument("--label", default="", help="free-form name stored with the results")
+    parser.add_argument("--output", type=Path, default=Path("benchmarks/results"),
+                        help="JSON file, or directory to write a timestamped file into")
+    parser.add_argument("--compare", type=Path, help="earlier result file to print deltas against")
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    args = parser.parse_args()
+
+    result = asyncio.run(run(args))
+    output = args.output
+    if output.suffix != ".json":
+        stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S")
+        name = "-".join(filter(None, (stamp, result["git_commit"], "partitioning", args.label)))
+        output = output / f"{name}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(result, indent=2) + "\n")
+
+    if args.json:
+        print(json.dumps(result, indent=2))
+    else:
+        print_report(result, json.loads(args.compare.read_text()) if args.compare else None)
+    print(f"saved {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""
+Per-request CPU of the GET lesson response: validated vs pre-encoded.
+
+    python -m benchmarks.bench_serialization [--blocks 10 100 500] [--payload-bytes 2048]
+
+"validated" is the previous path: the service returns a dict and FastAPI
+validates it against `Root` and re-serializes it. "fast" is the current
+path: `lesson_json` joins the skeleton's pre-encoded block fragments.
+Both run through the same in-process ASGI app; no database is needed.
+"""
+import argparse
+import json
+import time
+from fastapi import FastAPI
+from fastapi.responses import Response
+from fastapi.testclient import TestClient
+from src.api.v1.lessons import Root
+from src.services.lessons import build_skeleton, lesson_dict, lesson_json, summarize_progress
+
+
+def make_lesson(blocks: int, payload_bytes: int):
+    rows = [
+        {
+            "block_id": 1000 + i,
+            "block_type": "markdown" if i % 3 else "quiz",
+            "block_position": i + 1,
+            "variant_id": 5000 + i,
+            "variant_tenant_id": 1 if i % 4 == 0 else None,
+            "variant_data": {
+                "markdown": "x" * payload_bytes,
+                "meta": {"tags": ["a", "b", "c"], "weight": i, "draft": False},
+            },
+        }
+        for i in range(blocks)
+    ]
+    skeleton = build_skeleton(rows)
+    progress = {
+        block["id"]: ("completed", "seen", None)[i % 3]
+        for i, block in enumerate(skeleton["blocks"])
+    }
+    lesson = {"id": 100, "slug": "bench", "title": "Benchmark lesson"}
+    summary = summarize_progress(list(progress.items()))
+    return lesson, skeleton, progress, summary
+
+
+def build_app(assembled) -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/validated", response_model=Root, response_model_by_alias=False)
+    async def validated():
+        return lesson_dict(*assembled)
+
+    @app.get("/fast", response_model=Root, response_model_by_alias=False)
+    async def fast():
+        return Response(content=lesson_json(*assembled), media_type="application/json")
+
+    return app
+
+
+def measure(client: TestClient, path: str, requests: int) -> float:
+    client.get(path)  # warm up
+    started = time.process_time()
+    for _ in range(requests):
+        client.get(path)
+    return (time.process_time() - started) / requests
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--blocks", type=int, nargs="+", default=[10, 100, 500])
+    parser.add_argument("--payload-bytes", type=int, default=2048)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    args = parser.parse_args()
+
+    results = []
+    for blocks in args.blocks:
+        assembled = make_lesson(blocks, args.payload_bytes)
+        with TestClient(build_app(assembled)) as client:
+            assert client.get("/validated").json() == client.get("/fast").json()
+            validated = measure(client, "/validated", args.requests)
+            fast = measure(client, "/fast", args.requests)
+        results.append({
+            "blocks": blocks,
+            "payload_bytes": args.payload_bytes,
+            "validated_ms": round(validated * 1000, 3),
+            "fast_ms": round(fast * 1000, 3),
+            "saved_ms": round((validated - fast) * 1000, 3),
+            "speedup": round(validated / fast, 2),
+        })
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    print(f"{'blocks':>7} {'validated ms':>13} {'fast ms':>9} {'saved ms':>9} {'speedup':>8}")
+    for r in results:
+        print(
+            f"{r['blocks']:>7} {r['validated_ms']:>13} {r['fast_ms']:>9} "
+            f"{r['saved_ms']:>9} {r['speedup']:>7}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+"""
+Memory and hit rate of lesson skeleton caching with N worker processes:
+per-process caches only vs a per-process cache over the shared-memory tier.
+
+    python -m benchmarks.bench_shm_cache [--workers 1 4 8] [--lessons 2000] [--lookups 20000]
+
+Each worker looks up lessons with a skewed (Zipf-like) popularity, as
+`get_lesson_skeleton` does: process cache, then (shared mode) the shared
+segment, else a fill, which builds the skeleton from generated rows in
+place of the database query. "fills" is the number of those queries over
+all workers. Memory is measured per worker at the end: RSS counts every
+shared page a worker touched, PSS splits shared pages between the workers
+mapping them, so the PSS sum is the host's footprint. Linux only.
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import random
+import tempfile
+import orjson
+from src.services.lessons import build_skeleton, skeleton_from_blocks
+from src.utils.cache import LRUCache
+from src.utils.shm_cache import SharedCache
+
+
+def lesson_rows(lesson_id: int, blocks: int, payload_bytes: int) -> list[dict]:
+    return [
+        {
+            "block_id": lesson_id * 1000 + i,
+            "block_type": "markdown" if i % 3 else "quiz",
+            "block_position": i + 1,
+            "variant_id": lesson_id * 1000 + i,
+            "variant_tenant_id": None,
+            "variant_data": {"markdown": f"{lesson_id}-{i}-" + "x" * payload_bytes},
+        }
+        for i in range(blocks)
+    ]
+
+
+def memory_kb() -> dict:
+    with open("/proc/self/smaps_rollup") as f:
+        fields = dict(line.split(":", 1) for line in f if ":" in line)
+    return {name: int(fields[name].split()[0]) for name in ("Rss", "Pss")}
+
+
+def worker(mode: str, index: int, args, path: str, results) -> None:
+    rng = random.Random(index)
+    weights = [1 / (rank + 1) for rank in range(args.lessons)]
+    local = LRUCache(maxsize=args.process_entries if mode == "process" else args.l1_entries, ttl=3600)
+    shared = SharedCache(path, args.shared_bytes) if mode == "shared" else None
+    fills = shared_hits = 0
+
+    for lesson_id in rng.choices(range(args.lessons), weights, k=args.lookups):
+        key = (1, lesson_id)
+        if local.get(key, version=1) is not None:
+            continue
+        if shared is not None:
+            blob = shared.get(key, 1)
+            if blob is not None:
+                shared_hits += 1
+                local.set(key, skeleton_from_blocks(orjson.loads(blob)), version=1)
+                continue
+        skeleton = build_skeleton(lesson_rows(lesson_id, args.blocks, args.payload_bytes))
+        fills += 1
+        local.set(key, skeleton, version=1)
+        if shared is not None:
+            shared.set(key, 1, orjson.dumps(skeleton["blocks"]))
+
+    results.put({"fills": fills, "local_hits": local.hits, "shared_hits": shared_hits, **memory_kb()})
+
+
+def run(mode: str, workers: int, args) -> dict:
+    ctx = multiprocessing.get_context("spawn")
+    results = ctx.Queue()
+    with tempfile.TemporaryDirectory(dir="/dev/shm") as directory:
+        path = os.path.join(directory, "bench")
+        processes = [
+            ctx.Process(target=worker, args=(mode, i, args, path, results)) for i in range(workers)
+        ]
+        for process in processes:
+            process.start()
+        stats = [results.get() for _ in processes]
+        for process in processes:
+            process.join()
+
+    lookups = workers * args.lookups
+    fills = sum(s["fills"] for s in stats)
+    return {
+        "mode": mode,
+        "workers": workers,
+        "fills": fills,
+        "hit_rate": round(1 - fills / lookups, 4),
+        "shared_hit_rate": round(sum(s["shared_hits"] for s in stats) / lookups, 4),
+        "rss_mb_per_worker": round(sum(s["Rss"] for s in stats) / workers / 1024, 1),
+        "pss_mb_total": round(sum(s["Pss"] for s in stats) / 1024, 1),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 4, 8])
+    parser.add_argument("--lessons", type=int, default=2000)
+    parser.add_argument("--lookups", type=int, default=20000, help="per worker")
+    parser.add_argument("--blocks", type=int, default=20)
+    parser.add_argument("--payload-bytes", type=int, default=1024)
+    parser.add_argument("--process-entries", type=int, default=1024, help="process cache size, process mode")
+    parser.add_argument("--l1-entries", type=int, default=64, help="process cache size, shared mode")
+    parser.add_argument("--shared-bytes", type=int, default=64 << 20)
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    args = parser.parse_args()
+
+    results = [run(mode, workers, args) for workers in args.workers for mode in ("process", "shared")]
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(f"{'mode':>8} {'workers':>7} {'fills':>7} {'hit rate':>8} {'shared':>7} {'RSS/worker MB':>13} {'PSS total MB':>12}")
+    for r in results:
+        print(
+            f"{r['mode']:>8} {r['workers']:>7} {r['fills']:>7} {r['hit_rate']:>8.1%} "
+            f"{r['shared_hit_rate']:>7.1%} {r['rss_mb_per_worker']:>13} {r['pss_mb_total']:>12}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,228 @@
+"""
+Synthetic large-tenant dataset for local load testing.
+
+    python -m benchmarks.generate --preset large --yes
+    python -m benchmarks.generate --preset small --tenants 50 --override-share 0.3 --yes
+
+DESTRUCTIVE: truncates every table in POSTGRES_URL before generating.
+Everything is generated server-side with set-based SQL (generate_series),
+so the large preset (2k tenants, 1M users, ~7M lesson_blocks) runs in
+minutes on a laptop.
+
+Shape of the data:
+- users are spread evenly over tenants, lessons per tenant are fixed
+- lessons have between --min-blocks and --max-blocks blocks, skewed
+  towards short lessons, drawn from a shared pool of blocks
+- every block has a default variant; --override-share of the
+  (tenant, block) pairs in use get a tenant override
+- --active-share of users have progress, on lessons picked with a
+  power-law skew (a few hot lessons per tenant), as a prefix of the
+  lesson: completed first, then seen
+"""
+import argparse
+import asyncio
+import logging
+import time
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncConnection
+from src.services import postgres
+
+logger = logging.getLogger("benchmarks.generate")
+
+PRESETS = {
+    "small": {"tenants": 20, "users": 10_000, "lessons_per_tenant": 10, "blocks": 2_000},
+    "medium": {"tenants": 200, "users": 100_000, "lessons_per_tenant": 20, "blocks": 10_000},
+    "large": {"tenants": 2_000, "users": 1_000_000, "lessons_per_tenant": 20, "blocks": 20_000},
+}
+
+STEPS = [
+    ("tenants", """
+        INSERT INTO tenants (id, name)
+        SELECT g, 'Tenant ' || g
+        FROM generate_series(1, {tenants}) g
+    """),
+    ("users", """
+        INSERT INTO users (id, tenant_id, email)
+        SELECT g, 1 + g % {tenants}, 'user' || g || '@example.test'
+        FROM generate_series(1, {users}) g
+    """),
+    ("blocks", """
+        INSERT INTO blocks (id, block_type)
+        SELECT g, (ARRAY['markdown', 'quiz', 'video', 'code'])[1 + g % 4]
+        FROM generate_series(1, {blocks}) g
+    """),
+    ("default variants", """
+        INSERT INTO block_variants (block_id, tenant_id, data)
+        SELECT g, NULL, jsonb_build_object(
+            'markdown', repeat('lorem ipsum ', {payload_bytes} / 12),
+            'block', g,
+            'tags', jsonb_build_array('generated', 'default')
+        )
+        FROM generate_series(1, {blocks}) g
+    """),
+    ("lessons", """
+        INSERT INTO lessons (tenant_id, slug, title)
+        SELECT t, 'lesson-' || n, 'Lesson ' || n
+        FROM generate_series(1, {tenants}) t, generate_series(1, {lessons_per_tenant}) n
+    """),
+    ("lesson_blocks", """
+        INSERT INTO lesson_blocks (lesson_id, block_id, position)
+        SELECT s.id, 1 + (s.start + p) % {blocks}, p + 1
+        FROM (
+            SELECT
+                id,
+                floor(random() * {blocks})::int AS start,
+                least(
+                    {min_blocks} + floor(power(random(), 2) * ({max_blocks} - {min_blocks} + 1))::int,
+                    {blocks}
+                ) AS n
+            FROM lessons
+        ) s
+        CROSS JOIN LATERAL generate_series(0, s.n - 1) p
+    """),
+    ("block counts", """
+        UPDATE lessons l
+        SET block_count = c.n
+        FROM (SELECT lesson_id, count(*) AS n FROM lesson_blocks GROUP BY lesson_id) c
+        WHERE c.lesson_id = l.id
+    """),
+    ("tenant overrides", """
+        INSERT INTO block_variants (block_id, tenant_id, data)
+        SELECT DISTINCT lb.block_id, l.tenant_id, jsonb_build_object(
+            'markdown', repeat('tenant override ', {payload_bytes} / 16),
+            'block', lb.block_id,
+            'tenant', l.tenant_id
+        )
+        FROM lesson_blocks lb
+        JOIN lessons l ON l.id = lb.lesson_id
+        WHERE random() < {override_share}
+        ON CONFLICT (block_id, tenant_id) DO NOTHING
+    """),
+    ("resolved variants", """
+        INSERT INTO resolved_block_variant (tenant_id, block_id, variant_id)
+        SELECT tenant_id, block_id, variant_id FROM resolved_block_variant_expected
+    """),
+    ("progress", """
+        WITH picks AS (
+            SELECT
+                u.id AS user_id,
+                u.tenant_id,
+                1 + floor(power(random(), 3) * {lessons_per_tenant})::int AS lesson_no,
+                random() AS depth
+            FROM users u
+            CROSS JOIN LATERAL generate_series(
+                1, 1 + floor(random() * {max_lessons_per_user})::int + 0 * u.id
+            ) k
+            WHERE random() < {active_share}
+        ),
+        lesson_picks AS (
+            SELECT DISTINCT ON (p.user_id, l.id)
+                p.user_id, l.id AS lesson_id, l.block_count, p.depth
+            FROM picks p
+            JOIN lessons l ON l.tenant_id = p.tenant_id AND l.slug = 'lesson-' || p.lesson_no
+        )
+        INSERT INTO user_block_progress (user_id, lesson_id, block_id, status, updated_at)
+        SELECT
+            lp.user_id,
+            lp.lesson_id,
+            lb.block_id,
+            CASE WHEN lb.position <= lp.block_count * lp.depth * 0.7 THEN 'completed' ELSE 'seen' END,
+            now() - random() * interval '90 days'
+        FROM lesson_picks lp
+        JOIN lesson_blocks lb
+            ON lb.lesson_id = lp.lesson_id
+           AND lb.position <= ceil(lp.block_count * lp.depth)
+    """),
+    ("progress rollups", """
+        INSERT INTO user_lesson_progress (
+            user_id, lesson_id, seen_count, completed_count,
+            last_seen_position, last_seen_block_id, completed, updated_at
+        )
+        SELECT
+            user_id, lesson_id, seen_count, completed_count,
+            last_seen_position, last_seen_block_id, completed, updated_at
+        FROM user_lesson_progress_expected
+    """),
+    ("sequences", """
+        SELECT
+            setval(pg_get_serial_sequence('tenants', 'id'), (SELECT max(id) FROM tenants)),
+            setval(pg_get_serial_sequence('users', 'id'), (SELECT max(id) FROM users)),
+            setval(pg_get_serial_sequence('blocks', 'id'), (SELECT max(id) FROM blocks)),
+            setval(pg_get_serial_sequence('lessons', 'id'), (SELECT max(id) FROM lessons)),
+            setval(pg_get_serial_sequence('block_variants', 'id'), (SELECT max(id) FROM block_variants))
+    """),
+]
+
+
+async def run_step(conn: AsyncConnection, name: str, sql: str, params: dict) -> None:
+    # params are numbers validated by argparse, inlined so they are typed by context
+    started = time.perf_counter()
+    result = await conn.execute(text(sql.format(**params)))
+    logger.info("%-18s %10s rows  %6.1fs", name, result.rowcount, time.perf_counter() - started)
+
+
+async def generate(params: dict) -> None:
+    db = postgres.create_engine()
+    try:
+        async with db.connect() as conn:
+            conn = await conn.execution_options(isolation_level="AUTOCOMMIT")
+            await conn.execute(text("SET statement_timeout = 0"))
+            try:
+                # skip per-row triggers (and FK checks); rollups and resolved variants are built in bulk
+                await conn.execute(text("SET session_replication_role = replica"))
+            except Exception:
+                logger.warning("cannot disable triggers (needs superuser); generation will be slow")
+
+            await conn.execute(text(
+                "TRUNCATE tenants, blocks RESTART IDENTITY CASCADE"
+            ))
+            for name, sql in STEPS:
+                await run_step(conn, name, sql, params)
+
+            await conn.execute(text("SET session_replication_role = DEFAULT"))
+            await run_step(conn, "analyze", "ANALYZE", {})
+    finally:
+        await db.dispose()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--preset", choices=PRESETS, default="large")
+    parser.add_argument("--tenants", type=int)
+    parser.add_argument("--users", type=int)
+    parser.add_argument("--lessons-per-tenant", type=int)
+    parser.add_argument("--blocks", type=int, help="size of the shared block pool")
+    parser.add_argument("--min-blocks", type=int, default=10, help="blocks per lesson")
+    parser.add_argument("--max-blocks", type=int, default=500, help="blocks per lesson")
+    parser.add_argument("--payload-bytes", type=int, default=1024, help="variant data size")
+    parser.add_argument("--override-share", type=float, default=0.1,
+                        help="share of (tenant, block) pairs with a tenant override")
+    parser.add_argument("--active-share", type=float, default=0.3,
+                        help="share of users with any progress")
+    parser.add_argument("--max-lessons-per-user", type=int, default=3)
+    parser.add_argument("--yes", action="store_true", help="confirm truncating the database")
+    args = parser.parse_args()
+
+    if not args.yes:
+        parser.error("this truncates every table in POSTGRES_URL; pass --yes to confirm")
+
+    params = dict(PRESETS[args.preset])
+    for key in ("tenants", "users", "lessons_per_tenant", "blocks"):
+        if getattr(args, key) is not None:
+            params[key] = getattr(args, key)
+    params.update(
+        min_blocks=args.min_blocks,
+        max_blocks=args.max_blocks,
+        payload_bytes=args.payload_bytes,
+        override_share=args.override_share,
+        active_share=args.active_share,
+        max_lessons_per_user=args.max_lessons_per_user,
+    )
+
+    logging.basicConfig(level=logging.INFO, format="%(message)s", force=True)
+    logger.info("generating %s", params)
+    asyncio.run(generate(params))
+
+
+if __name__ == "__main__":
+    main()
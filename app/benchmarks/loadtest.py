@@ -0,0 +1,334 @@
+"""
+HTTP load benchmark for the lesson endpoints against a running server.
+
+    python -m benchmarks.loadtest --base-url http://localhost:8000 --concurrency 32 --duration 30
+    python -m benchmarks.loadtest --mix get=90,put=10 --label after --compare results/before.json
+
+Run it against data from `benchmarks.generate`. Request targets (tenant,
+user, lesson, blocks) are sampled up front from POSTGRES_URL so the timed
+loop only talks HTTP. Each worker keeps one request in flight; latency is
+measured from send to fully read body.
+
+DB round trips per request are the delta of pg_stat_statements calls on
+this database over the run divided by the requests sent, so anything else
+using the database at the same time is counted too. They are reported as
+null when the extension is not loaded (see benchmarks/README.md). The
+server's own count from /metrics (statements issued through the engine,
+excluding anything the database runs on its own) is reported next to it.
+
+Results are written as JSON (config, git commit, per-operation latency
+percentiles and throughput); `--compare` prints the change against an
+earlier result file.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import random
+import statistics
+import subprocess
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+import httpx
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncEngine
+from src.services import postgres
+
+logger = logging.getLogger("benchmarks.loadtest")
+
+OPERATIONS = ("get", "list", "put")
+
+TARGETS_SQL = text(
+    """
+    SELECT u.tenant_id, u.id AS user_id, l.id AS lesson_id, b.block_ids
+    FROM (
+        SELECT id, tenant_id FROM users ORDER BY random() LIMIT :n
+    ) u
+    CROSS JOIN LATERAL (
+        SELECT id FROM lessons
+        WHERE tenant_id = u.tenant_id AND block_count > 0
+        ORDER BY random() LIMIT 1
+    ) l
+    CROSS JOIN LATERAL (
+        SELECT array_agg(block_id) AS block_ids
+        FROM lesson_blocks WHERE lesson_id = l.id
+    ) b
+    """
+)
+
+STATEMENT_CALLS_SQL = text(
+    """
+    SELECT coalesce(sum(calls), 0)::bigint
+    FROM pg_stat_statements
+    WHERE dbid = (SELECT oid FROM pg_database WHERE datname = current_database())
+    """
+)
+
+
+async def sample_targets(db: AsyncEngine, n: int) -> list[dict]:
+    async with db.connect() as conn:
+        rows = (await conn.execute(TARGETS_SQL, {"n": n})).mappings().all()
+    return [dict(r) for r in rows]
+
+
+async def enable_statement_stats(db: AsyncEngine) -> None:
+    # needs the library preloaded (docker-compose does) and a superuser role
+    try:
+        async with db.connect() as conn:
+            conn = await conn.execution_options(isolation_level="AUTOCOMMIT")
+            await conn.execute(text("CREATE EXTENSION IF NOT EXISTS pg_stat_statements"))
+    except Exception:
+        logger.warning("pg_stat_statements unavailable; db round trips will be null")
+
+
+async def server_queries(client: httpx.AsyncClient) -> tuple[float, float] | None:
+    """(queries, requests) summed over all routes from the server's /metrics."""
+    try:
+        response = await client.get("/metrics")
+        response.raise_for_status()
+    except httpx.HTTPError:
+        return None
+    totals = {"sum": 0.0, "count": 0.0}
+    for line in response.text.splitlines():
+        for kind in totals:
+            if line.startswith(f"http_request_db_queries_{kind}{{") and 'route="/metrics"' not in line:
+                totals[kind] += float(line.rsplit(" ", 1)[1])
+    return totals["sum"], totals["count"]
+
+
+async def statement_calls(db: AsyncEngine) -> int | None:
+    try:
+        async with db.connect() as conn:
+            return (await conn.execute(STATEMENT_CALLS_SQL)).scalar_one()
+    except Exception:
+        return None
+
+
+def parse_mix(value: str) -> dict[str, float]:
+    mix = {}
+    for part in value.split(","):
+        name, _, weight = part.partition("=")
+        if name not in OPERATIONS:
+            raise argparse.ArgumentTypeError(f"unknown operation {name!r}, expected {OPERATIONS}")
+        mix[name] = float(weight)
+    if sum(mix.values()) <= 0:
+        raise argparse.ArgumentTypeError("mix weights must add up to more than zero")
+    return mix
+
+
+def build_request(op: str, target: dict) -> tuple[str, str, dict | None]:
+    base = f"/api/v1/tenants/{target['tenant_id']}/users/{target['user_id']}/lessons"
+    if op == "list":
+        return "GET", base, None
+    if op == "get":
+        return "GET", f"{base}/{target['lesson_id']}", None
+    body = {
+        "block_id": random.choice(target["block_ids"]),
+        "status": random.choice(("seen", "completed")),
+    }
+    return "PUT", f"{base}/{target['lesson_id']}/progress", body
+
+
+class Recorder:
+    def __init__(self):
+        self.latencies = {op: [] for op in OPERATIONS}
+        self.errors = {op: 0 for op in OPERATIONS}
+        self.status_codes: dict[str, int] = {}
+
+    def record(self, op: str, seconds: float, status: int | None):
+        key = str(status) if status is not None else "transport_error"
+        self.status_codes[key] = self.status_codes.get(key, 0) + 1
+        if status is None or status >= 400:
+            self.errors[op] += 1
+        else:
+            self.latencies[op].append(seconds)
+
+
+async def worker(client: httpx.AsyncClient, targets: list[dict], mix: dict[str, float],
+                 recorder: Recorder, deadline: float, budget: list[int]):
+    ops, weights = list(mix), list(mix.values())
+    while time.perf_counter() < deadline:
+        if budget[0] <= 0:
+            return
+        budget[0] -= 1
+        op = random.choices(ops, weights)[0]
+        method, url, body = build_request(op, random.choice(targets))
+        started = time.perf_counter()
+        try:
+            response = await client.request(method, url, json=body)
+            status = response.status_code
+        except httpx.HTTPError:
+            status = None
+        recorder.record(op, time.perf_counter() - started, status)
+
+
+def percentile(sorted_values: list[float], q: float) -> float:
+    # nearest-rank; the sample sizes here make interpolation pointless
+    index = max(0, min(len(sorted_values) - 1, round(q / 100 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def summarize(latencies: list[float], errors: int, elapsed: float) -> dict:
+    summary = {"requests": len(latencies) + errors, "errors": errors,
+               "throughput_rps": round(len(latencies) / elapsed, 1)}
+    if latencies:
+        ordered = sorted(latencies)
+        summary.update({
+            f"{name}_ms": round(value * 1000, 2)
+            for name, value in (
+                ("mean", statistics.fmean(ordered)),
+                ("p50", percentile(ordered, 50)),
+                ("p95", percentile(ordered, 95)),
+                ("p99", percentile(ordered, 99)),
+                ("max", ordered[-1]),
+            )
+        })
+    return summary
+
+
+def git_commit() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+async def run(args) -> dict:
+    db = postgres.create_engine()
+    try:
+        targets = await sample_targets(db, args.targets)
+        if not targets:
+            raise SystemExit("no users with lessons found; run benchmarks.generate first")
+        logger.info("sampled %d targets", len(targets))
+        await enable_statement_stats(db)
+
+        limits = httpx.Limits(max_connections=args.concurrency,
+                              max_keepalive_connections=args.concurrency)
+        async with httpx.AsyncClient(base_url=args.base_url, limits=limits,
+                                     timeout=args.timeout) as client:
+            if args.warmup:
+                await worker(client, targets, args.mix, Recorder(), float("inf"), [args.warmup])
+
+            calls_before = await statement_calls(db)
+            server_before = await server_queries(client)
+            recorder = Recorder()
+            budget = [args.requests or float("inf")]
+            started = time.perf_counter()
+            deadline = started + args.duration if args.duration else float("inf")
+            await asyncio.gather(*(
+                worker(client, targets, args.mix, recorder, deadline, budget)
+                for _ in range(args.concurrency)
+            ))
+            elapsed = time.perf_counter() - started
+            calls_after = await statement_calls(db)
+            server_after = await server_queries(client)
+    finally:
+        await db.dispose()
+
+    operations = {
+        op: summarize(recorder.latencies[op], recorder.errors[op], elapsed)
+        for op in OPERATIONS if op in args.mix
+    }
+    total = sum(s["requests"] for s in operations.values())
+    round_trips = server_round_trips = None
+    if calls_before is not None and calls_after is not None and total:
+        # the second snapshot query is counted as well
+        round_trips = round((calls_after - calls_before - 1) / total, 2)
+    if server_before and server_after and server_after[1] > server_before[1]:
+        server_round_trips = round(
+            (server_after[0] - server_before[0]) / (server_after[1] - server_before[1]), 2
+        )
+
+    return {
+        "label": args.label,
+        "git_commit": git_commit(),
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "config": {
+            "base_url": args.base_url,
+            "concurrency": args.concurrency,
+            "duration": args.duration,
+            "requests": args.requests,
+            "mix": args.mix,
+            "targets": len(targets),
+        },
+        "elapsed_seconds": round(elapsed, 2),
+        "total": {
+            "requests": total,
+            "errors": sum(s["errors"] for s in operations.values()),
+            "throughput_rps": round(sum(s["throughput_rps"] for s in operations.values()), 1),
+            "db_round_trips_per_request": round_trips,
+            "server_db_queries_per_request": server_round_trips,
+        },
+        "status_codes": recorder.status_codes,
+        "operations": operations,
+    }
+
+
+def print_report(result: dict, baseline: dict | None = None):
+    print(f"{result['label'] or '-'} @ {result['git_commit'] or '-'}  "
+          f"{result['total']['requests']} requests in {result['elapsed_seconds']}s, "
+          f"{result['total']['errors']} errors, "
+          f"{result['total']['throughput_rps']} req/s, "
+          f"{result['total']['db_round_trips_per_request']} db round trips/request "
+          f"({result['total']['server_db_queries_per_request']} by the server's /metrics)")
+    columns = ("throughput_rps", "mean_ms", "p50_ms", "p95_ms", "p99_ms", "max_ms")
+    print(f"{'op':<6}" + "".join(f"{c:>16}" for c in columns))
+    for op, summary in result["operations"].items():
+        cells = []
+        for column in columns:
+            value = summary.get(column)
+            cell = "-" if value is None else f"{value}"
+            before = (baseline or {}).get("operations", {}).get(op, {}).get(column)
+            if value is not None and before:
+                cell += f" ({(value - before) / before:+.0%})"
+            cells.append(f"{cell:>16}")
+        print(f"{op:<6}" + "".join(cells))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument("--concurrency", type=int, default=16, help="requests in flight")
+    parser.add_argument("--duration", type=float, default=30.0, help="seconds; 0 for no limit")
+    parser.add_argument("--requests", type=int, default=0, help="stop after N requests; 0 for no limit")
+    parser.add_argument("--warmup", type=int, default=200, help="untimed requests sent first")
+    parser.add_argument("--mix", type=parse_mix, default=parse_mix("get=80,list=10,put=10"),
+                        help="operation weights, e.g. get=80,list=10,put=10")
+    parser.add_argument("--targets", type=int, default=1000,
+                        help="number of (user, lesson) pairs to sample")
+    parser.add_argument("--timeout", type=float, default=30.0, help="per-request timeout")
+    parser.add_argument("--seed", type=int, help="random seed for target sampling order")
+    parser.add_argument("--label", default="", help="free-form name stored with the results")
+    parser.add_argument("--output", type=Path, default=Path("benchmarks/results"),
+                        help="JSON file, or directory to write a timestamped file into")
+    parser.add_argument("--compare", type=Path, help="earlier result file to print deltas against")
+    args = parser.parse_args()
+
+    if not args.duration and not args.requests:
+        parser.error("set --duration or --requests")
+    if args.seed is not None:
+        random.seed(args.seed)
+
+    logging.basicConfig(level=logging.INFO, format="%(message)s", force=True)
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    result = asyncio.run(run(args))
+
+    output = args.output
+    if output.suffix != ".json":
+        stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S")
+        name = "-".join(filter(None, (stamp, result["git_commit"], args.label)))
+        output = output / f"{name}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(result, indent=2) + "\n")
+
+    baseline = json.loads(args.compare.read_text()) if args.compare else None
+    print_report(result, baseline)
+    print(f"saved {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+-- Content revision stamp per lesson.
+-- Bumped whenever the assembled content of a lesson may change (lesson_blocks,
+-- blocks or block_variants), so cached lesson skeletons can be validated cheaply.
+
+ALTER TABLE lessons ADD COLUMN content_revision BIGINT NOT NULL DEFAULT 1;
+
+CREATE FUNCTION bump_lesson_revision_from_lesson_blocks() RETURNS trigger AS $$
+BEGIN
+  IF TG_OP IN ('UPDATE', 'DELETE') THEN
+    UPDATE lessons SET content_revision = content_revision + 1 WHERE id = OLD.lesson_id;
+  END IF;
+  IF TG_OP IN ('INSERT', 'UPDATE') THEN
+    UPDATE lessons SET content_revision = content_revision + 1 WHERE id = NEW.lesson_id;
+  END IF;
+  RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER trg_lesson_blocks_revision
+AFTER INSERT OR UPDATE OR DELETE ON lesson_blocks
+FOR EACH ROW EXECUTE FUNCTION bump_lesson_revision_from_lesson_blocks();
+
+-- A default variant (tenant_id IS NULL) affects every lesson using the block,
+-- a tenant override only that tenant's lessons.
+CREATE FUNCTION bump_lesson_revision_for_block(p_block_id INTEGER, p_tenant_id INTEGER) RETURNS void AS $$
+  UPDATE lessons l
+  SET content_revision = l.content_revision + 1
+  FROM lesson_blocks lb
+  WHERE lb.block_id = p_block_id
+    AND lb.lesson_id = l.id
+    AND (p_tenant_id IS NULL OR l.tenant_id = p_tenant_id);
+$$ LANGUAGE sql;
+
+CREATE FUNCTION bump_lesson_revision_from_block_variants() RETURNS trigger AS $$
+BEGIN
+  IF TG_OP IN ('UPDATE', 'DELETE') THEN
+    PERFORM bump_lesson_revision_for_block(OLD.block_id, OLD.tenant_id);
+  END IF;
+  IF TG_OP = 'INSERT'
+     OR (TG_OP = 'UPDATE' AND (NEW.block_id, NEW.tenant_id) IS DISTINCT FROM (OLD.block_id, OLD.tenant_id)) THEN
+    PERFORM bump_lesson_revision_for_block(NEW.block_id, NEW.tenant_id);
+  END IF;
+  RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER trg_block_variants_revision
+AFTER INSERT OR UPDATE OR DELETE ON block_variants
+FOR EACH ROW EXECUTE FUNCTION bump_lesson_revision_from_block_variants();
+
+CREATE FUNCTION bump_lesson_revision_from_blocks() RETURNS trigger AS $$
+BEGIN
+  PERFORM bump_lesson_revision_for_block(NEW.id, NULL);
+  RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER trg_blocks_revision
+AFTER UPDATE OF block_type ON blocks
+FOR EACH ROW EXECUTE FUNCTION bump_lesson_revision_from_blocks();
@@ -0,0 +1,164 @@
+-- Per-user lesson progress rollup.
+-- Kept current by triggers on user_block_progress (O(1) per status transition)
+-- and rebuilt per lesson when its blocks change. Readers get the progress
+-- summary with one primary key lookup instead of scanning lesson_blocks.
+
+ALTER TABLE lessons ADD COLUMN block_count INTEGER NOT NULL DEFAULT 0;
+
+UPDATE lessons l
+SET block_count = (SELECT count(*) FROM lesson_blocks lb WHERE lb.lesson_id = l.id);
+
+CREATE TABLE user_lesson_progress (
+  user_id             INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+  lesson_id           INTEGER NOT NULL REFERENCES lessons(id) ON DELETE CASCADE,
+  seen_count          INTEGER NOT NULL DEFAULT 0,
+  completed_count     INTEGER NOT NULL DEFAULT 0,
+  last_seen_position  INTEGER,
+  last_seen_block_id  INTEGER,
+  completed           BOOLEAN NOT NULL DEFAULT false,
+  updated_at          TIMESTAMPTZ NOT NULL DEFAULT now(),
+  PRIMARY KEY (user_id, lesson_id)
+);
+
+-- What user_lesson_progress should contain, computed from scratch.
+-- Used by the rebuild function and the consistency checker.
+CREATE VIEW user_lesson_progress_expected AS
+SELECT
+  ubp.user_id,
+  ubp.lesson_id,
+  count(*)::int AS seen_count,
+  (count(*) FILTER (WHERE ubp.status = 'completed'))::int AS completed_count,
+  max(lb.position) AS last_seen_position,
+  (array_agg(lb.block_id ORDER BY lb.position DESC))[1] AS last_seen_block_id,
+  count(*) FILTER (WHERE ubp.status = 'completed') = max(l.block_count) AS completed,
+  max(ubp.updated_at) AS updated_at
+FROM user_block_progress ubp
+JOIN lesson_blocks lb ON lb.lesson_id = ubp.lesson_id AND lb.block_id = ubp.block_id
+JOIN lessons l ON l.id = ubp.lesson_id
+GROUP BY ubp.user_id, ubp.lesson_id;
+
+CREATE FUNCTION rebuild_user_lesson_progress(p_lesson_id INTEGER, p_user_id INTEGER DEFAULT NULL)
+RETURNS void AS $$
+  DELETE FROM user_lesson_progress
+  WHERE lesson_id = p_lesson_id
+    AND (p_user_id IS NULL OR user_id = p_user_id);
+
+  INSERT INTO user_lesson_progress (
+    user_id, lesson_id, seen_count, completed_count,
+    last_seen_position, last_seen_block_id, completed, updated_at
+  )
+  SELECT
+    user_id, lesson_id, seen_count, completed_count,
+    last_seen_position, last_seen_block_id, completed, updated_at
+  FROM user_lesson_progress_expected
+  WHERE lesson_id = p_lesson_id
+    AND (p_user_id IS NULL OR user_id = p_user_id);
+$$ LANGUAGE sql;
+
+-- Incremental maintenance: each status transition is a counter update.
+CREATE FUNCTION apply_user_block_progress_rollup() RETURNS trigger AS $$
+DECLARE
+  v_position  INTEGER;
+  v_total     INTEGER;
+  v_seen      INTEGER := 0;
+  v_completed INTEGER := 0;
+BEGIN
+  IF TG_OP = 'DELETE'
+     OR (TG_OP = 'UPDATE' AND (NEW.user_id, NEW.lesson_id, NEW.block_id)
+                              IS DISTINCT FROM (OLD.user_id, OLD.lesson_id, OLD.block_id)) THEN
+    PERFORM rebuild_user_lesson_progress(OLD.lesson_id, OLD.user_id);
+    IF TG_OP = 'UPDATE' THEN
+      PERFORM rebuild_user_lesson_progress(NEW.lesson_id, NEW.user_id);
+    END IF;
+    RETURN NULL;
+  END IF;
+
+  IF TG_OP = 'UPDATE' AND NEW.status = OLD.status THEN
+    RETURN NULL;
+  END IF;
+
+  -- progress on blocks outside the lesson is not counted
+  SELECT position INTO v_position
+  FROM lesson_blocks
+  WHERE lesson_id = NEW.lesson_id AND block_id = NEW.block_id;
+  IF NOT FOUND THEN
+    RETURN NULL;
+  END IF;
+
+  SELECT block_count INTO v_total FROM lessons WHERE id = NEW.lesson_id;
+
+  IF TG_OP = 'INSERT' THEN
+    v_seen := 1;
+    v_completed := (NEW.status = 'completed')::int;
+  ELSE
+    v_completed := (NEW.status = 'completed')::int - (OLD.status = 'completed')::int;
+  END IF;
+
+  INSERT INTO user_lesson_progress AS p (
+    user_id, lesson_id, seen_count, completed_count,
+    last_seen_position, last_seen_block_id, completed, updated_at
+  )
+  VALUES (
+    NEW.user_id, NEW.lesson_id, v_seen, v_completed,
+    v_position, NEW.block_id, v_completed = v_total, NEW.updated_at
+  )
+  ON CONFLICT (user_id, lesson_id) DO UPDATE SET
+    seen_count = p.seen_count + EXCLUDED.seen_count,
+    completed_count = p.completed_count + EXCLUDED.completed_count,
+    last_seen_position = GREATEST(p.last_seen_position, EXCLUDED.last_seen_position),
+    last_seen_block_id = CASE
+      WHEN EXCLUDED.last_seen_position > COALESCE(p.last_seen_position, 0)
+        THEN EXCLUDED.last_seen_block_id
+      ELSE p.last_seen_block_id
+    END,
+    completed = p.completed_count + EXCLUDED.completed_count = v_total,
+    updated_at = GREATEST(p.updated_at, EXCLUDED.updated_at);
+
+  RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER trg_user_block_progress_rollup
+AFTER INSERT OR UPDATE OR DELETE ON user_block_progress
+FOR EACH ROW EXECUTE FUNCTION apply_user_block_progress_rollup();
+
+-- Structure changes are rare: recount blocks and rebuild the lesson's rollups.
+CREATE FUNCTION refresh_lesson_progress_rollups() RETURNS trigger AS $$
+DECLARE
+  v_lesson_ids INTEGER[] := '{}';
+BEGIN
+  IF TG_OP IN ('INSERT', 'UPDATE') THEN
+    v_lesson_ids := v_lesson_ids || ARRAY(SELECT DISTINCT lesson_id FROM new_rows);
+  END IF;
+  IF TG_OP IN ('UPDATE', 'DELETE') THEN
+    v_lesson_ids := v_lesson_ids || ARRAY(SELECT DISTINCT lesson_id FROM old_rows);
+  END IF;
+
+  UPDATE lessons l
+  SET block_count = (SELECT count(*) FROM lesson_blocks lb WHERE lb.lesson_id = l.id)
+  WHERE l.id = ANY(v_lesson_ids);
+
+  PERFORM rebuild_user_lesson_progress(s.lesson_id)
+  FROM (SELECT DISTINCT unnest(v_lesson_ids) AS lesson_id) s;
+
+  RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER trg_lesson_blocks_rollup_insert
+AFTER INSERT ON lesson_blocks
+REFERENCING NEW TABLE AS new_rows
+FOR EACH STATEMENT EXECUTE FUNCTION refresh_lesson_progress_rollups();
+
+CREATE TRIGGER trg_lesson_blocks_rollup_update
+AFTER UPDATE ON lesson_blocks
+REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+FOR EACH STATEMENT EXECUTE FUNCTION refresh_lesson_progress_rollups();
+
+CREATE TRIGGER trg_lesson_blocks_rollup_delete
+AFTER DELETE ON lesson_blocks
+REFERENCING OLD TABLE AS old_rows
+FOR EACH STATEMENT EXECUTE FUNCTION refresh_lesson_progress_rollups();
+
+-- Backfill
+SELECT rebuild_user_lesson_progress(id) FROM lessons;
@@ -0,0 +1,3 @@
+-- Keyset pagination of a tenant's lessons (WHERE tenant_id = ? AND id > ? ORDER BY id).
+DROP INDEX idx_lessons_tenant_id;
+CREATE INDEX idx_lessons_tenant_id ON lessons(tenant_id, id);
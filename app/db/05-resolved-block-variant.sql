@@ -0,0 +1,77 @@
+-- Resolved variant per (tenant, block), so lesson assembly looks variants up
+-- by primary key instead of sorting the block's variants per block.
+-- Defaults are stored once under tenant_id 0 (no tenant has id 0), tenant rows
+-- only for actual overrides: tenants without overrides add no rows. Readers
+-- probe (tenant, block) and fall back to (0, block).
+-- Kept current by a trigger on block_variants.
+
+CREATE TABLE resolved_block_variant (
+  tenant_id   INTEGER NOT NULL,
+  block_id    INTEGER NOT NULL,
+  variant_id  INTEGER NOT NULL REFERENCES block_variants(id) ON DELETE CASCADE,
+  PRIMARY KEY (tenant_id, block_id)
+);
+
+CREATE INDEX idx_resolved_block_variant_variant ON resolved_block_variant(variant_id);
+
+-- What resolved_block_variant should contain, computed from scratch.
+-- UNIQUE (block_id, tenant_id) does not stop several NULL-tenant defaults for
+-- a block; the lowest id wins.
+CREATE VIEW resolved_block_variant_expected AS
+SELECT DISTINCT ON (COALESCE(tenant_id, 0), block_id)
+  COALESCE(tenant_id, 0) AS tenant_id,
+  block_id,
+  id AS variant_id
+FROM block_variants
+ORDER BY COALESCE(tenant_id, 0), block_id, id;
+
+-- Re-resolve one (tenant, block) slot; p_tenant_id NULL is the default slot.
+CREATE FUNCTION refresh_resolved_block_variant(p_block_id INTEGER, p_tenant_id INTEGER)
+RETURNS void AS $$
+DECLARE
+  v_variant_id INTEGER;
+BEGIN
+  SELECT min(id) INTO v_variant_id
+  FROM block_variants
+  WHERE block_id = p_block_id
+    AND tenant_id IS NOT DISTINCT FROM p_tenant_id;
+
+  IF v_variant_id IS NULL THEN
+    DELETE FROM resolved_block_variant
+    WHERE tenant_id = COALESCE(p_tenant_id, 0) AND block_id = p_block_id;
+  ELSE
+    INSERT INTO resolved_block_variant (tenant_id, block_id, variant_id)
+    VALUES (COALESCE(p_tenant_id, 0), p_block_id, v_variant_id)
+    ON CONFLICT (tenant_id, block_id) DO UPDATE SET variant_id = EXCLUDED.variant_id
+    WHERE resolved_block_variant.variant_id IS DISTINCT FROM EXCLUDED.variant_id;
+  END IF;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE FUNCTION refresh_resolved_block_variant_from_block_variants() RETURNS trigger AS $$
+BEGIN
+  -- data-only updates do not move a variant between slots
+  IF TG_OP = 'UPDATE' AND (NEW.block_id, NEW.tenant_id) IS NOT DISTINCT FROM (OLD.block_id, OLD.tenant_id) THEN
+    RETURN NULL;
+  END IF;
+  IF TG_OP IN ('UPDATE', 'DELETE') THEN
+    PERFORM refresh_resolved_block_variant(OLD.block_id, OLD.tenant_id);
+  END IF;
+  IF TG_OP IN ('INSERT', 'UPDATE') THEN
+    PERFORM refresh_resolved_block_variant(NEW.block_id, NEW.tenant_id);
+  END IF;
+  RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER trg_block_variants_resolved
+AFTER INSERT OR UPDATE OR DELETE ON block_variants
+FOR EACH ROW EXECUTE FUNCTION refresh_resolved_block_variant_from_block_variants();
+
+CREATE FUNCTION rebuild_resolved_block_variant() RETURNS void AS $$
+  DELETE FROM resolved_block_variant;
+  INSERT INTO resolved_block_variant (tenant_id, block_id, variant_id)
+  SELECT tenant_id, block_id, variant_id FROM resolved_block_variant_expected;
+$$ LANGUAGE sql;
+
+SELECT rebuild_resolved_block_variant();
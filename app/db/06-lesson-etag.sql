@@ -0,0 +1,15 @@
+-- content_revision versions everything in an assembled lesson, so it can back
+-- HTTP ETags: also bump it when the lesson's own slug or title changes.
+
+CREATE FUNCTION bump_lesson_revision_from_lessons() RETURNS trigger AS $$
+BEGIN
+  NEW.content_revision := OLD.content_revision + 1;
+  RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER trg_lessons_revision
+BEFORE UPDATE OF slug, title ON lessons
+FOR EACH ROW
+WHEN ((NEW.slug, NEW.title) IS DISTINCT FROM (OLD.slug, OLD.title))
+EXECUTE FUNCTION bump_lesson_revision_from_lessons();
@@ -0,0 +1,45 @@
+-- Progress events for push clients (see src/services/listener.py).
+-- After a block's status changes, NOTIFY lesson_progress with the block and
+-- the user's updated lesson summary. Named to fire after the rollup trigger,
+-- so the summary includes this change. Notifications are delivered at
+-- commit, in commit order, to listeners on the primary.
+-- Committing a NOTIFY takes a database-wide lock on the notification queue;
+-- without push clients, ALTER TABLE user_block_progress DISABLE TRIGGER
+-- trg_user_block_progress_sync.
+
+CREATE FUNCTION notify_lesson_progress() RETURNS trigger AS $$
+DECLARE
+  v_payload TEXT;
+BEGIN
+  IF TG_OP = 'UPDATE' AND NEW.status = OLD.status THEN
+    RETURN NULL;
+  END IF;
+
+  SELECT json_build_object(
+    'user_id', NEW.user_id,
+    'lesson_id', NEW.lesson_id,
+    'block_id', NEW.block_id,
+    'user_progress', NEW.status,
+    'progress_summary', json_build_object(
+      'total_blocks', l.block_count,
+      'seen_blocks', COALESCE(p.seen_count, 0),
+      'completed_blocks', COALESCE(p.completed_count, 0),
+      'last_seen_block_id', p.last_seen_block_id,
+      'completed', COALESCE(p.completed, false)
+    )
+  )::text
+  INTO v_payload
+  FROM lessons l
+  LEFT JOIN user_lesson_progress p
+    ON p.user_id = NEW.user_id
+   AND p.lesson_id = NEW.lesson_id
+  WHERE l.id = NEW.lesson_id;
+
+  PERFORM pg_notify('lesson_progress', v_payload);
+  RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER trg_user_block_progress_sync
+AFTER INSERT OR UPDATE ON user_block_progress
+FOR EACH ROW EXECUTE FUNCTION notify_lesson_progress();
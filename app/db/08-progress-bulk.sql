@@ -0,0 +1,20 @@
+-- Bulk progress import (see src/services/progress_transfer.py).
+-- The per-row rollup and notify triggers cost a lookup, an upsert and a
+-- queued notification for every imported row. An import sets
+-- `pair.bulk_progress` to 'on' for its transaction, merges the rows and
+-- then rebuilds the rollups of the (user, lesson) pairs it touched in one
+-- statement. Push clients get no events for imported rows.
+
+DROP TRIGGER trg_user_block_progress_rollup ON user_block_progress;
+CREATE TRIGGER trg_user_block_progress_rollup
+AFTER INSERT OR UPDATE OR DELETE ON user_block_progress
+FOR EACH ROW
+WHEN (current_setting('pair.bulk_progress', true) IS DISTINCT FROM 'on')
+EXECUTE FUNCTION apply_user_block_progress_rollup();
+
+DROP TRIGGER trg_user_block_progress_sync ON user_block_progress;
+CREATE TRIGGER trg_user_block_progress_sync
+AFTER INSERT OR UPDATE ON user_block_progress
+FOR EACH ROW
+WHEN (current_setting('pair.bulk_progress', true) IS DISTINCT FROM 'on')
+EXECUTE FUNCTION notify_lesson_progress();
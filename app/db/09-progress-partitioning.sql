@@ -0,0 +1,221 @@
+-- Optional hash-partitioned layout of user_block_progress, migrated online
+-- (driven by `python -m src.commands.progress_partitioning`, see
+-- src/services/progress_partitioning.py):
+--
+--   prepare   progress_partitioning_prepare(n) creates the standby table
+--             user_block_progress_partitioned (hash on user_id, n partitions)
+--             and a trigger mirroring every write of the live table into it
+--   backfill  copies the live rows into it in keyset batches
+--   check     compares both tables
+--   swap      progress_partitioning_swap() renames the standby into place in
+--             one short ACCESS EXCLUSIVE transaction, moves the triggers and
+--             views, and mirrors writes back into the old table, renamed
+--             user_block_progress_unpartitioned; a second swap rolls back
+--   finish    progress_partitioning_finish() drops the old table
+--   abort     progress_partitioning_abort() drops the standby before a swap
+--
+-- Every per-user statement filters on user_id, so it touches one partition:
+-- pruned when planned, or at executor startup for generic plans of prepared
+-- statements. The primary key includes the partition key, so it stays
+-- unique across partitions and ON CONFLICT (user_id, lesson_id, block_id)
+-- is unchanged. Each partition is vacuumed and indexed on its own. The
+-- (user_id, lesson_id) index is not recreated: the primary key's prefix
+-- serves the same lookups.
+-- Autovacuum analyzes the partitions but never the partitioned parent; run
+-- ANALYZE user_block_progress after large changes for statements that scan
+-- all partitions (lesson-wide rollup rebuilds, exports).
+-- TRUNCATE of the live table is not mirrored.
+
+CREATE FUNCTION mirror_user_block_progress() RETURNS trigger AS $$
+DECLARE
+  v_partitioned BOOLEAN := TG_ARGV[0] = 'user_block_progress_partitioned';
+BEGIN
+  IF TG_OP = 'DELETE'
+     OR (TG_OP = 'UPDATE' AND (NEW.user_id, NEW.lesson_id, NEW.block_id)
+                              IS DISTINCT FROM (OLD.user_id, OLD.lesson_id, OLD.block_id)) THEN
+    IF v_partitioned THEN
+      DELETE FROM user_block_progress_partitioned
+      WHERE user_id = OLD.user_id AND lesson_id = OLD.lesson_id AND block_id = OLD.block_id;
+    ELSE
+      DELETE FROM user_block_progress_unpartitioned
+      WHERE user_id = OLD.user_id AND lesson_id = OLD.lesson_id AND block_id = OLD.block_id;
+    END IF;
+  END IF;
+  IF TG_OP = 'DELETE' THEN
+    RETURN NULL;
+  END IF;
+
+  IF v_partitioned THEN
+    INSERT INTO user_block_progress_partitioned (user_id, lesson_id, block_id, status, updated_at)
+    VALUES (NEW.user_id, NEW.lesson_id, NEW.block_id, NEW.status, NEW.updated_at)
+    ON CONFLICT (user_id, lesson_id, block_id)
+    DO UPDATE SET status = EXCLUDED.status, updated_at = EXCLUDED.updated_at;
+  ELSE
+    INSERT INTO user_block_progress_unpartitioned (user_id, lesson_id, block_id, status, updated_at)
+    VALUES (NEW.user_id, NEW.lesson_id, NEW.block_id, NEW.status, NEW.updated_at)
+    ON CONFLICT (user_id, lesson_id, block_id)
+    DO UPDATE SET status = EXCLUDED.status, updated_at = EXCLUDED.updated_at;
+  END IF;
+  RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE FUNCTION progress_partitioning_prepare(p_partitions INTEGER) RETURNS void AS $$
+BEGIN
+  IF to_regclass('progress_partitioning_state') IS NOT NULL THEN
+    RAISE EXCEPTION 'a partitioning migration is already in progress';
+  END IF;
+  IF (SELECT relkind FROM pg_class WHERE oid = 'user_block_progress'::regclass) = 'p' THEN
+    RAISE EXCEPTION 'user_block_progress is already partitioned';
+  END IF;
+  IF p_partitions < 2 THEN
+    RAISE EXCEPTION 'partitions must be at least 2, got %', p_partitions;
+  END IF;
+
+  CREATE TABLE progress_partitioning_state (
+    id             BOOLEAN PRIMARY KEY DEFAULT true CHECK (id),
+    partitions     INTEGER NOT NULL,
+    backfilled_to  INTEGER[],    -- last copied (user_id, lesson_id, block_id)
+    backfilled_at  TIMESTAMPTZ,  -- set when the backfill reached the end
+    swapped_at     TIMESTAMPTZ,  -- set while the partitioned table is live
+    prepared_at    TIMESTAMPTZ NOT NULL DEFAULT now()
+  );
+  INSERT INTO progress_partitioning_state (partitions) VALUES (p_partitions);
+
+  CREATE TABLE user_block_progress_partitioned (
+    user_id      INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    lesson_id    INTEGER NOT NULL REFERENCES lessons(id) ON DELETE CASCADE,
+    block_id     INTEGER NOT NULL REFERENCES blocks(id) ON DELETE CASCADE,
+    status       TEXT NOT NULL CHECK (status IN ('seen', 'completed')),
+    updated_at   TIMESTAMPTZ NOT NULL DEFAULT now(),
+    PRIMARY KEY (user_id, lesson_id, block_id)
+  ) PARTITION BY HASH (user_id);
+
+  FOR i IN 0 .. p_partitions - 1 LOOP
+    EXECUTE format(
+      'CREATE TABLE %I PARTITION OF user_block_progress_partitioned FOR VALUES WITH (MODULUS %s, REMAINDER %s)',
+      'user_block_progress_p' || lpad(i::text, 3, '0'), p_partitions, i
+    );
+  END LOOP;
+
+  CREATE TRIGGER trg_user_block_progress_mirror
+  AFTER INSERT OR UPDATE OR DELETE ON user_block_progress
+  FOR EACH ROW EXECUTE FUNCTION mirror_user_block_progress('user_block_progress_partitioned');
+END;
+$$ LANGUAGE plpgsql;
+
+-- Rename a table and the constraints named after it (their indexes follow).
+CREATE FUNCTION rename_with_constraints(p_table REGCLASS, p_name TEXT) RETURNS void AS $$
+DECLARE
+  v_old  TEXT := (SELECT relname FROM pg_class WHERE oid = p_table);
+  v_name TEXT;
+BEGIN
+  FOR v_name IN
+    SELECT conname FROM pg_constraint
+    WHERE conrelid = p_table AND left(conname, length(v_old) + 1) = v_old || '_'
+  LOOP
+    EXECUTE format('ALTER TABLE %s RENAME CONSTRAINT %I TO %I',
+                   p_table, v_name, p_name || substr(v_name, length(v_old) + 1));
+  END LOOP;
+  EXECUTE format('ALTER TABLE %s RENAME TO %I', p_table, p_name);
+END;
+$$ LANGUAGE plpgsql;
+
+-- Exchange the live table and the standby, either way.
+CREATE FUNCTION progress_partitioning_swap() RETURNS void AS $$
+DECLARE
+  v_live        REGCLASS := 'user_block_progress';
+  v_partitioned BOOLEAN;
+  v_standby     REGCLASS;
+  v_retired     TEXT;
+  v_triggers    TEXT[];
+  v_views       TEXT[];
+  v_sql         TEXT;
+BEGIN
+  IF to_regclass('progress_partitioning_state') IS NULL THEN
+    RAISE EXCEPTION 'nothing to swap: prepare and backfill first';
+  END IF;
+  IF (SELECT backfilled_at FROM progress_partitioning_state) IS NULL THEN
+    RAISE EXCEPTION 'nothing to swap: the backfill has not finished';
+  END IF;
+
+  v_partitioned := (SELECT relkind FROM pg_class WHERE oid = v_live) = 'p';
+  v_standby := CASE WHEN v_partitioned THEN 'user_block_progress_unpartitioned'
+                    ELSE 'user_block_progress_partitioned' END;
+  v_retired := CASE WHEN v_partitioned THEN 'user_block_progress_partitioned'
+                    ELSE 'user_block_progress_unpartitioned' END;
+
+  LOCK TABLE user_block_progress IN ACCESS EXCLUSIVE MODE;
+  EXECUTE format('LOCK TABLE %s IN ACCESS EXCLUSIVE MODE', v_standby);
+
+  -- deparsed while the names still resolve to the live table
+  SELECT array_agg(pg_get_triggerdef(oid)) INTO v_triggers
+  FROM pg_trigger
+  WHERE tgrelid = v_live AND NOT tgisinternal AND tgname <> 'trg_user_block_progress_mirror';
+
+  SELECT array_agg(format('CREATE OR REPLACE VIEW %s AS %s', c.oid::regclass, pg_get_viewdef(c.oid)))
+  INTO v_views
+  FROM (
+    SELECT DISTINCT r.ev_class
+    FROM pg_depend d
+    JOIN pg_rewrite r ON r.oid = d.objid
+    WHERE d.classid = 'pg_rewrite'::regclass
+      AND d.refobjid = v_live
+      AND r.ev_class <> v_live
+  ) v
+  JOIN pg_class c ON c.oid = v.ev_class;
+
+  DROP TRIGGER trg_user_block_progress_mirror ON user_block_progress;
+  FOR v_sql IN
+    SELECT tgname FROM pg_trigger WHERE tgrelid = v_live AND NOT tgisinternal
+  LOOP
+    EXECUTE format('DROP TRIGGER %I ON user_block_progress', v_sql);
+  END LOOP;
+
+  PERFORM rename_with_constraints(v_live, v_retired);
+  PERFORM rename_with_constraints(v_standby, 'user_block_progress');
+
+  FOREACH v_sql IN ARRAY coalesce(v_triggers, '{}') || coalesce(v_views, '{}') LOOP
+    EXECUTE v_sql;
+  END LOOP;
+
+  EXECUTE format(
+    'CREATE TRIGGER trg_user_block_progress_mirror
+     AFTER INSERT OR UPDATE OR DELETE ON user_block_progress
+     FOR EACH ROW EXECUTE FUNCTION mirror_user_block_progress(%L)', v_retired
+  );
+
+  UPDATE progress_partitioning_state
+  SET swapped_at = CASE WHEN v_partitioned THEN NULL ELSE now() END;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Keep the partitioned layout: stop mirroring and drop the old table.
+CREATE FUNCTION progress_partitioning_finish() RETURNS void AS $$
+BEGIN
+  IF to_regclass('progress_partitioning_state') IS NULL THEN
+    RAISE EXCEPTION 'nothing to finish: no migration in progress';
+  END IF;
+  IF (SELECT swapped_at FROM progress_partitioning_state) IS NULL THEN
+    RAISE EXCEPTION 'nothing to finish: the partitioned table is not live';
+  END IF;
+  DROP TRIGGER trg_user_block_progress_mirror ON user_block_progress;
+  DROP TABLE user_block_progress_unpartitioned;
+  DROP TABLE progress_partitioning_state;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Give up before (or after rolling back) a swap: drop the standby.
+CREATE FUNCTION progress_partitioning_abort() RETURNS void AS $$
+BEGIN
+  IF to_regclass('progress_partitioning_state') IS NULL THEN
+    RAISE EXCEPTION 'nothing to abort: no migration in progress';
+  END IF;
+  IF (SELECT swapped_at FROM progress_partitioning_state) IS NOT NULL THEN
+    RAISE EXCEPTION 'nothing to abort: the partitioned table is live (swap back first)';
+  END IF;
+  DROP TRIGGER trg_user_block_progress_mirror ON user_block_progress;
+  DROP TABLE user_block_progress_partitioned;
+  DROP TABLE progress_partitioning_state;
+END;
+$$ LANGUAGE plpgsql;
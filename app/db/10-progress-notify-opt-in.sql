@@ -0,0 +1,16 @@
+-- Progress events are opt-in (PROGRESS_EVENTS, see src/services/listener.py).
+-- Committing a NOTIFY takes a database-wide lock on the notification queue,
+-- serializing the commits of every progress write, so the notify trigger
+-- only fires for sessions that set `pair.progress_events` to 'on': the app
+-- sets it on its connections when PROGRESS_EVENTS is enabled. Writes from
+-- other sessions (psql, jobs) and bulk imports publish nothing.
+
+DROP TRIGGER trg_user_block_progress_sync ON user_block_progress;
+CREATE TRIGGER trg_user_block_progress_sync
+AFTER INSERT OR UPDATE ON user_block_progress
+FOR EACH ROW
+WHEN (
+  current_setting('pair.progress_events', true) = 'on'
+  AND current_setting('pair.bulk_progress', true) IS DISTINCT FROM 'on'
+)
+EXECUTE FUNCTION notify_lesson_progress();
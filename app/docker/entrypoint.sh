@@ -10,6 +10,27 @@ runserver_dev() {
         --reload
 }
 
+runserver_prd() {
+    # Prd Server Config: one worker per CPU unless WEB_CONCURRENCY is set.
+    # Each worker sizes its pool from max_connections over
+    # APP_INSTANCES * WEB_CONCURRENCY workers and warms it up before serving;
+    # lesson skeletons are shared between workers through /dev/shm.
+    export WEB_CONCURRENCY="${WEB_CONCURRENCY:-$(nproc)}"
+    export POSTGRES_POOL_BUDGET="${POSTGRES_POOL_BUDGET:-true}"
+    export SHM_CACHE_SIZE="${SHM_CACHE_SIZE:-33554432}"
+    exec uv run --no-sync uvicorn src.main:app \
+        --host 0.0.0.0 \
+        --port 8000 \
+        --workers "$WEB_CONCURRENCY" \
+        --loop uvloop \
+        --http httptools \
+        --no-access-log \
+        --proxy-headers \
+        --forwarded-allow-ips "${FORWARDED_ALLOW_IPS:-127.0.0.1}" \
+        --timeout-keep-alive 5 \
+        --timeout-graceful-shutdown 30
+}
+
 case $1 in
     dev_server)
         chmod +x /app/docker/wait
@@ -17,6 +38,11 @@ case $1 in
         runserver_dev
         ;;
 
+    prd_server)
+        sh -c "/app/docker/wait"
+        runserver_prd
+        ;;
+
     *)
         eval "$@"
         ;;
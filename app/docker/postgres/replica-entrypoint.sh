@@ -0,0 +1,16 @@
+#!/bin/sh
+# Hot standby of $PRIMARY_HOST: clone it once, then follow its WAL stream.
+set -e
+
+PGDATA=${PGDATA:-/var/lib/postgresql/data}
+
+if [ ! -s "$PGDATA/PG_VERSION" ]; then
+  echo "cloning $PRIMARY_HOST into $PGDATA"
+  until pg_basebackup -h "$PRIMARY_HOST" -D "$PGDATA" -X stream -R; do
+    echo "waiting for $PRIMARY_HOST"
+    sleep 1
+  done
+  chmod 700 "$PGDATA"
+fi
+
+exec postgres -D "$PGDATA" -c hot_standby=on
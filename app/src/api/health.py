@@ -1,7 +1,8 @@
 import logging
-from fastapi import APIRouter
-from fastapi.responses import JSONResponse
-# from src import services as svc
+from fastapi import APIRouter, Depends
+from fastapi.responses import JSONResponse, PlainTextResponse
+from src import services as svc
+from src.api.v1.admin import require_admin
 
 logging.captureWarnings(True)
 router = APIRouter()
@@ -9,13 +10,75 @@ router = APIRouter()
 
 @router.get("/api/healthz")
 async def healthz():
-    """health check.
-
-    TODO: implement liveness healthcheck for postgresql
-    TODO: implement correct response code
-    """
+    """health check (kept for existing probes): same verdict as /api/readyz."""
+    readiness = svc.health.monitor.readiness()
     checks = {
-        "postgres": "OK", #svc.postgres.check_health(),
+        "postgres": "OK" if readiness["ready"] else "; ".join(readiness["reasons"]),
     }
-    status = 200 #if all(checks.values()) else 500
+    status = 200 if readiness["ready"] else 503
     return JSONResponse(content={"health": checks}, status_code=status)
+
+
+@router.get("/api/livez")
+async def livez():
+    """liveness: the process answers and the health monitor is running."""
+    liveness = svc.health.monitor.liveness()
+    return JSONResponse(content=liveness, status_code=200 if liveness["alive"] else 503)
+
+
+@router.get("/api/readyz")
+async def readyz():
+    """readiness from the cached postgres check; never touches the pool."""
+    readiness = svc.health.monitor.readiness()
+    return JSONResponse(content=readiness, status_code=200 if readiness["ready"] else 503)
+
+
+@router.get("/api/cachez")
+async def cachez():
+    """in-process cache statistics."""
+    return {
+        "lesson_skeleton": svc.lessons.skeleton_cache.stats(),
+        "lesson_outline": svc.lessons.outline_cache.stats(),
+        "lesson_skeleton_flights": svc.lessons.skeleton_flights.stats(),
+        "shared_skeletons": svc.lessons.shared_skeletons.stats(),
+        "prepared_statements": svc.hot_path.stats,
+    }
+
+
+@router.get("/api/admissionz")
+async def admissionz():
+    """admission control: slots, queue depth and shed counts per budget and tenant."""
+    return {"reads": svc.admission.reads.stats(), "writes": svc.admission.writes.stats()}
+
+
+@router.get("/api/bufferz")
+async def bufferz():
+    """progress write-behind buffer statistics."""
+    return {"progress_buffer": svc.progress_buffer.buffer.stats()}
+
+
+@router.get("/api/eventz")
+async def eventz():
+    """progress event stream: listen connection and subscriber counts."""
+    return {"progress_events": svc.listener.listener.stats()}
+
+
+@router.get("/api/replicaz")
+async def replicaz():
+    """read replica routing: replay lag per replica and where reads went."""
+    return {"replicas": svc.replicas.router.stats()}
+
+
+@router.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """Prometheus metrics: per-route latency, round trips, DB time and pool waits."""
+    return PlainTextResponse(
+        svc.instrumentation.registry.render(),
+        media_type="text/plain; version=0.0.4",
+    )
+
+
+@router.get("/api/profilez", dependencies=[Depends(require_admin)])
+async def profilez():
+    """slow requests captured by the sampling profiler, newest first (admin token: plans show parameters)."""
+    return {"profiler": svc.instrumentation.profiler.stats()}
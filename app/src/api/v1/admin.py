@@ -0,0 +1,97 @@
+import hmac
+import logging
+from typing import Literal
+from fastapi import APIRouter, Depends, Header, HTTPException, Path, Query, Request
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel
+from sqlalchemy.ext.asyncio import AsyncEngine
+from src import services as svc
+from src.conf import AppConfig
+
+logging.captureWarnings(True)
+conf = AppConfig()
+
+MEDIA_TYPES = {"csv": "text/csv", "ndjson": "application/x-ndjson"}
+
+
+def require_admin(authorization: str | None = Header(None)):
+    """Check the bearer token; without ADMIN_TOKEN set, admin endpoints are off (403)."""
+    if not conf.ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="admin endpoints disabled (ADMIN_TOKEN unset).")
+    scheme, _, token = (authorization or "").partition(" ")
+    if scheme.lower() != "bearer" or not hmac.compare_digest(token, conf.ADMIN_TOKEN):
+        raise HTTPException(status_code=401, detail="admin token required.")
+
+
+router = APIRouter(prefix="/admin", dependencies=[Depends(require_admin)])
+
+
+class ImportReject(BaseModel):
+    line: int
+    reason: str
+
+
+class ProgressImportReport(BaseModel):
+    received: int
+    inserted: int
+    upgraded: int
+    unchanged: int
+    rejected: int
+    rejects_by_reason: dict[str, int]
+    rejects: list[ImportReject]
+
+
+@router.post(
+    "/tenants/{tenant_id}/progress/import",
+    response_model=ProgressImportReport,
+)
+async def import_progress(
+    request: Request,
+    tenant_id: int = Path(..., gt=0),
+    format: Literal["csv", "ndjson"] = Query("csv"),
+    db: AsyncEngine = Depends(svc.postgres.get_engine),
+):
+    """
+    Bulk import block progress from the request body (CSV with a header
+    line, or NDJSON): user_id, lesson_id, block_id, status, updated_at
+    (optional). Rows that do not belong to the tenant are rejected and
+    reported, the rest are merged (progress never goes back from completed).
+    """
+    data = await svc.progress_transfer.import_progress(
+        db,
+        tenant_id=tenant_id,
+        chunks=request.stream(),
+        fmt=format,
+    )
+
+    if data is None:
+        raise HTTPException(status_code=404, detail="tenant not found.")
+
+    if data.get("error") == "missing_columns":
+        raise HTTPException(
+            status_code=400,
+            detail=f"CSV header lacks: {', '.join(data['missing'])}.",
+        )
+
+    return data
+
+
+@router.get("/tenants/{tenant_id}/progress/export")
+async def export_progress(
+    tenant_id: int = Path(..., gt=0),
+    format: Literal["csv", "ndjson"] = Query("csv"),
+    db: AsyncEngine = Depends(svc.postgres.get_engine),
+):
+    """
+    Stream all block progress of a tenant's users, in the import format.
+    """
+    chunks = await svc.progress_transfer.export_progress(db, tenant_id=tenant_id, fmt=format)
+
+    if chunks is None:
+        raise HTTPException(status_code=404, detail="tenant not found.")
+
+    return StreamingResponse(
+        chunks,
+        media_type=MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="progress-tenant-{tenant_id}.{format}"'},
+    )
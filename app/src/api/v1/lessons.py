@@ -1,11 +1,97 @@
+import json
 import logging
+import math
+import time
 from typing import Literal
-from fastapi import APIRouter, HTTPException, Path
+from fastapi import APIRouter, Cookie, Depends, Header, HTTPException, Path, Query
+from fastapi.responses import Response, StreamingResponse
 from pydantic import BaseModel, ConfigDict, Field
+from sqlalchemy.ext.asyncio import AsyncEngine
 from src import services as svc
+from src.conf import AppConfig
+from src.utils.http import ENCODERS, negotiate_encoding
 
 logging.captureWarnings(True)
-router = APIRouter()
+conf = AppConfig()
+
+WRITE_TOKEN_COOKIE = "progress_lsn"
+WRITE_TOKEN_HEADER = "X-Progress-LSN"
+
+
+async def read_your_writes(
+    progress_lsn: str | None = Cookie(None),
+    x_progress_lsn: str | None = Header(None),
+):
+    """
+    Reads of the request see at least the progress write behind the write
+    token the client sent back (header, else cookie), wherever that write
+    was served; see `set_write_token`.
+    """
+    svc.replicas.router.read_after(x_progress_lsn or progress_lsn)
+
+
+def set_write_token(response: Response) -> None:
+    """Return the write token of the request's committed write, when replicas take reads."""
+    token = svc.replicas.router.written()
+    if token is None:
+        return
+    response.headers[WRITE_TOKEN_HEADER] = token
+    # past max_lag every replica still taking reads has replayed the write
+    response.set_cookie(
+        WRITE_TOKEN_COOKIE, token, max_age=math.ceil(conf.REPLICA_MAX_LAG) + 1,
+        httponly=True, samesite="lax",
+    )
+
+
+router = APIRouter(dependencies=[Depends(read_your_writes)])
+
+
+def admission(budget: str):
+    """
+    Dependency holding a slot of svc.admission's `budget` ("reads" or
+    "writes") for the request's tenant until the response is sent; sheds
+    the request with 429/503 and Retry-After when none comes in time.
+    """
+    async def admit(tenant_id: int = Path(..., gt=0)):
+        if not conf.ADMISSION_ENABLED:
+            yield
+            return
+        slots = getattr(svc.admission, budget)
+        shed = await slots.acquire(tenant_id)
+        if shed is not None:
+            raise HTTPException(
+                status_code=shed["status"],
+                detail="tenant over its request limit." if shed["status"] == 429 else "server busy.",
+                headers={"Retry-After": str(shed["retry_after"])},
+            )
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            slots.release(tenant_id, time.perf_counter() - started)
+
+    return Depends(admit)
+
+
+admit_read = admission("reads")
+admit_write = admission("writes")
+
+
+def block_fields(
+    fields: str | None = Query(
+        None,
+        description="Comma-separated block fields to return besides `id`: "
+        + ", ".join(svc.lessons.BLOCK_FIELDS)
+        + ". Variant payloads are only read for `variant.data`. All fields when omitted.",
+    ),
+) -> frozenset[str] | None:
+    if fields is None:
+        return None
+    names = frozenset(name.strip() for name in fields.split(",") if name.strip())
+    unknown = names.difference(svc.lessons.BLOCK_FIELDS)
+    if unknown:
+        raise HTTPException(status_code=422, detail=f"unknown fields: {', '.join(sorted(unknown))}.")
+    return names
 
 
 class ProgressUpsertRequest(BaseModel):
@@ -18,6 +104,20 @@ class ProgressUpsertResponse(BaseModel):
     progress_summary: "Progress"
 
 
+class ProgressBatchUpsertRequest(BaseModel):
+    items: list[ProgressUpsertRequest] = Field(..., min_length=1, max_length=500)
+
+
+class BlockProgress(BaseModel):
+    block_id: int
+    stored_status: Literal["seen", "completed"]
+
+
+class ProgressBatchUpsertResponse(BaseModel):
+    results: list[BlockProgress]
+    progress_summary: "Progress"
+
+
 class Lesson(BaseModel):
     id: int = Field(...)
     slug: str | None = None
@@ -30,11 +130,13 @@ class Variant(BaseModel):
     tenant_id: int | None = None
     data: dict | None = None
 
-class Block(BaseModel):
+class ContentBlock(BaseModel):
     id: int = Field(...)
     type: str | None = None
     position: int | None = None
     variant: Variant | None = None
+
+class Block(ContentBlock):
     user_progress: str | None = None
 
 class Progress(BaseModel):
@@ -49,24 +151,278 @@ class Root(BaseModel):
     blocks: list[Block]
     progress_summary: Progress
 
+class LessonContent(BaseModel):
+    lesson: Lesson
+    blocks: list[ContentBlock]
+
+class BlockVariant(BaseModel):
+    id: int = Field(...)
+    variant: Variant | None = None
+
+class LessonVariants(BaseModel):
+    blocks: list[BlockVariant]
+
+class LessonBundleRequest(BaseModel):
+    lesson_ids: list[int] = Field(..., min_length=1, max_length=conf.LESSON_BUNDLE_MAX_LESSONS)
+
+class BundleBlock(BaseModel):
+    id: int = Field(...)
+    type: str | None = None
+    position: int | None = None
+    variant_id: int | None = None
+    user_progress: str | None = None
+
+class BundleLesson(BaseModel):
+    lesson: Lesson
+    blocks: list[BundleBlock]
+    progress_summary: Progress
+
+class LessonBundle(BaseModel):
+    lessons: list[BundleLesson]
+    variants: list[Variant]
+    missing: list[int]
+
+class LessonBlocksPage(Root):
+    next_after_position: int | None = None
+
+class LessonSummary(BaseModel):
+    lesson: Lesson
+    progress_summary: Progress
+
+class LessonPage(BaseModel):
+    items: list[LessonSummary]
+    next_after_id: int | None = None
+
+
+@router.get(
+    "/tenants/{tenant_id}/users/{user_id}/lessons",
+    response_model=LessonPage,
+    response_model_by_alias=False,
+    dependencies=[admit_read],
+)
+async def list_lessons(
+    tenant_id: int = Path(..., gt=0),
+    user_id: int = Path(..., gt=0),
+    after_id: int = Query(0, ge=0),
+    limit: int = Query(50, ge=1, le=200),
+    db: AsyncEngine = Depends(svc.postgres.get_engine),
+):
+    """
+    List a tenant's lessons with the user's progress summary (dashboard).
+    Keyset paginated: pass `next_after_id` back as `after_id`.
+    """
+    data = await svc.lessons.list_lessons(
+        db,
+        tenant_id=tenant_id,
+        user_id=user_id,
+        after_id=after_id,
+        limit=limit,
+    )
+
+    if data is None:
+        raise HTTPException(status_code=404, detail="tenant or user not found.")
+
+    return data
+
 
 @router.get(
     "/tenants/{tenant_id}/users/{user_id}/lessons/{lesson_id}",
     response_model=Root,
     response_model_by_alias=False,
+    dependencies=[admit_read],
 )
 async def get_lesson(
     tenant_id: int = Path(..., gt=0),
     user_id: int = Path(..., gt=0),
     lesson_id: int = Path(..., gt=0),
+    if_none_match: str | None = Header(None),
+    fields: frozenset[str] | None = Depends(block_fields),
+    db: AsyncEngine = Depends(svc.postgres.get_engine),
 ):
     """
     Retrieve lesson for a tenant -> user.
+
+    The body is encoded by the service and returned as-is: `Root` documents
+    the schema but the response is not validated again. Carries a strong
+    ETag; a matching `If-None-Match` gets a 304 without the lesson being
+    assembled.
+
+    `fields` narrows the blocks (e.g. `type,position,user_progress` for
+    navigation); payloads left out can be fetched with the lesson's
+    `variants` endpoint.
+    """
+    result = await svc.lessons.get_lesson_json(
+        db,
+        tenant_id=tenant_id,
+        user_id=user_id,
+        lesson_id=lesson_id,
+        if_none_match=if_none_match,
+        fields=fields,
+    )
+
+    if result is None:
+        raise HTTPException(status_code=404, detail="lesson not found.")
+
+    body, etag = result
+    # per user: browsers may keep it, shared caches may not
+    headers = {"Cache-Control": "private, no-cache"}
+    if etag is not None:
+        headers["ETag"] = etag
+    if body is None:
+        return Response(status_code=304, headers=headers)
+
+    return Response(content=body, media_type="application/json", headers=headers)
+
+
+@router.post(
+    "/tenants/{tenant_id}/users/{user_id}/lessons/bundle",
+    response_model=LessonBundle,
+    response_model_by_alias=False,
+    dependencies=[admit_read],
+)
+async def get_lesson_bundle(
+    body: LessonBundleRequest,
+    tenant_id: int = Path(..., gt=0),
+    user_id: int = Path(..., gt=0),
+    accept_encoding: str | None = Header(None),
+    db: AsyncEngine = Depends(svc.postgres.get_engine),
+):
+    """
+    Retrieve several lessons for a tenant -> user at once (offline
+    prefetch), assembled in one query. Variants are listed once and
+    referenced by `variant_id` from the blocks; lessons not found are
+    listed in `missing`.
+
+    Compressed with zstd or gzip as `Accept-Encoding` allows, past
+    LESSON_BUNDLE_COMPRESS_MIN_BYTES.
+    """
+    data = await svc.lessons.get_lesson_bundle_json(
+        db,
+        tenant_id=tenant_id,
+        user_id=user_id,
+        lesson_ids=body.lesson_ids,
+    )
+
+    if data is None:
+        raise HTTPException(status_code=404, detail="tenant or user not found.")
+
+    headers = {"Vary": "Accept-Encoding"}
+    encoding = negotiate_encoding(accept_encoding)
+    if encoding is not None and len(data) >= conf.LESSON_BUNDLE_COMPRESS_MIN_BYTES:
+        data = ENCODERS[encoding](data)
+        headers["Content-Encoding"] = encoding
+
+    return Response(content=data, media_type="application/json", headers=headers)
+
+
+@router.get(
+    "/tenants/{tenant_id}/lessons/{lesson_id}/content",
+    response_model=LessonContent,
+    response_model_by_alias=False,
+    dependencies=[admit_read],
+)
+async def get_lesson_content(
+    tenant_id: int = Path(..., gt=0),
+    lesson_id: int = Path(..., gt=0),
+    if_none_match: str | None = Header(None),
+    db: AsyncEngine = Depends(svc.postgres.get_engine),
+):
+    """
+    Retrieve the user-independent part of a lesson: the lesson and its
+    blocks with the tenant's variants, without progress.
+
+    Cacheable by shared caches (CDNs) and revalidated with its ETag, which
+    only changes with the lesson's content_revision.
+    """
+    result = await svc.lessons.get_lesson_content_json(
+        db,
+        tenant_id=tenant_id,
+        lesson_id=lesson_id,
+        if_none_match=if_none_match,
+    )
+
+    if result is None:
+        raise HTTPException(status_code=404, detail="lesson not found.")
+
+    body, etag = result
+    headers = {
+        "Cache-Control": f"public, max-age={conf.LESSON_CONTENT_MAX_AGE}, must-revalidate",
+        "ETag": etag,
+    }
+    if body is None:
+        return Response(status_code=304, headers=headers)
+
+    return Response(content=body, media_type="application/json", headers=headers)
+
+
+@router.get(
+    "/tenants/{tenant_id}/lessons/{lesson_id}/variants",
+    response_model=LessonVariants,
+    response_model_by_alias=False,
+    dependencies=[admit_read],
+)
+async def get_lesson_variants(
+    tenant_id: int = Path(..., gt=0),
+    lesson_id: int = Path(..., gt=0),
+    block_ids: list[int] = Query(..., min_length=1, max_length=500),
+    if_none_match: str | None = Header(None),
+    db: AsyncEngine = Depends(svc.postgres.get_engine),
+):
+    """
+    Retrieve the tenant's variants, with their data, of some blocks of a
+    lesson (`block_ids`, repeated), to lazy-load the payloads of a lesson
+    fetched with `fields`. Blocks not in the lesson are left out.
+
+    Cached and revalidated like the lesson content: the ETag only changes
+    with the lesson's content_revision.
+    """
+    result = await svc.lessons.get_lesson_variants_json(
+        db,
+        tenant_id=tenant_id,
+        lesson_id=lesson_id,
+        block_ids=block_ids,
+        if_none_match=if_none_match,
+    )
+
+    if result is None:
+        raise HTTPException(status_code=404, detail="lesson not found.")
+
+    body, etag = result
+    headers = {
+        "Cache-Control": f"public, max-age={conf.LESSON_CONTENT_MAX_AGE}, must-revalidate",
+        "ETag": etag,
+    }
+    if body is None:
+        return Response(status_code=304, headers=headers)
+
+    return Response(content=body, media_type="application/json", headers=headers)
+
+
+@router.get(
+    "/tenants/{tenant_id}/users/{user_id}/lessons/{lesson_id}/blocks",
+    response_model=LessonBlocksPage,
+    response_model_by_alias=False,
+    dependencies=[admit_read],
+)
+async def get_lesson_blocks(
+    tenant_id: int = Path(..., gt=0),
+    user_id: int = Path(..., gt=0),
+    lesson_id: int = Path(..., gt=0),
+    after_position: int = Query(0, ge=0),
+    limit: int = Query(50, ge=1, le=500),
+    db: AsyncEngine = Depends(svc.postgres.get_engine),
+):
     """
-    data = await svc.lessons.get_lesson(
+    Retrieve a lesson's blocks page by page (keyset on position).
+    Pass `next_after_position` back as `after_position`.
+    """
+    data = await svc.lessons.get_lesson_blocks_page(
+        db,
         tenant_id=tenant_id,
         user_id=user_id,
         lesson_id=lesson_id,
+        after_position=after_position,
+        limit=limit,
     )
 
     if not data:
@@ -75,22 +431,103 @@ async def get_lesson(
     return data
 
 
+@router.get(
+    "/tenants/{tenant_id}/users/{user_id}/lessons/{lesson_id}/stream",
+    response_class=StreamingResponse,
+    responses={200: {"content": {"application/x-ndjson": {}}}},
+    dependencies=[admit_read],
+)
+async def stream_lesson(
+    tenant_id: int = Path(..., gt=0),
+    user_id: int = Path(..., gt=0),
+    lesson_id: int = Path(..., gt=0),
+    db: AsyncEngine = Depends(svc.postgres.get_engine),
+):
+    """
+    Stream a lesson as NDJSON: a `lesson` record, one `block` record per
+    block in position order, then a `progress_summary` record.
+    """
+    records = await svc.lessons.stream_lesson(
+        db,
+        tenant_id=tenant_id,
+        user_id=user_id,
+        lesson_id=lesson_id,
+    )
+
+    if records is None:
+        raise HTTPException(status_code=404, detail="lesson not found.")
+
+    async def ndjson():
+        async for record in records:
+            yield json.dumps(record, separators=(",", ":")) + "\n"
+
+    return StreamingResponse(ndjson(), media_type="application/x-ndjson")
+
+
+@router.get(
+    "/tenants/{tenant_id}/users/{user_id}/lessons/{lesson_id}/events",
+    response_class=StreamingResponse,
+    responses={200: {"content": {"text/event-stream": {}}}},
+)
+async def progress_events(
+    tenant_id: int = Path(..., gt=0),
+    user_id: int = Path(..., gt=0),
+    lesson_id: int = Path(..., gt=0),
+    db: AsyncEngine = Depends(svc.postgres.get_engine),
+):
+    """
+    Server-sent events of the user's progress on the lesson, pushed when a
+    progress write commits: a `snapshot` event with the progress summary,
+    then a `progress` event (block_id, user_progress, progress_summary) per
+    change. A `resync` or `overflow` event ends the stream; reconnect.
+    Not admission controlled: once the snapshot is read the stream holds
+    no connection.
+    """
+    events = await svc.lessons.progress_events(
+        db,
+        tenant_id=tenant_id,
+        user_id=user_id,
+        lesson_id=lesson_id,
+    )
+
+    if events is None:
+        raise HTTPException(status_code=404, detail="lesson not found.")
+    if isinstance(events, dict):
+        raise HTTPException(
+            status_code=503,
+            detail="progress events unavailable.",
+            headers={"Retry-After": "5"},
+        )
+
+    return StreamingResponse(
+        events,
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
 @router.put(
     "/tenants/{tenant_id}/users/{user_id}/lessons/{lesson_id}/progress",
     response_model=ProgressUpsertResponse,
     response_model_by_alias=False,
+    dependencies=[admit_write],
 )
 async def upsert_progress(
     body: ProgressUpsertRequest,
+    response: Response,
     tenant_id: int = Path(..., gt=0),
     user_id: int = Path(..., gt=0),
     lesson_id: int = Path(..., gt=0),
+    db: AsyncEngine = Depends(svc.postgres.get_engine),
 ):
     """
     Upsert progress for a single block (idempotent).
     Monotonic: completed cannot be downgraded to seen.
+    With read replicas, carries a write token (`X-Progress-LSN` header and
+    cookie): requests sending it back read the write.
     """
     result = await svc.lessons.upsert_progress(
+        db,
         tenant_id=tenant_id,
         user_id=user_id,
         lesson_id=lesson_id,
@@ -104,4 +541,45 @@ async def upsert_progress(
     if result.get("error") == "block_not_in_lesson":
         raise HTTPException(status_code=400, detail="block_id not in lesson.")
 
+    set_write_token(response)
+    return result
+
+
+@router.put(
+    "/tenants/{tenant_id}/users/{user_id}/lessons/{lesson_id}/progress/batch",
+    response_model=ProgressBatchUpsertResponse,
+    response_model_by_alias=False,
+    dependencies=[admit_write],
+)
+async def upsert_progress_batch(
+    body: ProgressBatchUpsertRequest,
+    response: Response,
+    tenant_id: int = Path(..., gt=0),
+    user_id: int = Path(..., gt=0),
+    lesson_id: int = Path(..., gt=0),
+    db: AsyncEngine = Depends(svc.postgres.get_engine),
+):
+    """
+    Upsert progress for several blocks at once (idempotent, all or nothing).
+    Monotonic: completed cannot be downgraded to seen. Write token as for
+    the single-block upsert.
+    """
+    result = await svc.lessons.upsert_progress_batch(
+        db,
+        tenant_id=tenant_id,
+        user_id=user_id,
+        lesson_id=lesson_id,
+        items=[(item.block_id, item.status) for item in body.items],
+    )
+
+    if result is None:
+        raise HTTPException(status_code=404, detail="tenant, user, or lesson not found.")
+
+    if result.get("error") == "block_not_in_lesson":
+        raise HTTPException(
+            status_code=400,
+            detail=f"block_id not in lesson: {result['block_ids']}.",
+        )
+
+    set_write_token(response)
     return result
@@ -0,0 +1,88 @@
+"""
+Online migration of user_block_progress to a hash-partitioned layout.
+
+    python -m src.commands.progress_partitioning status
+    python -m src.commands.progress_partitioning prepare [--partitions 16]
+    python -m src.commands.progress_partitioning backfill [--batch-size 10000] [--pause 0]
+    python -m src.commands.progress_partitioning check
+    python -m src.commands.progress_partitioning swap [--lock-timeout 2]
+    python -m src.commands.progress_partitioning pruning
+    python -m src.commands.progress_partitioning finish
+    python -m src.commands.progress_partitioning abort
+
+`prepare` creates the partitioned standby and mirrors writes into it;
+`backfill` copies the existing rows (resumable); `check` compares both
+tables; `swap` puts the partitioned table live and keeps the old one
+current, a second `swap` rolls back; `finish` drops the old table,
+`abort` the standby. `pruning` lists the partitions each per-user
+statement touches. `check` exits with status 1 on differences, `pruning`
+when a statement touches more than one partition; a step that does not
+apply to the current state exits with status 2.
+"""
+import argparse
+import asyncio
+import json
+import sys
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.ext.asyncio import AsyncEngine
+from src.services import postgres, progress_partitioning
+
+
+async def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(prog="progress_partitioning", description=__doc__.split("\n\n")[0])
+    parser.add_argument("action", choices=["status", "prepare", "backfill", "check", "swap", "pruning", "finish", "abort"])
+    parser.add_argument("--partitions", type=int, default=16, help="prepare: hash partitions on user_id")
+    parser.add_argument("--batch-size", type=int, default=10000, help="backfill: rows per transaction")
+    parser.add_argument("--pause", type=float, default=0.0, help="backfill: seconds between batches")
+    parser.add_argument("--lock-timeout", type=float, default=2.0, help="swap: seconds per lock attempt")
+    args = parser.parse_args(argv)
+
+    db = postgres.create_engine()
+    try:
+        return await run(db, args)
+    except DBAPIError as e:
+        # the migration functions refuse steps out of order with an exception
+        print(e.orig.__cause__ or e.orig, file=sys.stderr)
+        return 2
+    except ValueError as e:
+        print(e, file=sys.stderr)
+        return 2
+    finally:
+        await db.dispose()
+
+
+async def run(db: AsyncEngine, args: argparse.Namespace) -> int:
+    if args.action == "status":
+        print(json.dumps(await progress_partitioning.status(db)))
+    elif args.action == "prepare":
+        await progress_partitioning.prepare(db, args.partitions)
+        print(f"prepared user_block_progress_partitioned with {args.partitions} partitions")
+    elif args.action == "backfill":
+        count = await progress_partitioning.backfill(db, args.batch_size, args.pause)
+        print(f"backfilled {count} row(s)")
+    elif args.action == "check":
+        result = await progress_partitioning.check(db)
+        print(json.dumps(result))
+        return 1 if result["missing"] or result["extra"] or result["different"] else 0
+    elif args.action == "swap":
+        await progress_partitioning.swap(db, args.lock_timeout)
+        print(json.dumps(await progress_partitioning.status(db)))
+    elif args.action == "pruning":
+        results = await progress_partitioning.pruning(db)
+        if not results:
+            print("user_block_progress is not partitioned", file=sys.stderr)
+            return 1
+        for row in results:
+            print(json.dumps(row))
+        return 1 if any(max(r["custom"], r["generic"]) > 1 for r in results) else 0
+    elif args.action == "finish":
+        await progress_partitioning.finish(db)
+        print("dropped user_block_progress_unpartitioned")
+    else:
+        await progress_partitioning.abort(db)
+        print("dropped user_block_progress_partitioned")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
@@ -0,0 +1,39 @@
+"""
+Maintenance command for the user_lesson_progress rollup.
+
+    python -m src.commands.progress_rollup rebuild [--lesson-id ID ...]
+    python -m src.commands.progress_rollup check [--lesson-id ID ...]
+
+`check` exits with status 1 when mismatches are found.
+"""
+import argparse
+import asyncio
+import json
+import sys
+from src.services import postgres, progress_rollup
+
+
+async def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(prog="progress_rollup", description=__doc__.split("\n\n")[0])
+    parser.add_argument("action", choices=["rebuild", "check"])
+    parser.add_argument("--lesson-id", type=int, action="append", dest="lesson_ids")
+    args = parser.parse_args(argv)
+
+    db = postgres.create_engine()
+    try:
+        if args.action == "rebuild":
+            count = await progress_rollup.rebuild(db, args.lesson_ids)
+            print(f"rebuilt {count} lesson(s)")
+            return 0
+
+        mismatches = await progress_rollup.check(db, args.lesson_ids)
+        for row in mismatches:
+            print(json.dumps(row))
+        print(f"{len(mismatches)} mismatch(es)", file=sys.stderr)
+        return 1 if mismatches else 0
+    finally:
+        await db.dispose()
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
@@ -0,0 +1,64 @@
+"""
+Bulk import/export of block progress for a tenant.
+
+    python -m src.commands.progress_transfer import --tenant-id ID [--format csv|ndjson] FILE
+    python -m src.commands.progress_transfer export --tenant-id ID [--format csv|ndjson] [FILE]
+
+FILE `-` (the default for export) is stdin/stdout. `import` prints a JSON
+report and exits with status 1 when rows were rejected.
+"""
+import argparse
+import asyncio
+import json
+import sys
+from src.services import postgres, progress_transfer
+
+READ_SIZE = 1 << 20
+
+
+async def read_chunks(stream):
+    while chunk := stream.read(READ_SIZE):
+        yield chunk
+
+
+async def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(prog="progress_transfer", description=__doc__.split("\n\n")[0])
+    parser.add_argument("action", choices=["import", "export"])
+    parser.add_argument("file", nargs="?", default="-")
+    parser.add_argument("--tenant-id", type=int, required=True)
+    parser.add_argument("--format", choices=progress_transfer.FORMATS, default="csv")
+    parser.add_argument("--max-rejects", type=int, default=None, help="rejected lines listed in the report")
+    args = parser.parse_intermixed_args(argv)
+
+    db = postgres.create_engine()
+    try:
+        if args.action == "import":
+            stream = sys.stdin.buffer if args.file == "-" else open(args.file, "rb")
+            with stream:
+                report = await progress_transfer.import_progress(
+                    db, args.tenant_id, read_chunks(stream), args.format, args.max_rejects
+                )
+            if report is None:
+                print(f"tenant {args.tenant_id} not found", file=sys.stderr)
+                return 2
+            if "error" in report:
+                print(json.dumps(report), file=sys.stderr)
+                return 2
+            print(json.dumps(report, indent=2))
+            return 1 if report["rejected"] else 0
+
+        chunks = await progress_transfer.export_progress(db, args.tenant_id, args.format)
+        if chunks is None:
+            print(f"tenant {args.tenant_id} not found", file=sys.stderr)
+            return 2
+        stream = sys.stdout.buffer if args.file == "-" else open(args.file, "wb")
+        with stream:
+            async for chunk in chunks:
+                stream.write(chunk)
+        return 0
+    finally:
+        await db.dispose()
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
@@ -18,6 +18,12 @@ class AppConfig(BaseSettings):
     REDOC_URL: str = env.str("APP_REDOC_PATH", "/api/redoc")
     OPENAPI_URL: str = env.str("APP_OPENAPI_PATH", "/api/openapi.json")
 
+    # SERVER (prd_server in docker/entrypoint.sh)
+    WEB_CONCURRENCY: int = env.int("WEB_CONCURRENCY", 1)  # uvicorn workers per instance (prd_server: CPU count)
+    APP_INSTANCES: int = env.int("APP_INSTANCES", 1)  # instances (pods) sharing the database
+    # open the pool's connections and prepare the hot statements before serving
+    APP_WARMUP: bool = env.bool("APP_WARMUP", True)
+
     # POSTGRES
     POSTGRES_HOST: str = env.str("POSTGRES_HOST")
     POSTGRES_PORT: int = env.int("POSTGRES_PORT", 5432)
@@ -28,3 +34,82 @@ class AppConfig(BaseSettings):
         "POSTGRES_URL",
         f"postgresql+asyncpg://{env.str('POSTGRES_USER')}:{env.str('POSTGRES_PASS')}@{env.str('POSTGRES_HOST')}:{env.int('POSTGRES_PORT', 5432)}/{env.str('POSTGRES_DB')}"
     )
+    POSTGRES_POOL_SIZE: int = env.int("POSTGRES_POOL_SIZE", 10)
+    POSTGRES_POOL_MAX_OVERFLOW: int = env.int("POSTGRES_POOL_MAX_OVERFLOW", 5)
+    POSTGRES_POOL_TIMEOUT: float = env.float("POSTGRES_POOL_TIMEOUT", 30.0)
+    POSTGRES_POOL_RECYCLE: int = env.int("POSTGRES_POOL_RECYCLE", 1800)
+    POSTGRES_POOL_PRE_PING: bool = env.bool("POSTGRES_POOL_PRE_PING", True)
+    # cap each worker's pool (size + overflow) at its share of the server's max_connections,
+    # split over APP_INSTANCES * WEB_CONCURRENCY workers (prd_server turns it on)
+    POSTGRES_POOL_BUDGET: bool = env.bool("POSTGRES_POOL_BUDGET", False)
+    POSTGRES_RESERVED_CONNECTIONS: int = env.int("POSTGRES_RESERVED_CONNECTIONS", 10)  # left for admin and commands
+    # statement_timeout in milliseconds, 0 disables it
+    POSTGRES_STATEMENT_TIMEOUT: int = env.int("POSTGRES_STATEMENT_TIMEOUT", 15000)
+    # hot queries on raw asyncpg with named prepared statements (off behind pgbouncer
+    # in transaction mode, which does not keep prepared statements)
+    POSTGRES_HOT_PATH: bool = env.bool("POSTGRES_HOT_PATH", True)
+    POSTGRES_STATEMENT_CACHE_SIZE: int = env.int("POSTGRES_STATEMENT_CACHE_SIZE", 32)  # per connection
+
+    # READ REPLICAS
+    # comma-separated streaming replica URLs for lesson reads, empty: all reads on the primary
+    POSTGRES_REPLICA_URLS: str = env.str("POSTGRES_REPLICA_URLS", "")
+    REPLICA_POLL_INTERVAL: float = env.float("REPLICA_POLL_INTERVAL", 0.1)  # seconds between lag samples
+    REPLICA_MAX_LAG: float = env.float("REPLICA_MAX_LAG", 5.0)  # seconds; lagging replicas get no reads
+
+    # HEALTH
+    HEALTH_CHECK_INTERVAL: float = env.float("HEALTH_CHECK_INTERVAL", 2.0)  # seconds between pings
+    HEALTH_CHECK_TIMEOUT: float = env.float("HEALTH_CHECK_TIMEOUT", 2.0)  # checkout + ping, seconds
+    HEALTH_STALE_AFTER: float = env.float("HEALTH_STALE_AFTER", 10.0)  # not ready past this age
+    HEALTH_MAX_PING_MS: float = env.float("HEALTH_MAX_PING_MS", 250.0)  # readiness threshold
+    HEALTH_MAX_POOL_WAIT_MS: float = env.float("HEALTH_MAX_POOL_WAIT_MS", 500.0)  # readiness threshold
+
+    # CACHE
+    LESSON_CACHE_SIZE: int = env.int("LESSON_CACHE_SIZE", 1024)  # entries, 0 disables
+    LESSON_CACHE_TTL: float = env.float("LESSON_CACHE_TTL", 300.0)  # seconds
+    # Cache-Control max-age of the content-only lesson response (CDNs revalidate with its ETag)
+    LESSON_CONTENT_MAX_AGE: int = env.int("LESSON_CONTENT_MAX_AGE", 0)  # seconds
+    # second tier for lesson skeletons, memory-mapped and shared by the workers of a host
+    # (prd_server: 32 MiB; the container's /dev/shm must be larger)
+    SHM_CACHE_SIZE: int = env.int("SHM_CACHE_SIZE", 0)  # bytes, 0 disables
+    SHM_CACHE_PATH: str = env.str("SHM_CACHE_PATH", "/dev/shm/pair-lesson-skeletons")
+
+    # LESSON BUNDLES (several lessons in one response, for offline prefetch)
+    LESSON_BUNDLE_MAX_LESSONS: int = env.int("LESSON_BUNDLE_MAX_LESSONS", 20)  # per request
+    # smaller bundles are sent uncompressed; zstd (Python 3.14+ or `zstandard`) is preferred to gzip
+    LESSON_BUNDLE_COMPRESS_MIN_BYTES: int = env.int("LESSON_BUNDLE_COMPRESS_MIN_BYTES", 1024)
+
+    # PROGRESS WRITE-BEHIND
+    PROGRESS_WRITE_BEHIND: bool = env.bool("PROGRESS_WRITE_BEHIND", False)
+    PROGRESS_FLUSH_SIZE: int = env.int("PROGRESS_FLUSH_SIZE", 500)  # buffered keys
+    PROGRESS_FLUSH_INTERVAL: float = env.float("PROGRESS_FLUSH_INTERVAL", 1.0)  # seconds
+
+    # PROGRESS EVENTS (server-sent events fed by LISTEN/NOTIFY, one listen connection per process;
+    # off: progress writes do not NOTIFY and the events route answers 503)
+    PROGRESS_EVENTS: bool = env.bool("PROGRESS_EVENTS", False)
+    PROGRESS_EVENTS_QUEUE_SIZE: int = env.int("PROGRESS_EVENTS_QUEUE_SIZE", 32)  # per subscriber, then dropped
+    PROGRESS_EVENTS_MAX_SUBSCRIBERS: int = env.int("PROGRESS_EVENTS_MAX_SUBSCRIBERS", 10000)  # per process
+    PROGRESS_EVENTS_HEARTBEAT: float = env.float("PROGRESS_EVENTS_HEARTBEAT", 15.0)  # seconds
+
+    # ADMISSION (per-tenant fair queuing of the lesson routes for pool slots, per process)
+    ADMISSION_ENABLED: bool = env.bool("ADMISSION_ENABLED", True)
+    ADMISSION_READ_SLOTS: int = env.int("ADMISSION_READ_SLOTS", 0)  # 0: the pool's connections less the writes
+    ADMISSION_WRITE_SLOTS: int = env.int("ADMISSION_WRITE_SLOTS", 0)  # 0: a third of the pool's connections
+    ADMISSION_TENANT_SHARE: float = env.float("ADMISSION_TENANT_SHARE", 0.5)  # of a budget's slots per tenant while others wait
+    # "tenant_id:weight,..." for fair queuing, other tenants weigh 1
+    ADMISSION_TENANT_WEIGHTS: str = env.str("ADMISSION_TENANT_WEIGHTS", "")
+    ADMISSION_QUEUE_TIMEOUT: float = env.float("ADMISSION_QUEUE_TIMEOUT", 0.5)  # seconds queued, then shed
+    ADMISSION_MAX_QUEUE: int = env.int("ADMISSION_MAX_QUEUE", 64)  # waiting per tenant and budget, then shed
+    # tenants with their own metric labels besides the weighted ones (first seen), the rest are "other"
+    ADMISSION_METRIC_TENANTS: int = env.int("ADMISSION_METRIC_TENANTS", 20)
+
+    # ADMIN (bulk progress import/export)
+    # bearer token required on /admin endpoints, empty: they answer 403
+    ADMIN_TOKEN: str = env.str("ADMIN_TOKEN", "")
+    PROGRESS_IMPORT_MAX_REJECTS: int = env.int("PROGRESS_IMPORT_MAX_REJECTS", 1000)  # rejected lines listed
+
+    # PROFILER
+    PROFILER_ENABLED: bool = env.bool("PROFILER_ENABLED", False)
+    PROFILER_SLOW_MS: float = env.float("PROFILER_SLOW_MS", 250.0)  # capture threshold
+    PROFILER_SAMPLE_RATE: float = env.float("PROFILER_SAMPLE_RATE", 0.1)  # share of slow requests
+    PROFILER_MAX_QUERIES: int = env.int("PROFILER_MAX_QUERIES", 3)  # slowest statements explained
+    PROFILER_KEEP: int = env.int("PROFILER_KEEP", 50)  # captures kept in memory
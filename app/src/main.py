@@ -1,13 +1,38 @@
 import logging
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from src import api
+from src import services as svc
 from src.conf import AppConfig
 
 logging.captureWarnings(True)
 conf = AppConfig()
 
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Startup/shutdown: own the process-wide postgres pool."""
+    db = await svc.postgres.connect()
+    svc.admission.configure(db)
+    if conf.APP_WARMUP:
+        await svc.postgres.warmup(db)
+    await svc.health.monitor.start(db)
+    await svc.replicas.router.start(db)
+    if conf.PROGRESS_EVENTS:
+        await svc.listener.listener.start(conf.POSTGRES_URL)
+    if conf.PROGRESS_WRITE_BEHIND:
+        await svc.progress_buffer.buffer.start(db)
+    yield
+    await svc.progress_buffer.buffer.stop()
+    await svc.listener.listener.stop()
+    await svc.replicas.router.stop()
+    await svc.health.monitor.stop()
+    await svc.postgres.disconnect()
+
+
 app = FastAPI(
+    lifespan=lifespan,
     docs_url=conf.DOCS_URL,
     redoc_url=conf.REDOC_URL,
     openapi_url=conf.OPENAPI_URL,
@@ -20,9 +45,11 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(svc.instrumentation.MetricsMiddleware)
 
 app.include_router(api.health.router)
 
-app.include_router(api.v1.lessons.router)
+app.include_router(api.v1.lessons.router, prefix="/api/v1")
+app.include_router(api.v1.admin.router, prefix="/api/v1")
 # app.include_router(api.v1.blocks.router)
 
@@ -0,0 +1,359 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import math
+from collections import deque
+from sqlalchemy.ext.asyncio import AsyncEngine
+from sqlalchemy.pool import QueuePool
+from src.conf import AppConfig
+from src.services.instrumentation import registry
+
+conf = AppConfig()
+logging.basicConfig(level=conf.LOG_LEVEL)
+logger = logging.getLogger(__name__)
+
+ADMITTED = registry.counter(
+    "admission_admitted_total",
+    "Requests admitted by budget and tenant, at once or after queueing.",
+    ("budget", "tenant", "queued"),
+)
+SHED = registry.counter(
+    "admission_shed_total",
+    "Requests shed by budget, tenant and response status.",
+    ("budget", "tenant", "status"),
+)
+QUEUE_SECONDS = registry.histogram(
+    "admission_queue_wait_seconds",
+    "Time queued requests waited for a slot, admitted or shed.",
+    ("budget",),
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5),
+)
+
+# weight of the latest hold time in the moving average used for Retry-After
+HOLD_SMOOTHING = 0.1
+MAX_RETRY_AFTER = 30
+
+# tenants with their own metric label, see `tenant_label`
+_labelled: set[int] = set()
+
+
+def parse_weights(spec: str) -> dict[int, float]:
+    """`"7:4,12:0.5"` -> {7: 4.0, 12: 0.5}; malformed entries are logged and skipped."""
+    weights = {}
+    for item in filter(None, (item.strip() for item in spec.split(","))):
+        tenant, _, weight = item.partition(":")
+        try:
+            tenant_id, value = int(tenant), float(weight)
+        except ValueError:
+            value = 0.0
+        if value > 0:
+            weights[tenant_id] = value
+        else:
+            logger.warning("ignoring admission weight %r", item)
+    return weights
+
+
+def tenant_label(tenant_id: int) -> str:
+    """
+    Metric label of a tenant: its id for weighted tenants and the first
+    ADMISSION_METRIC_TENANTS others seen by the process, "other" beyond, so
+    the number of series stays bounded however many tenants there are.
+    """
+    if tenant_id in _labelled or tenant_id in weights:
+        return str(tenant_id)
+    if len(_labelled) < conf.ADMISSION_METRIC_TENANTS:
+        _labelled.add(tenant_id)
+        return str(tenant_id)
+    return "other"
+
+
+class TenantState:
+    """One tenant's share of a budget: requests holding slots and waiting for one."""
+
+    __slots__ = ("active", "finish", "waiting")
+
+    def __init__(self):
+        self.active = 0
+        # virtual finish time of the tenant's latest request (fair queuing tag)
+        self.finish = 0.0
+        # (virtual start time, waiter), in arrival order
+        self.waiting: deque[tuple[float, asyncio.Future]] = deque()
+
+
+class Budget:
+    """Slots of one kind of request (reads or writes) shared fairly by tenants.
+
+    At most `slots` requests hold a slot at a time, and a tenant at most
+    `tenant_share` of them while another tenant is waiting, so one tenant
+    cannot keep the others out of the pool; slots nobody else is waiting
+    for are lent to it (work conserving). When no slot is free a request
+    waits in its tenant's queue; freed slots go first to the waiting
+    tenants below their share, by weighted fair queuing (start-time fair
+    queuing: each request is tagged with a virtual start time that grows by
+    1/weight per request of its tenant, and the smallest tag goes first),
+    so a tenant with many queued requests does not delay a tenant with few.
+    The waiting tenants are kept in a heap on the tag of their oldest
+    request; a tenant's state is dropped once it holds and awaits nothing.
+
+    A request that waited `timeout` seconds, or finds `max_queue` requests
+    of its tenant already waiting, is shed instead of queueing deeper:
+    429 when its tenant holds its full share (that tenant is over its
+    limit), 503 otherwise (the service is). Shed results carry a
+    Retry-After estimated from the queue length and the average hold time.
+
+    Per process, like the pool. Not thread safe; meant to be used from a
+    single asyncio event loop.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        slots: int,
+        tenant_share: float,
+        timeout: float,
+        max_queue: int,
+        weights: dict[int, float] | None = None,
+    ):
+        self.name = name
+        self.tenant_share = tenant_share
+        self.timeout = timeout
+        self.max_queue = max_queue
+        self.weights = weights or {}
+        self.tenants: dict[int, TenantState] = {}
+        # (tag, seq, tenant_id, entry) per waiting tenant, on its head entry;
+        # entries no longer at the head of their queue are skipped when popped
+        self._heads: list[tuple[float, int, int, tuple]] = []
+        self._seq = itertools.count()
+        self.in_use = 0
+        self.clock = 0.0
+        self.hold_seconds = 0.0
+        self.admitted = 0
+        self.shed = {429: 0, 503: 0}
+        self.resize(slots)
+
+    def resize(self, slots: int) -> None:
+        self.slots = max(slots, 1)
+        self.tenant_limit = max(1, math.floor(self.slots * self.tenant_share))
+        self._dispatch()
+
+    def _tenant(self, tenant_id: int) -> TenantState:
+        tenant = self.tenants.get(tenant_id)
+        if tenant is None:
+            tenant = self.tenants[tenant_id] = TenantState()
+        return tenant
+
+    def _forget(self, tenant_id: int, tenant: TenantState) -> None:
+        # an idle tenant's virtual finish time is at most 1/weight past the
+        # clock: dropping it costs that much fairness, keeping it costs memory
+        if not tenant.active and not tenant.waiting and self.tenants.get(tenant_id) is tenant:
+            del self.tenants[tenant_id]
+
+    def _push_head(self, tenant_id: int, tenant: TenantState) -> None:
+        if tenant.waiting:
+            entry = tenant.waiting[0]
+            heapq.heappush(self._heads, (entry[0], next(self._seq), tenant_id, entry))
+
+    def _tag(self, tenant_id: int, tenant: TenantState) -> float:
+        start = max(self.clock, tenant.finish)
+        tenant.finish = start + 1 / self.weights.get(tenant_id, 1.0)
+        return start
+
+    def _grant(self, tenant_id: int, tenant: TenantState, start: float, queued: bool) -> None:
+        self.in_use += 1
+        tenant.active += 1
+        self.admitted += 1
+        self.clock = max(self.clock, start)
+        ADMITTED.inc(budget=self.name, tenant=tenant_label(tenant_id), queued=str(queued).lower())
+
+    def _dispatch(self) -> None:
+        # tenants holding their full share keep their place, out of the heap meanwhile
+        held = []
+        while self.in_use < self.slots and self._heads:
+            head = heapq.heappop(self._heads)
+            tenant = self._waiting_tenant(head)
+            if tenant is None:
+                continue
+            if tenant.active >= self.tenant_limit:
+                held.append(head)
+                continue
+            self._grant_head(head[2], tenant)
+        for head in held:
+            heapq.heappush(self._heads, head)
+        # nobody below its share is waiting: lend the free slots, still in tag order
+        while self.in_use < self.slots and self._heads:
+            head = heapq.heappop(self._heads)
+            tenant = self._waiting_tenant(head)
+            if tenant is not None:
+                self._grant_head(head[2], tenant)
+
+    def _waiting_tenant(self, head: tuple) -> TenantState | None:
+        # None for the head of a waiter that was served, timed out or went away
+        _, _, tenant_id, entry = head
+        tenant = self.tenants.get(tenant_id)
+        if tenant is None or not tenant.waiting or tenant.waiting[0] is not entry:
+            return None
+        return tenant
+
+    def _grant_head(self, tenant_id: int, tenant: TenantState) -> None:
+        start, waiter = tenant.waiting.popleft()
+        self._grant(tenant_id, tenant, start, queued=True)
+        self._push_head(tenant_id, tenant)
+        waiter.set_result(None)
+
+    async def acquire(self, tenant_id: int) -> dict | None:
+        """Take a slot for the tenant: None once admitted, else why it was shed.
+
+        Every admitted request must `release` its slot.
+        """
+        tenant = self._tenant(tenant_id)
+        # slots free means nobody is waiting: the queue is drained on every release
+        if self.in_use < self.slots:
+            self._grant(tenant_id, tenant, self._tag(tenant_id, tenant), queued=False)
+            return None
+        if len(tenant.waiting) >= self.max_queue:
+            return self._shed(tenant_id, tenant, "queue_full")
+
+        loop = asyncio.get_running_loop()
+        waiter = loop.create_future()
+        entry = (self._tag(tenant_id, tenant), waiter)
+        tenant.waiting.append(entry)
+        if len(tenant.waiting) == 1:
+            self._push_head(tenant_id, tenant)
+        started = loop.time()
+        try:
+            async with asyncio.timeout(self.timeout):
+                await waiter
+        except BaseException as e:
+            if waiter.done() and not waiter.cancelled():
+                # granted as the deadline passed: keep the slot unless cancelled
+                if isinstance(e, TimeoutError):
+                    return None
+                self.release(tenant_id, 0.0)
+                raise
+            head = tenant.waiting[0] is entry
+            tenant.waiting.remove(entry)
+            if head:
+                self._push_head(tenant_id, tenant)
+                self._compact()
+            if isinstance(e, TimeoutError):
+                return self._shed(tenant_id, tenant, "queue_timeout")
+            self._forget(tenant_id, tenant)
+            raise
+        finally:
+            QUEUE_SECONDS.observe(loop.time() - started, budget=self.name)
+        return None
+
+    def release(self, tenant_id: int, held: float) -> None:
+        """Give back a slot taken by `acquire`, held for `held` seconds."""
+        tenant = self.tenants[tenant_id]
+        tenant.active -= 1
+        self.in_use -= 1
+        self.hold_seconds += HOLD_SMOOTHING * (held - self.hold_seconds)
+        self._dispatch()
+        self._forget(tenant_id, tenant)
+
+    def _compact(self) -> None:
+        # heads of waiters that timed out or went away: rebuild once they dominate
+        if len(self._heads) > 2 * len(self.tenants) + 64:
+            self._heads = [
+                head for head in self._heads
+                if (tenant := self.tenants.get(head[2])) is not None
+                and tenant.waiting and tenant.waiting[0] is head[3]
+            ]
+            heapq.heapify(self._heads)
+
+    def _shed(self, tenant_id: int, tenant: TenantState, reason: str) -> dict:
+        status = 429 if tenant.active >= self.tenant_limit else 503
+        self.shed[status] += 1
+        SHED.inc(budget=self.name, tenant=tenant_label(tenant_id), status=str(status))
+        self._forget(tenant_id, tenant)
+        waiting = sum(len(t.waiting) for t in self.tenants.values())
+        # time for the slots to work off the queue ahead of a retry
+        drain = self.hold_seconds * (waiting + 1) / self.slots
+        return {
+            "error": reason,
+            "status": status,
+            "retry_after": min(MAX_RETRY_AFTER, max(1, math.ceil(drain))),
+        }
+
+    def queue_depths(self) -> dict[int, int]:
+        return {tenant_id: len(t.waiting) for tenant_id, t in self.tenants.items()}
+
+    def stats(self) -> dict:
+        """Budget totals, and the tenants currently holding or waiting for slots."""
+        return {
+            "slots": self.slots,
+            "tenant_limit": self.tenant_limit,
+            "in_use": self.in_use,
+            "waiting": sum(self.queue_depths().values()),
+            "hold_ms": round(self.hold_seconds * 1000, 2),
+            "admitted": self.admitted,
+            "shed_429": self.shed[429],
+            "shed_503": self.shed[503],
+            "tenants": {
+                str(tenant_id): {"active": t.active, "waiting": len(t.waiting)}
+                for tenant_id, t in sorted(self.tenants.items())
+            },
+        }
+
+
+def budget_slots(connections: int) -> tuple[int, int]:
+    """(read slots, write slots) for a pool of `connections`, unless configured."""
+    writes = conf.ADMISSION_WRITE_SLOTS or max(1, connections // 3)
+    reads = conf.ADMISSION_READ_SLOTS or max(1, connections - writes)
+    return reads, writes
+
+
+def configure(db: AsyncEngine) -> None:
+    """Size the budgets to the primary's pool, once the connection budget applied."""
+    pool = db.pool
+    if not isinstance(pool, QueuePool):
+        return
+    connections = pool.size() + max(pool._max_overflow, 0)
+    read_slots, write_slots = budget_slots(connections)
+    reads.resize(read_slots)
+    writes.resize(write_slots)
+
+
+weights = parse_weights(conf.ADMISSION_TENANT_WEIGHTS)
+_read_slots, _write_slots = budget_slots(conf.POSTGRES_POOL_SIZE + conf.POSTGRES_POOL_MAX_OVERFLOW)
+reads = Budget(
+    "read",
+    slots=_read_slots,
+    tenant_share=conf.ADMISSION_TENANT_SHARE,
+    timeout=conf.ADMISSION_QUEUE_TIMEOUT,
+    max_queue=conf.ADMISSION_MAX_QUEUE,
+    weights=weights,
+)
+writes = Budget(
+    "write",
+    slots=_write_slots,
+    tenant_share=conf.ADMISSION_TENANT_SHARE,
+    timeout=conf.ADMISSION_QUEUE_TIMEOUT,
+    max_queue=conf.ADMISSION_MAX_QUEUE,
+    weights=weights,
+)
+
+
+def _queue_depths() -> dict[tuple[str, str], int]:
+    depths = {}
+    for budget in (reads, writes):
+        for tenant_id, depth in budget.queue_depths().items():
+            key = (budget.name, tenant_label(tenant_id))
+            depths[key] = depths.get(key, 0) + depth
+    return depths
+
+
+registry.gauge(
+    "admission_queue_depth",
+    "Requests waiting for a slot by budget and tenant.",
+    _queue_depths,
+    ("budget", "tenant"),
+)
+registry.gauge(
+    "admission_slots_in_use",
+    "Slots held by admitted requests by budget.",
+    lambda: {(budget.name,): budget.in_use for budget in (reads, writes)},
+    ("budget",),
+)
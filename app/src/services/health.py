@@ -0,0 +1,147 @@
+import asyncio
+import logging
+import time
+from datetime import datetime, timezone
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncEngine
+from sqlalchemy.pool import QueuePool
+from src.conf import AppConfig
+
+conf = AppConfig()
+logging.basicConfig(level=conf.LOG_LEVEL)
+logger = logging.getLogger(__name__)
+
+
+def pool_status(db: AsyncEngine) -> dict:
+    """Connection counts of the engine's pool (in memory, no I/O)."""
+    pool = db.pool
+    if not isinstance(pool, QueuePool):
+        return {}
+    capacity = pool.size() + max(pool._max_overflow, 0)
+    checked_out = pool.checkedout()
+    return {
+        "size": pool.size(),
+        "max_overflow": pool._max_overflow,
+        "checked_out": checked_out,
+        "idle": pool.checkedin(),
+        "overflow": max(pool.overflow(), 0),
+        "saturation": round(checked_out / capacity, 3) if capacity else 0.0,
+    }
+
+
+class HealthMonitor:
+    """Background Postgres check whose result is cached for the probes.
+
+    Every `interval` seconds one connection is checked out of the shared
+    pool and pinged with `SELECT 1`; the checkout wait, the ping latency and
+    the pool counters are stored. /api/livez and /api/readyz only read the
+    cached result, so probes never queue for, or open, a connection.
+    """
+
+    def __init__(self, interval: float, timeout: float):
+        self.interval = interval
+        self.timeout = timeout
+        self._db: AsyncEngine | None = None
+        self._task: asyncio.Task | None = None
+        self.checks = 0
+        self.failures = 0
+        self.last: dict | None = None
+        self._checked_at = 0.0
+
+    async def start(self, db: AsyncEngine) -> None:
+        self._db = db
+        if self._task is None:
+            # the first result is in place before the app takes traffic
+            await self.check()
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            await self.check()
+
+    async def check(self) -> dict:
+        """Ping Postgres through the pool once and cache the result."""
+        result = {
+            "ok": False,
+            "checked_at": datetime.now(timezone.utc).isoformat(timespec="milliseconds"),
+            "pool_wait_ms": None,
+            "ping_ms": None,
+            "error": None,
+        }
+        started = time.perf_counter()
+        try:
+            async with asyncio.timeout(self.timeout):
+                async with self._db.connect() as conn:
+                    # includes the pre-ping of a pooled connection, if enabled
+                    connected = time.perf_counter()
+                    result["pool_wait_ms"] = round((connected - started) * 1000, 2)
+                    await conn.execute(text("SELECT 1"))
+                    result["ping_ms"] = round((time.perf_counter() - connected) * 1000, 2)
+            result["ok"] = True
+        except TimeoutError:
+            result["error"] = f"no answer within {self.timeout}s"
+            if result["pool_wait_ms"] is None:
+                # still waiting for a connection: the wait is at least the timeout
+                result["pool_wait_ms"] = round(self.timeout * 1000, 2)
+        except Exception as e:
+            result["error"] = f"{type(e).__name__}: {e}"
+
+        result["pool"] = pool_status(self._db)
+        self.checks += 1
+        if not result["ok"]:
+            self.failures += 1
+            logger.warning("postgres health check failed: %s", result["error"])
+        self._checked_at = time.monotonic()
+        self.last = result
+        return result
+
+    def liveness(self) -> dict:
+        """The process serves requests and the monitor loop is running.
+
+        Database trouble does not fail liveness: restarting the process
+        would not fix it, readiness takes the instance out of rotation.
+        """
+        crashed = self._task is not None and self._task.done()
+        return {"alive": not crashed, "checks": self.checks}
+
+    def readiness(self) -> dict:
+        """Evaluate the cached check against the configured thresholds."""
+        reasons = []
+        last = self.last
+        if last is None:
+            reasons.append("no health check has run yet")
+        else:
+            age = time.monotonic() - self._checked_at
+            if age > conf.HEALTH_STALE_AFTER:
+                reasons.append(f"last check is {age:.1f}s old")
+            if not last["ok"]:
+                reasons.append(f"postgres ping failed: {last['error']}")
+            if last["ping_ms"] is not None and last["ping_ms"] > conf.HEALTH_MAX_PING_MS:
+                reasons.append(f"ping {last['ping_ms']}ms > {conf.HEALTH_MAX_PING_MS}ms")
+            if last["pool_wait_ms"] is not None and last["pool_wait_ms"] > conf.HEALTH_MAX_POOL_WAIT_MS:
+                reasons.append(
+                    f"pool wait {last['pool_wait_ms']}ms > {conf.HEALTH_MAX_POOL_WAIT_MS}ms"
+                )
+        return {
+            "ready": not reasons,
+            "reasons": reasons,
+            "postgres": last,
+            "checks": self.checks,
+            "failures": self.failures,
+        }
+
+
+monitor = HealthMonitor(
+    interval=conf.HEALTH_CHECK_INTERVAL,
+    timeout=conf.HEALTH_CHECK_TIMEOUT,
+)
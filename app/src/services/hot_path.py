@@ -0,0 +1,190 @@
+import logging
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from typing import AsyncIterator
+import asyncpg
+from sqlalchemy import text
+from sqlalchemy.dialects.postgresql.asyncpg import dialect as asyncpg_dialect
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncEngine
+from src.conf import AppConfig
+from src.services import instrumentation
+
+conf = AppConfig()
+logging.basicConfig(level=conf.LOG_LEVEL)
+logger = logging.getLogger(__name__)
+
+_dialect = asyncpg_dialect()
+
+# process-wide counters over all connections' statement caches
+stats = {"hits": 0, "prepares": 0, "evictions": 0, "reprepares": 0}
+
+# every HotQuery by name, prepared ahead of traffic by `prepare`
+queries: dict[str, "HotQuery"] = {}
+
+
+class HotQuery:
+    """A statement of the hot path, written once with :named parameters.
+
+    `clause` is the SQLAlchemy form; `sql` is the same statement compiled
+    for asyncpg ($n placeholders) with `names` giving the argument order.
+    """
+
+    __slots__ = ("name", "clause", "sql", "names")
+
+    def __init__(self, name: str, sql: str):
+        self.name = name
+        self.clause = text(sql)
+        compiled = self.clause.compile(dialect=_dialect)
+        self.sql = compiled.string
+        self.names = tuple(compiled.positiontup or ())
+        queries[name] = self
+
+    def args(self, params: dict) -> tuple:
+        return tuple(params[name] for name in self.names)
+
+
+class StatementCache:
+    """LRU of named prepared statements for one connection.
+
+    Kept in the pooled connection's `info`, so it lives exactly as long as
+    the server session its statements were prepared on. Names get a
+    per-connection sequence number: an evicted statement is deallocated by
+    asyncpg once it is garbage collected, and must not collide with a
+    re-prepare under the same name before that.
+    """
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self._statements: OrderedDict[str, asyncpg.prepared_stmt.PreparedStatement] = OrderedDict()
+        self._sequence = 0
+
+    async def get(self, driver: asyncpg.Connection, query: HotQuery):
+        statement = self._statements.get(query.name)
+        if statement is not None:
+            self._statements.move_to_end(query.name)
+            stats["hits"] += 1
+            return statement
+
+        self._sequence += 1
+        statement = await driver.prepare(query.sql, name=f"hot_{query.name}_{self._sequence}")
+        stats["prepares"] += 1
+        self._statements[query.name] = statement
+        while len(self._statements) > self.maxsize:
+            self._statements.popitem(last=False)
+            stats["evictions"] += 1
+        return statement
+
+    def __contains__(self, query: HotQuery) -> bool:
+        return query.name in self._statements
+
+    def discard(self, query: HotQuery) -> None:
+        self._statements.pop(query.name, None)
+
+
+class HotConnection:
+    """asyncpg connection of a pooled SQLAlchemy connection, with its statement cache.
+
+    Statements run in autocommit: no implicit BEGIN/ROLLBACK round trips
+    around single-statement reads and the single-statement upsert.
+    Records are returned as is (mapping access by column name).
+    """
+
+    __slots__ = ("driver", "statements")
+
+    def __init__(self, driver: asyncpg.Connection, statements: StatementCache):
+        self.driver = driver
+        self.statements = statements
+
+    async def _run(self, method: str, query: HotQuery, params: dict):
+        args = query.args(params)
+        started = time.perf_counter()
+        try:
+            for attempt in (1, 2):
+                statement = await self.statements.get(self.driver, query)
+                try:
+                    return await getattr(statement, method)(*args)
+                except (asyncpg.InvalidCachedStatementError, asyncpg.InvalidSQLStatementNameError):
+                    # schema changed under the plan, or the session lost it (DISCARD)
+                    self.statements.discard(query)
+                    stats["reprepares"] += 1
+                    if attempt == 2:
+                        raise
+        except Exception:
+            instrumentation.QUERY_ERRORS.inc()
+            raise
+        finally:
+            instrumentation.record_query(time.perf_counter() - started, query.sql, args)
+
+    async def fetch(self, query: HotQuery, params: dict) -> list[asyncpg.Record]:
+        return await self._run("fetch", query, params)
+
+    async def fetchrow(self, query: HotQuery, params: dict) -> asyncpg.Record | None:
+        return await self._run("fetchrow", query, params)
+
+
+@asynccontextmanager
+async def connect(
+    db: AsyncEngine, autocommit: bool = False
+) -> AsyncIterator[HotConnection | AsyncConnection]:
+    """
+    Check out a pooled connection for hot-path queries.
+
+    Yields a HotConnection when POSTGRES_HOT_PATH is on, otherwise the plain
+    SQLAlchemy connection (in AUTOCOMMIT if `autocommit`); `fetch` and
+    `fetchrow` accept both.
+    """
+    async with db.connect() as conn:
+        if not conf.POSTGRES_HOT_PATH:
+            if autocommit:
+                conn = await conn.execution_options(isolation_level="AUTOCOMMIT")
+            yield conn
+            return
+
+        yield await _hot_connection(conn)
+
+
+async def _hot_connection(conn: AsyncConnection) -> HotConnection:
+    raw = await conn.get_raw_connection()
+    statements = raw.info.get("hot_statements")
+    if statements is None:
+        statements = raw.info["hot_statements"] = StatementCache(conf.POSTGRES_STATEMENT_CACHE_SIZE)
+    return HotConnection(raw.driver_connection, statements)
+
+
+async def prepare(conn: AsyncConnection) -> int:
+    """
+    Prepare the hot statements on a pooled connection ahead of traffic (as
+    many as its statement cache holds). A statement that fails to prepare
+    is skipped; it fails again, visibly, when used. Returns the number prepared.
+    """
+    if not conf.POSTGRES_HOT_PATH:
+        return 0
+    hot = await _hot_connection(conn)
+    prepared = 0
+    for query in list(queries.values())[:hot.statements.maxsize]:
+        if query in hot.statements:
+            continue
+        try:
+            await hot.statements.get(hot.driver, query)
+        except asyncpg.PostgresError as e:
+            logger.warning("cannot prepare %s: %s", query.name, e)
+            continue
+        prepared += 1
+    # asyncpg's prepare leaves the server in an implicit transaction holding
+    # the statements' table locks until the next query (which would block
+    # DDL on an idle pooled connection): end it
+    await hot.driver.execute("SELECT 1")
+    return prepared
+
+
+async def fetch(conn: HotConnection | AsyncConnection, query: HotQuery, params: dict) -> list:
+    if isinstance(conn, HotConnection):
+        return await conn.fetch(query, params)
+    return (await conn.execute(query.clause, params)).mappings().all()
+
+
+async def fetchrow(conn: HotConnection | AsyncConnection, query: HotQuery, params: dict):
+    if isinstance(conn, HotConnection):
+        return await conn.fetchrow(query, params)
+    return (await conn.execute(query.clause, params)).mappings().one_or_none()
@@ -0,0 +1,297 @@
+import asyncio
+import json
+import logging
+import random
+import re
+import time
+from collections import deque
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+from src.conf import AppConfig
+from src.utils.metrics import Registry
+
+conf = AppConfig()
+logging.basicConfig(level=conf.LOG_LEVEL)
+logger = logging.getLogger(__name__)
+
+registry = Registry()
+
+REQUEST_SECONDS = registry.histogram(
+    "http_request_duration_seconds",
+    "Request latency, until the last body chunk is sent.",
+    ("method", "route", "status"),
+)
+REQUEST_QUERIES = registry.histogram(
+    "http_request_db_queries",
+    "Database round trips per request.",
+    ("route",),
+    buckets=(0, 1, 2, 3, 4, 6, 8, 12, 16, 32, 64),
+)
+REQUEST_DB_SECONDS = registry.histogram(
+    "http_request_db_seconds",
+    "Time spent waiting on the database per request.",
+    ("route",),
+)
+QUERY_SECONDS = registry.histogram(
+    "db_query_duration_seconds",
+    "Latency of single statements, measured around the driver call.",
+)
+QUERY_ERRORS = registry.counter(
+    "db_query_errors_total",
+    "Statements that raised.",
+)
+POOL_WAIT_SECONDS = registry.histogram(
+    "db_pool_checkout_wait_seconds",
+    "Time to get a connection from the pool, including connecting a new one.",
+    buckets=(0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 30.0),
+)
+PROFILER_CAPTURES = registry.counter(
+    "profiler_captures_total",
+    "Slow requests captured by the sampling profiler.",
+)
+
+_engine: AsyncEngine | None = None
+
+
+def _pool_connections() -> dict[tuple[str, ...], float]:
+    pool = _engine.pool if _engine is not None else None
+    if not isinstance(pool, AsyncAdaptedQueuePool):
+        return {}
+    return {
+        ("checked_out",): pool.checkedout(),
+        ("idle",): pool.checkedin(),
+        ("overflow",): max(pool.overflow(), 0),
+    }
+
+
+registry.gauge(
+    "db_pool_connections",
+    "Connections in the pool by state.",
+    _pool_connections,
+    ("state",),
+)
+
+
+class RequestStats:
+    """Database usage of the current request, collected by the cursor events."""
+
+    __slots__ = ("queries", "db_seconds", "pool_wait_seconds", "statements")
+
+    def __init__(self, record_statements: bool = False):
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.pool_wait_seconds = 0.0
+        # (seconds, statement, parameters), only kept while profiling
+        self.statements: list[tuple[float, str, tuple]] | None = [] if record_statements else None
+
+
+_request_stats: ContextVar[RequestStats | None] = ContextVar("request_stats", default=None)
+
+
+def current_stats() -> RequestStats | None:
+    return _request_stats.get()
+
+
+class InstrumentedPool(AsyncAdaptedQueuePool):
+    """Queue pool that records how long each checkout waited."""
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            elapsed = time.perf_counter() - started
+            POOL_WAIT_SECONDS.observe(elapsed)
+            stats = _request_stats.get()
+            if stats is not None:
+                stats.pool_wait_seconds += elapsed
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+
+def record_query(elapsed: float, statement: str, parameters: tuple | None) -> None:
+    """
+    Account one statement to the metrics and the current request.
+
+    Called by the cursor events, and directly by code that bypasses
+    SQLAlchemy (see hot_path); `parameters` is None for executemany.
+    """
+    QUERY_SECONDS.observe(elapsed)
+    stats = _request_stats.get()
+    if stats is not None:
+        stats.queries += 1
+        stats.db_seconds += elapsed
+        if stats.statements is not None and parameters is not None:
+            stats.statements.append((elapsed, statement, parameters))
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info["query_started"].pop()
+    record_query(elapsed, statement, None if executemany else tuple(parameters or ()))
+
+
+def _handle_error(exception_context):
+    QUERY_ERRORS.inc()
+    conn = exception_context.connection
+    started = conn.info.get("query_started") if conn is not None else None
+    if started:
+        elapsed = time.perf_counter() - started.pop()
+        stats = _request_stats.get()
+        if stats is not None:
+            stats.queries += 1
+            stats.db_seconds += elapsed
+
+
+def instrument_engine(engine: AsyncEngine, primary: bool = True) -> None:
+    """
+    Attach the query timing events to `engine`; the primary's pool is also
+    reported and used by the profiler.
+    """
+    global _engine
+    if primary:
+        _engine = engine
+    event.listen(engine.sync_engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine.sync_engine, "after_cursor_execute", _after_cursor_execute)
+    event.listen(engine.sync_engine, "handle_error", _handle_error)
+
+
+def _route_template(scope) -> str:
+    route = scope.get("route")
+    # the template keeps label cardinality bounded; unmatched paths share one label
+    return getattr(route, "path_format", None) or getattr(route, "path", None) or "unmatched"
+
+
+class MetricsMiddleware:
+    """
+    Pure ASGI middleware recording latency, round trips and DB time per route.
+
+    Runs the request with a fresh RequestStats in a context variable; the
+    cursor events of any query made while handling it (including from a
+    streaming body) add to it.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestStats(record_statements=conf.PROFILER_ENABLED)
+        token = _request_stats.set(stats)
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            elapsed = time.perf_counter() - started
+            _request_stats.reset(token)
+            route = _route_template(scope)
+            REQUEST_SECONDS.observe(elapsed, method=scope["method"], route=route, status=status)
+            REQUEST_QUERIES.observe(stats.queries, route=route)
+            REQUEST_DB_SECONDS.observe(stats.db_seconds, route=route)
+            if conf.PROFILER_ENABLED:
+                profiler.consider(scope, route, status, elapsed, stats)
+
+
+# data-modifying statements, top level or in a CTE: not re-executed by the profiler
+_WRITES = re.compile(r"\b(INSERT|UPDATE|DELETE|MERGE)\b", re.IGNORECASE)
+
+
+class SlowRequestProfiler:
+    """
+    Opt-in sampler of slow requests (PROFILER_ENABLED).
+
+    A request slower than PROFILER_SLOW_MS is captured with probability
+    PROFILER_SAMPLE_RATE. Its slowest reads are re-run under
+    EXPLAIN (ANALYZE, BUFFERS) in a transaction that is always rolled back,
+    on a raw driver connection so the re-runs do not show up in the query
+    metrics; statements that write (the progress upserts) only get a plain
+    EXPLAIN, never executed again. At most one capture is explained at a time; slow requests
+    arriving meanwhile are skipped rather than adding load. The last
+    PROFILER_KEEP captures are kept in memory (see /api/profilez).
+    """
+
+    def __init__(self, keep: int):
+        self.captures: deque[dict] = deque(maxlen=keep)
+        self.skipped = 0
+        self._task: asyncio.Task | None = None
+
+    def consider(self, scope, route: str, status: int, elapsed: float, stats: RequestStats) -> None:
+        if elapsed * 1000 < conf.PROFILER_SLOW_MS or random.random() >= conf.PROFILER_SAMPLE_RATE:
+            return
+        if self._task is not None and not self._task.done():
+            self.skipped += 1
+            return
+
+        capture = {
+            "captured_at": datetime.now(timezone.utc).isoformat(timespec="milliseconds"),
+            "method": scope["method"],
+            "route": route,
+            "path": scope["path"],
+            "status": status,
+            "duration_ms": round(elapsed * 1000, 2),
+            "db_ms": round(stats.db_seconds * 1000, 2),
+            "pool_wait_ms": round(stats.pool_wait_seconds * 1000, 2),
+            "queries": stats.queries,
+            "statements": [],
+        }
+        slowest = sorted(stats.statements or (), key=lambda s: s[0], reverse=True)
+        self._task = asyncio.create_task(self._explain(capture, slowest[: conf.PROFILER_MAX_QUERIES]))
+
+    async def _explain(self, capture: dict, statements: list[tuple[float, str, tuple]]) -> None:
+        try:
+            if statements and _engine is not None:
+                async with _engine.connect() as conn:
+                    raw = (await conn.get_raw_connection()).driver_connection
+                    for seconds, statement, parameters in statements:
+                        capture["statements"].append({
+                            "duration_ms": round(seconds * 1000, 2),
+                            "statement": statement,
+                            "plan": await self._plan(raw, statement, parameters),
+                        })
+        except Exception:
+            logger.exception("profiler: explain failed for %s", capture["path"])
+        self.captures.append(capture)
+        PROFILER_CAPTURES.inc()
+
+    @staticmethod
+    async def _plan(raw, statement: str, parameters: tuple):
+        if not statement.lstrip().upper().startswith(("SELECT", "WITH", "INSERT", "UPDATE", "DELETE")):
+            return None
+        options = "FORMAT JSON" if _WRITES.search(statement) else "ANALYZE, BUFFERS, FORMAT JSON"
+        transaction = raw.transaction()
+        await transaction.start()
+        try:
+            plan = await raw.fetchval(f"EXPLAIN ({options}) {statement}", *parameters)
+        except Exception as e:
+            return {"error": str(e)}
+        finally:
+            # ANALYZE executes the statement (volatile functions included): keep nothing
+            await transaction.rollback()
+        return json.loads(plan) if isinstance(plan, str) else plan
+
+    def stats(self) -> dict:
+        return {
+            "enabled": conf.PROFILER_ENABLED,
+            "slow_ms": conf.PROFILER_SLOW_MS,
+            "sample_rate": conf.PROFILER_SAMPLE_RATE,
+            "skipped": self.skipped,
+            "captures": list(reversed(self.captures)),
+        }
+
+
+profiler = SlowRequestProfiler(keep=conf.PROFILER_KEEP)
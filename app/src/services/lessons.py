@@ -1,71 +1,495 @@
 import logging
+from typing import AsyncIterator
+import orjson
 from sqlalchemy import text
-from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncEngine
 from src.conf import AppConfig
+from src.services import hot_path
+from src.services.replicas import router as replicas
+from src.services.hot_path import HotConnection, HotQuery
+from src.services.listener import listener
+from src.services.progress_buffer import buffer as progress_buffer, max_status
+from src.services.singleflight import SingleFlight
+from src.utils.cache import LRUCache
+from src.utils.http import etag_matches
+from src.utils.shm_cache import SharedCache
 
 conf = AppConfig()
 logging.basicConfig(level=conf.LOG_LEVEL)
 
+# (tenant_id, lesson_id) -> ordered blocks with resolved variants (see build_skeleton)
+skeleton_cache = LRUCache(maxsize=conf.LESSON_CACHE_SIZE, ttl=conf.LESSON_CACHE_TTL)
+# same, as encoded blocks shared with the other workers of the host
+shared_skeletons = SharedCache(conf.SHM_CACHE_PATH, conf.SHM_CACHE_SIZE)
+# (tenant_id, lesson_id) -> the same without variant payloads (see get_lesson_outline)
+outline_cache = LRUCache(maxsize=conf.LESSON_CACHE_SIZE, ttl=conf.LESSON_CACHE_TTL)
+# concurrent skeleton misses of one (tenant_id, lesson_id, revision) share one query
+skeleton_flights = SingleFlight("lesson_skeleton")
 
+# block fields a lesson response can be narrowed to (`fields`); "id" is always
+# included and "variant.data" implies "variant"
+BLOCK_FIELDS = ("type", "position", "variant", "variant.data", "user_progress")
 
-async def get_lesson(tenant_id: int, user_id: int, lesson_id: int) -> dict | None:
+
+async def get_lesson(
+    db: AsyncEngine, tenant_id: int, user_id: int, lesson_id: int
+) -> dict | None:
     """
     Retrieve tenant > user > lesson.
+    """
+    assembled = await assemble_lesson(db, tenant_id, user_id, lesson_id)
+    if assembled is None:
+        return None
+
+    *parts, _ = assembled
+    return lesson_dict(*parts)
+
+
+async def get_lesson_json(
+    db: AsyncEngine,
+    tenant_id: int,
+    user_id: int,
+    lesson_id: int,
+    if_none_match: str | None = None,
+    fields: frozenset[str] | None = None,
+) -> tuple[bytes | None, str | None] | None:
+    """
+    Same as `get_lesson`, encoded to JSON bytes from the skeleton's
+    pre-encoded block fragments, with the response's ETag (see `lesson_etag`).
+
+    With `if_none_match`, the current ETag is checked first with primary key
+    lookups only; (None, etag) when it matches, nothing is assembled.
+
+    With `fields` (a subset of BLOCK_FIELDS), blocks only carry their id and
+    those fields; unless "variant.data" is asked for, no variant payload is
+    read (see `get_lesson_outline`).
+    """
+    if if_none_match:
+        etag = await get_lesson_etag(db, tenant_id, user_id, lesson_id)
+        if etag is not None and etag_matches(if_none_match, etag):
+            return None, etag
+
+    outline = fields is not None and "variant.data" not in fields
+    assembled = await assemble_lesson(db, tenant_id, user_id, lesson_id, outline)
+    if assembled is None:
+        return None
+
+    *parts, etag = assembled
+    if fields is not None:
+        return lesson_json_fields(*parts, fields), etag
+    return lesson_json(*parts), etag
+
+
+def lesson_etag(content_revision: int, progress_version: int | None) -> str:
+    """
+    Strong ETag of a lesson response: the lesson's content_revision (bumped
+    on any change to its blocks, variants, slug or title) and the row
+    version (xmin) of the user's progress rollup, which is rewritten on
+    every progress transition. Both only move when the response changes.
+    """
+    return f'"{content_revision}.{progress_version or 0}"'
+
+
+LESSON_VERSION = HotQuery("lesson_version", """
+    SELECT
+        l.content_revision AS content_revision,
+        ulp.xmin::text::bigint AS progress_version
+    FROM lessons l
+    JOIN users u ON u.id = :user_id AND u.tenant_id = :tenant_id
+    LEFT JOIN user_lesson_progress ulp
+        ON ulp.user_id = :user_id
+       AND ulp.lesson_id = l.id
+    WHERE l.id = :lesson_id
+      AND l.tenant_id = :tenant_id
+""")
 
-    TODO: move db init to a central module
-    TODO: remove wildcards in SQL
+
+async def get_lesson_etag(
+    db: AsyncEngine, tenant_id: int, user_id: int, lesson_id: int
+) -> str | None:
+    """
+    Current ETag of the lesson response from primary key lookups only, to
+    answer conditional GETs without assembling the lesson. None when not
+    found or when the response depends on buffered (unwritten) progress.
     """
-    db = create_async_engine(conf.POSTGRES_URL)
+    if conf.PROGRESS_WRITE_BEHIND and progress_buffer.buffered(user_id, lesson_id):
+        return None
+
     params = {"tenant_id": tenant_id, "user_id": user_id, "lesson_id": lesson_id}
+    async with hot_path.connect(replicas.for_read(db, user_id)) as conn:
+        row = await hot_path.fetchrow(conn, LESSON_VERSION, params)
+
+    if row is None:
+        return None
+    return lesson_etag(row["content_revision"], row["progress_version"])
 
-    async with db.connect() as conn:
-        rows = (await conn.execute(text("""
-            SELECT
-                l.id AS lesson_id,
-                l.slug AS lesson_slug,
-                l.title AS lesson_title,
-                b.id AS block_id,
-                b.block_type AS block_type,
-                lb.position AS block_position,
-                bv.id AS variant_id,
-                bv.tenant_id AS variant_tenant_id,
-                bv.data as variant_data,
-                ubp.status AS progress_status,
-                ubp.updated_at AS progress_updated_at
-            FROM lessons l
-            JOIN users u ON u.id = :user_id AND u.tenant_id = :tenant_id
-            JOIN lesson_blocks lb ON lb.lesson_id = l.id
-            JOIN blocks b ON b.id = lb.block_id
-            LEFT JOIN LATERAL (
-                SELECT *
-                FROM block_variants v
-                WHERE v.block_id = b.id
-                  AND (v.tenant_id = :tenant_id OR v.tenant_id IS NULL)
-                ORDER BY v.tenant_id NULLS LAST
-                LIMIT 1
-            ) bv ON TRUE
-            LEFT JOIN user_block_progress ubp
-                ON ubp.block_id  = lb.block_id
-               AND ubp.lesson_id = l.id
-               AND ubp.user_id = :user_id
-            WHERE l.id = :lesson_id
-              AND l.tenant_id = :tenant_id
-            ORDER BY lb.position
-            """
-        ), params)).mappings().all()
+
+LESSON_PROGRESS = HotQuery("lesson_progress", """
+    SELECT
+        l.slug AS lesson_slug,
+        l.title AS lesson_title,
+        l.content_revision AS content_revision,
+        l.block_count AS block_count,
+        ulp.seen_count AS seen_count,
+        ulp.completed_count AS completed_count,
+        ulp.last_seen_block_id AS last_seen_block_id,
+        ulp.completed AS completed,
+        ulp.xmin::text::bigint AS progress_version,
+        ubp.block_id AS progress_block_id,
+        ubp.status AS progress_status
+    FROM lessons l
+    JOIN users u ON u.id = :user_id AND u.tenant_id = :tenant_id
+    LEFT JOIN user_lesson_progress ulp
+        ON ulp.user_id = :user_id
+       AND ulp.lesson_id = l.id
+    LEFT JOIN user_block_progress ubp
+        ON ubp.user_id = :user_id
+       AND ubp.lesson_id = l.id
+    WHERE l.id = :lesson_id
+      AND l.tenant_id = :tenant_id
+""")
+
+
+async def assemble_lesson(
+    db: AsyncEngine, tenant_id: int, user_id: int, lesson_id: int, outline: bool = False
+) -> tuple[dict, dict, dict, dict, str | None] | None:
+    """
+    Load the parts of a lesson response: (lesson, skeleton, progress,
+    summary) and its ETag.
+
+    The per-user part (tenant/user/lesson validation, progress rows and the
+    user_lesson_progress rollup) is always read, in one statement; the
+    lesson skeleton comes from the cache when its content_revision is still
+    current, else from a separate statement. The two are not one snapshot:
+    a skeleton newer than the user rows shows its blocks with the progress
+    read for them (none for new blocks), while the summary and the ETag
+    are those of the user rows. With `outline`, the skeleton's variants
+    have no data.
+    """
+    params = {"tenant_id": tenant_id, "user_id": user_id, "lesson_id": lesson_id}
+
+    source = replicas.for_read(db, user_id)
+    async with hot_path.connect(source) as conn:
+        rows = await hot_path.fetch(conn, LESSON_PROGRESS, params)
 
     if not rows:
         return None
 
-    statuses = [r["progress_status"] for r in rows]
+    # the connection is back in the pool: a skeleton miss checks out its own
+    load = get_lesson_outline if outline else get_lesson_skeleton
+    skeleton = await load(source, tenant_id, lesson_id, rows[0]["content_revision"])
 
-    data = {
-        "lesson": {
-            "id": rows[0]["lesson_id"],
-            "slug": rows[0]["lesson_slug"],
-            "title": rows[0]["lesson_title"],
-        },
+    if not skeleton["blocks"]:
+        return None
+
+    progress = {block["id"]: None for block in skeleton["blocks"]}
+    progress.update(
+        (r["progress_block_id"], r["progress_status"])
+        for r in rows
+        if r["progress_block_id"] in progress
+    )
+    # tagged with the revision the user rows were read at; a newer cached
+    # skeleton only makes the next conditional GET miss
+    etag = lesson_etag(rows[0]["content_revision"], rows[0]["progress_version"])
+    if conf.PROGRESS_WRITE_BEHIND:
+        # buffered updates are not in the rollup yet, nor in the ETag
+        if progress_buffer.buffered(user_id, lesson_id):
+            etag = None
+        progress_buffer.overlay(user_id, lesson_id, progress)
+        summary = summarize_progress(list(progress.items()))
+    else:
+        summary = rollup_summary(rows[0])
+
+    lesson = {
+        "id": lesson_id,
+        "slug": rows[0]["lesson_slug"],
+        "title": rows[0]["lesson_title"],
+    }
+
+    return lesson, skeleton, progress, summary, etag
+
+
+def lesson_dict(lesson: dict, skeleton: dict, progress: dict, summary: dict) -> dict:
+    return {
+        "lesson": lesson,
         "blocks": [
+            {**block, "user_progress": progress[block["id"]]}
+            for block in skeleton["blocks"]
+        ],
+        "progress_summary": summary,
+    }
+
+
+# closing bytes of a block fragment, by user_progress
+_PROGRESS_JSON = {
+    None: b"null}",
+    "seen": b'"seen"}',
+    "completed": b'"completed"}',
+}
+
+
+def lesson_json(lesson: dict, skeleton: dict, progress: dict, summary: dict) -> bytes:
+    """
+    Encode a lesson response (same shape as `Root`) without re-encoding the
+    cached blocks: each fragment only needs its user_progress appended.
+    """
+    blocks = b",".join(
+        fragment + _PROGRESS_JSON[progress[block["id"]]]
+        for block, fragment in zip(skeleton["blocks"], skeleton["fragments"])
+    )
+    return b"".join((
+        b'{"lesson":', orjson.dumps(lesson),
+        b',"blocks":[', blocks,
+        b'],"progress_summary":', orjson.dumps(summary),
+        b"}",
+    ))
+
+
+def lesson_json_fields(
+    lesson: dict, skeleton: dict, progress: dict, summary: dict, fields: frozenset[str]
+) -> bytes:
+    """Encode a lesson response whose blocks only carry their id and `fields`."""
+    blocks = []
+    for block in skeleton["blocks"]:
+        projected = {"id": block["id"]}
+        for name in ("type", "position"):
+            if name in fields:
+                projected[name] = block[name]
+        if "variant" in fields or "variant.data" in fields:
+            variant = block["variant"]
+            projected["variant"] = variant if "variant.data" in fields else variant_outline(variant)
+        if "user_progress" in fields:
+            projected["user_progress"] = progress[block["id"]]
+        blocks.append(projected)
+    return orjson.dumps({"lesson": lesson, "blocks": blocks, "progress_summary": summary})
+
+
+LESSON_LIST = HotQuery("lesson_list", """
+    SELECT
+        l.id AS lesson_id,
+        l.slug AS lesson_slug,
+        l.title AS lesson_title,
+        l.block_count AS block_count,
+        ulp.seen_count AS seen_count,
+        ulp.completed_count AS completed_count,
+        ulp.last_seen_block_id AS last_seen_block_id,
+        ulp.completed AS completed
+    FROM users u
+    LEFT JOIN LATERAL (
+        SELECT id, slug, title, block_count
+        FROM lessons
+        WHERE tenant_id = u.tenant_id
+          AND id > :after_id
+        ORDER BY id
+        LIMIT :limit
+    ) l ON TRUE
+    LEFT JOIN user_lesson_progress ulp
+        ON ulp.user_id = u.id
+       AND ulp.lesson_id = l.id
+    WHERE u.id = :user_id AND u.tenant_id = :tenant_id
+    ORDER BY l.id
+""")
+
+
+async def list_lessons(
+    db: AsyncEngine, tenant_id: int, user_id: int, after_id: int, limit: int
+) -> dict | None:
+    """
+    Page of a tenant's lessons with the user's progress summary for each.
+
+    Keyset pagination on lesson id (idx_lessons_tenant_id); summaries come
+    from the user_lesson_progress rollup, no block rows are read.
+    Returns None if the user doesn't belong to the tenant.
+    """
+    params = {
+        "tenant_id": tenant_id,
+        "user_id": user_id,
+        "after_id": after_id,
+        "limit": limit + 1,
+    }
+
+    async with hot_path.connect(replicas.for_read(db, user_id)) as conn:
+        rows = await hot_path.fetch(conn, LESSON_LIST, params)
+
+    if not rows:
+        return None
+
+    rows = [r for r in rows if r["lesson_id"] is not None]
+    page = rows[:limit]
+
+    return {
+        "items": [
+            {
+                "lesson": {
+                    "id": r["lesson_id"],
+                    "slug": r["lesson_slug"],
+                    "title": r["lesson_title"],
+                },
+                "progress_summary": rollup_summary(r),
+            }
+            for r in page
+        ],
+        "next_after_id": page[-1]["lesson_id"] if len(rows) > limit else None,
+    }
+
+
+LESSON_SKELETON = HotQuery("lesson_skeleton", """
+    SELECT
+        l.content_revision AS content_revision,
+        b.id AS block_id,
+        b.block_type AS block_type,
+        lb.position AS block_position,
+        bv.id AS variant_id,
+        bv.tenant_id AS variant_tenant_id,
+        bv.data AS variant_data
+    FROM lessons l
+    JOIN lesson_blocks lb ON lb.lesson_id = l.id
+    JOIN blocks b ON b.id = lb.block_id
+    LEFT JOIN resolved_block_variant rbt
+        ON rbt.tenant_id = :tenant_id
+       AND rbt.block_id = lb.block_id
+    LEFT JOIN resolved_block_variant rbd
+        ON rbd.tenant_id = 0
+       AND rbd.block_id = lb.block_id
+    LEFT JOIN block_variants bv ON bv.id = COALESCE(rbt.variant_id, rbd.variant_id)
+    WHERE l.id = :lesson_id
+      AND l.tenant_id = :tenant_id
+    ORDER BY lb.position
+""")
+
+
+async def get_lesson_skeleton(
+    db: AsyncEngine, tenant_id: int, lesson_id: int, revision: int
+) -> dict:
+    """
+    Ordered blocks of a lesson with their resolved variant (no user data).
+
+    Cached per (tenant_id, lesson_id) and validated against the lesson's
+    content_revision, in this process and then in the host's shared cache.
+    On a miss, concurrent callers for the same revision share the first
+    caller's query and result: only that caller checks out a connection,
+    the others wait without holding one. The caller must have checked the
+    lesson belongs to the tenant.
+    """
+    key = (tenant_id, lesson_id)
+    skeleton = skeleton_cache.get(key, version=revision)
+    if skeleton is not None:
+        return skeleton
+
+    if shared_skeletons.enabled:
+        blob = shared_skeletons.get(key, revision)
+        if blob is not None:
+            skeleton = skeleton_from_blocks(orjson.loads(blob))
+            skeleton_cache.set(key, skeleton, version=revision)
+            return skeleton
+
+    async def load() -> dict:
+        async with hot_path.connect(db) as conn:
+            rows = await hot_path.fetch(
+                conn, LESSON_SKELETON, {"tenant_id": tenant_id, "lesson_id": lesson_id}
+            )
+        skeleton = build_skeleton(rows)
+        # Tag with the revision the rows were read at, which may be newer than `revision`.
+        version = rows[0]["content_revision"] if rows else revision
+        skeleton_cache.set(key, skeleton, version=version)
+        if shared_skeletons.enabled and rows:
+            shared_skeletons.set(key, version, orjson.dumps(skeleton["blocks"]))
+        return skeleton
+
+    return await skeleton_flights.do((tenant_id, lesson_id, revision), load)
+
+
+def build_skeleton(rows) -> dict:
+    """
+    Skeleton from block rows: the block dicts and, for each block, its JSON
+    encoding up to (excluding) the user_progress value.
+    """
+    return skeleton_from_blocks([
+        {
+            "id": r["block_id"],
+            "type": r["block_type"],
+            "position": r["block_position"],
+            "variant": {
+                "id": r["variant_id"],
+                "tenant_id": r["variant_tenant_id"],
+                "data": r["variant_data"],
+            } if r["variant_id"] is not None else None,
+        }
+        for r in rows
+    ])
+
+
+def skeleton_from_blocks(blocks: list[dict]) -> dict:
+    fragments = [
+        orjson.dumps(block)[:-1] + b',"user_progress":'
+        for block in blocks
+    ]
+    return {"blocks": blocks, "fragments": fragments}
+
+
+# Same blocks as LESSON_SKELETON without reading block_variants: the variant
+# id comes from resolved_block_variant, and a tenant row there is always one
+# of the tenant's own variants.
+LESSON_OUTLINE = HotQuery("lesson_outline", """
+    SELECT
+        l.content_revision AS content_revision,
+        b.id AS block_id,
+        b.block_type AS block_type,
+        lb.position AS block_position,
+        COALESCE(rbt.variant_id, rbd.variant_id) AS variant_id,
+        CASE WHEN rbt.variant_id IS NOT NULL THEN l.tenant_id END AS variant_tenant_id
+    FROM lessons l
+    JOIN lesson_blocks lb ON lb.lesson_id = l.id
+    JOIN blocks b ON b.id = lb.block_id
+    LEFT JOIN resolved_block_variant rbt
+        ON rbt.tenant_id = :tenant_id
+       AND rbt.block_id = lb.block_id
+    LEFT JOIN resolved_block_variant rbd
+        ON rbd.tenant_id = 0
+       AND rbd.block_id = lb.block_id
+    WHERE l.id = :lesson_id
+      AND l.tenant_id = :tenant_id
+    ORDER BY lb.position
+""")
+
+
+def variant_outline(variant: dict | None) -> dict | None:
+    """A resolved variant without its data."""
+    if variant is None:
+        return None
+    return {"id": variant["id"], "tenant_id": variant["tenant_id"]}
+
+
+async def get_lesson_outline(
+    db: AsyncEngine, tenant_id: int, lesson_id: int, revision: int
+) -> dict:
+    """
+    Ordered blocks of a lesson with their resolved variant's id and
+    tenant_id but not its data, for responses that leave the payloads out.
+
+    Projected from the full skeleton when that is cached; otherwise loaded
+    without touching block_variants and cached per (tenant_id, lesson_id)
+    in this process, validated against content_revision and loaded once
+    for concurrent misses like the skeleton.
+    """
+    key = (tenant_id, lesson_id)
+    outline = outline_cache.get(key, version=revision)
+    if outline is not None:
+        return outline
+
+    skeleton = skeleton_cache.get(key, version=revision)
+    if skeleton is not None:
+        return {"blocks": [
+            {**block, "variant": variant_outline(block["variant"])}
+            for block in skeleton["blocks"]
+        ]}
+
+    async def load() -> dict:
+        async with hot_path.connect(db) as conn:
+            rows = await hot_path.fetch(
+                conn, LESSON_OUTLINE, {"tenant_id": tenant_id, "lesson_id": lesson_id}
+            )
+        outline = {"blocks": [
             {
                 "id": r["block_id"],
                 "type": r["block_type"],
@@ -73,38 +497,606 @@ async def get_lesson(tenant_id: int, user_id: int, lesson_id: int) -> dict | Non
                 "variant": {
                     "id": r["variant_id"],
                     "tenant_id": r["variant_tenant_id"],
-                    "data": r["variant_data"],
-                },
-                "user_progress": r["progress_status"],
+                } if r["variant_id"] is not None else None,
             }
             for r in rows
-        ],
+        ]}
+        outline_cache.set(key, outline, version=rows[0]["content_revision"] if rows else revision)
+        return outline
+
+    return await skeleton_flights.do((tenant_id, lesson_id, revision, "outline"), load)
+
+
+LESSON_CONTENT_HEADER = HotQuery("lesson_content_header", """
+    SELECT
+        slug AS lesson_slug,
+        title AS lesson_title,
+        content_revision AS content_revision,
+        block_count AS block_count
+    FROM lessons
+    WHERE id = :lesson_id
+      AND tenant_id = :tenant_id
+""")
+
+
+def content_etag(content_revision: int) -> str:
+    """Strong ETag of the content-only lesson response (the same for every user)."""
+    return f'"c{content_revision}"'
+
+
+async def get_lesson_content_json(
+    db: AsyncEngine, tenant_id: int, lesson_id: int, if_none_match: str | None = None
+) -> tuple[bytes | None, str] | None:
+    """
+    The user-independent part of a lesson (lesson and blocks with their
+    resolved variants, no progress) as JSON bytes, with its ETag.
+
+    The ETag comes from the one-row lesson lookup that also validates the
+    tenant: (None, etag) when it matches `if_none_match`, without reading
+    the skeleton. None when not found or empty.
+    """
+    params = {"tenant_id": tenant_id, "lesson_id": lesson_id}
+    source = replicas.for_read(db, None)
+    async with hot_path.connect(source) as conn:
+        row = await hot_path.fetchrow(conn, LESSON_CONTENT_HEADER, params)
+
+    if row is None or not row["block_count"]:
+        return None
+
+    etag = content_etag(row["content_revision"])
+    if if_none_match and etag_matches(if_none_match, etag):
+        return None, etag
+
+    skeleton = await get_lesson_skeleton(source, tenant_id, lesson_id, row["content_revision"])
+
+    lesson = {"id": lesson_id, "slug": row["lesson_slug"], "title": row["lesson_title"]}
+    body = b"".join((
+        b'{"lesson":', orjson.dumps(lesson),
+        b',"blocks":', orjson.dumps(skeleton["blocks"]),
+        b"}",
+    ))
+    return body, etag
+
+
+# One row per requested block of the lesson with its resolved variant, or a
+# single row of NULLs when none is in the lesson; no row when the lesson is
+# not the tenant's.
+LESSON_VARIANTS = HotQuery("lesson_variants", """
+    SELECT
+        l.content_revision AS content_revision,
+        lb.block_id AS block_id,
+        bv.id AS variant_id,
+        bv.tenant_id AS variant_tenant_id,
+        bv.data AS variant_data
+    FROM lessons l
+    LEFT JOIN lesson_blocks lb
+        ON lb.lesson_id = l.id
+       AND lb.block_id = ANY(:block_ids)
+    LEFT JOIN resolved_block_variant rbt
+        ON rbt.tenant_id = :tenant_id
+       AND rbt.block_id = lb.block_id
+    LEFT JOIN resolved_block_variant rbd
+        ON rbd.tenant_id = 0
+       AND rbd.block_id = lb.block_id
+    LEFT JOIN block_variants bv ON bv.id = COALESCE(rbt.variant_id, rbd.variant_id)
+    WHERE l.id = :lesson_id
+      AND l.tenant_id = :tenant_id
+    ORDER BY lb.position
+""")
+
+
+async def get_lesson_variants_json(
+    db: AsyncEngine,
+    tenant_id: int,
+    lesson_id: int,
+    block_ids: list[int],
+    if_none_match: str | None = None,
+) -> tuple[bytes | None, str] | None:
+    """
+    The tenant's resolved variants, payloads included, of the given blocks
+    of a lesson: {"blocks": [{"id", "variant"}]} in position order, for
+    clients lazy-loading what a narrowed lesson response left out. Blocks
+    not in the lesson are left out. The ETag is the content ETag (see
+    `content_etag`), checked on the lesson header before any payload is
+    read: (None, etag) when it matches `if_none_match`. None when the
+    lesson is not the tenant's.
+    """
+    params = {"tenant_id": tenant_id, "lesson_id": lesson_id, "block_ids": block_ids}
+    async with hot_path.connect(replicas.for_read(db, None)) as conn:
+        row = await hot_path.fetchrow(conn, LESSON_CONTENT_HEADER, params)
+        if row is None:
+            return None
+
+        etag = content_etag(row["content_revision"])
+        if if_none_match and etag_matches(if_none_match, etag):
+            return None, etag
+
+        rows = await hot_path.fetch(conn, LESSON_VARIANTS, params)
+
+    if not rows:
+        return None
+    # the revision the payloads were read at (content may have changed in between)
+    etag = content_etag(rows[0]["content_revision"])
+
+    blocks = [
+        {
+            "id": r["block_id"],
+            "variant": {
+                "id": r["variant_id"],
+                "tenant_id": r["variant_tenant_id"],
+                "data": r["variant_data"],
+            } if r["variant_id"] is not None else None,
+        }
+        for r in rows
+        if r["block_id"] is not None
+    ]
+    return orjson.dumps({"blocks": blocks}), etag
+
+
+# Every block of the requested lessons of the user's tenant, with the
+# resolved variant and the user's progress, in one statement. A variant's
+# data is only sent on its first row: lessons sharing blocks share it. One
+# row of NULLs when no lesson is found; no row when the user is not the
+# tenant's.
+LESSON_BUNDLE = HotQuery("lesson_bundle", """
+    SELECT x.*
+    FROM users u
+    LEFT JOIN LATERAL (
+        SELECT
+            l.id AS lesson_id,
+            l.slug AS lesson_slug,
+            l.title AS lesson_title,
+            l.block_count AS block_count,
+            ulp.seen_count AS seen_count,
+            ulp.completed_count AS completed_count,
+            ulp.last_seen_block_id AS last_seen_block_id,
+            ulp.completed AS completed,
+            b.id AS block_id,
+            b.block_type AS block_type,
+            lb.position AS block_position,
+            bv.id AS variant_id,
+            bv.tenant_id AS variant_tenant_id,
+            CASE WHEN row_number() OVER (PARTITION BY bv.id ORDER BY l.id, lb.position) = 1
+                 THEN bv.data END AS variant_data,
+            ubp.status AS progress_status
+        FROM lessons l
+        JOIN lesson_blocks lb ON lb.lesson_id = l.id
+        JOIN blocks b ON b.id = lb.block_id
+        LEFT JOIN resolved_block_variant rbt
+            ON rbt.tenant_id = :tenant_id
+           AND rbt.block_id = lb.block_id
+        LEFT JOIN resolved_block_variant rbd
+            ON rbd.tenant_id = 0
+           AND rbd.block_id = lb.block_id
+        LEFT JOIN block_variants bv ON bv.id = COALESCE(rbt.variant_id, rbd.variant_id)
+        LEFT JOIN user_lesson_progress ulp
+            ON ulp.user_id = :user_id
+           AND ulp.lesson_id = l.id
+        LEFT JOIN user_block_progress ubp
+            ON ubp.user_id = :user_id
+           AND ubp.lesson_id = l.id
+           AND ubp.block_id = lb.block_id
+        WHERE l.id = ANY(:lesson_ids)
+          AND l.tenant_id = :tenant_id
+    ) x ON TRUE
+    WHERE u.id = :user_id
+      AND u.tenant_id = :tenant_id
+    ORDER BY x.lesson_id, x.block_position
+""")
+
+
+async def get_lesson_bundle_json(
+    db: AsyncEngine, tenant_id: int, user_id: int, lesson_ids: list[int]
+) -> bytes | None:
+    """
+    Several lessons of a tenant -> user in one response, for offline use:
+    {"lessons": [{"lesson", "blocks", "progress_summary"}], "variants": [...],
+    "missing": [lesson ids]}, lessons in the requested order.
+
+    Blocks refer to their resolved variant by `variant_id`; each variant is
+    listed once in "variants" however many lessons use it. Lessons that are
+    not the tenant's, or have no blocks, are "missing" (as `get_lesson`
+    would 404). None when the user is not the tenant's.
+    """
+    lesson_ids = list(dict.fromkeys(lesson_ids))
+    params = {"tenant_id": tenant_id, "user_id": user_id, "lesson_ids": lesson_ids}
+    async with hot_path.connect(replicas.for_read(db, user_id)) as conn:
+        rows = await hot_path.fetch(conn, LESSON_BUNDLE, params)
+
+    if not rows:
+        return None
+
+    variants: dict[int, dict] = {}
+    lessons: dict[int, list] = {}
+    for r in rows:
+        if r["lesson_id"] is None:
+            continue
+        lessons.setdefault(r["lesson_id"], []).append(r)
+        if r["variant_data"] is not None:
+            variants[r["variant_id"]] = {
+                "id": r["variant_id"],
+                "tenant_id": r["variant_tenant_id"],
+                "data": r["variant_data"],
+            }
+
+    bundle = []
+    for lesson_id in lesson_ids:
+        lesson_rows = lessons.get(lesson_id)
+        if lesson_rows is None:
+            continue
+        progress = {r["block_id"]: r["progress_status"] for r in lesson_rows}
+        if conf.PROGRESS_WRITE_BEHIND:
+            progress_buffer.overlay(user_id, lesson_id, progress)
+            summary = summarize_progress(list(progress.items()))
+        else:
+            summary = rollup_summary(lesson_rows[0])
+        bundle.append({
+            "lesson": {
+                "id": lesson_id,
+                "slug": lesson_rows[0]["lesson_slug"],
+                "title": lesson_rows[0]["lesson_title"],
+            },
+            "blocks": [
+                {
+                    "id": r["block_id"],
+                    "type": r["block_type"],
+                    "position": r["block_position"],
+                    "variant_id": r["variant_id"],
+                    "user_progress": progress[r["block_id"]],
+                }
+                for r in lesson_rows
+            ],
+            "progress_summary": summary,
+        })
+
+    return orjson.dumps({
+        "lessons": bundle,
+        "variants": list(variants.values()),
+        "missing": [lesson_id for lesson_id in lesson_ids if lesson_id not in lessons],
+    })
+
+
+LESSON_HEADER = HotQuery("lesson_header", """
+    SELECT
+        l.slug AS lesson_slug,
+        l.title AS lesson_title,
+        l.block_count AS block_count,
+        ulp.seen_count AS seen_count,
+        ulp.completed_count AS completed_count,
+        ulp.last_seen_block_id AS last_seen_block_id,
+        ulp.completed AS completed
+    FROM lessons l
+    JOIN users u ON u.id = :user_id AND u.tenant_id = :tenant_id
+    LEFT JOIN user_lesson_progress ulp
+        ON ulp.user_id = :user_id
+       AND ulp.lesson_id = l.id
+    WHERE l.id = :lesson_id
+      AND l.tenant_id = :tenant_id
+""")
+
+
+async def get_lesson_header(
+    conn: HotConnection | AsyncConnection, tenant_id: int, user_id: int, lesson_id: int
+) -> dict | None:
+    """
+    Validate tenant > user > lesson and read lesson metadata plus the user's
+    rollup summary, without touching blocks. None when not found or empty.
+    """
+    row = await hot_path.fetchrow(
+        conn,
+        LESSON_HEADER,
+        {"tenant_id": tenant_id, "user_id": user_id, "lesson_id": lesson_id},
+    )
+
+    if row is None or not row["block_count"]:
+        return None
+
+    return {
+        "lesson": {
+            "id": lesson_id,
+            "slug": row["lesson_slug"],
+            "title": row["lesson_title"],
+        },
+        "progress_summary": rollup_summary(row),
+    }
+
+
+BLOCKS_WITH_PROGRESS_SQL = """
+    SELECT
+        b.id AS block_id,
+        b.block_type AS block_type,
+        lb.position AS block_position,
+        bv.id AS variant_id,
+        bv.tenant_id AS variant_tenant_id,
+        bv.data AS variant_data,
+        ubp.status AS progress_status
+    FROM lesson_blocks lb
+    JOIN blocks b ON b.id = lb.block_id
+    LEFT JOIN resolved_block_variant rbt
+        ON rbt.tenant_id = :tenant_id
+       AND rbt.block_id = lb.block_id
+    LEFT JOIN resolved_block_variant rbd
+        ON rbd.tenant_id = 0
+       AND rbd.block_id = lb.block_id
+    LEFT JOIN block_variants bv ON bv.id = COALESCE(rbt.variant_id, rbd.variant_id)
+    LEFT JOIN user_block_progress ubp
+        ON ubp.block_id = lb.block_id
+       AND ubp.lesson_id = lb.lesson_id
+       AND ubp.user_id = :user_id
+    WHERE lb.lesson_id = :lesson_id
+      AND lb.position > :after_position
+    ORDER BY lb.position
+"""
+
+BLOCKS_PAGE = HotQuery("lesson_blocks_page", BLOCKS_WITH_PROGRESS_SQL + " LIMIT :limit")
+
+
+def block_from_row(r) -> dict:
+    return {
+        "id": r["block_id"],
+        "type": r["block_type"],
+        "position": r["block_position"],
+        "variant": {
+            "id": r["variant_id"],
+            "tenant_id": r["variant_tenant_id"],
+            "data": r["variant_data"],
+        } if r["variant_id"] is not None else None,
+        "user_progress": r["progress_status"],
+    }
+
+
+async def get_lesson_blocks_page(
+    db: AsyncEngine,
+    tenant_id: int,
+    user_id: int,
+    lesson_id: int,
+    after_position: int,
+    limit: int,
+) -> dict | None:
+    """
+    Page of a lesson's blocks, keyset paginated on position
+    (idx_lesson_blocks_lesson_pos). The summary covers the whole lesson
+    and reflects stored progress.
+    """
+    params = {
+        "tenant_id": tenant_id,
+        "user_id": user_id,
+        "lesson_id": lesson_id,
+        "after_position": after_position,
+    }
+
+    async with hot_path.connect(replicas.for_read(db, user_id)) as conn:
+        header = await get_lesson_header(conn, tenant_id, user_id, lesson_id)
+        if header is None:
+            return None
+
+        rows = await hot_path.fetch(conn, BLOCKS_PAGE, {**params, "limit": limit + 1})
+
+    blocks = [block_from_row(r) for r in rows[:limit]]
+
+    return {
+        **header,
+        "blocks": blocks,
+        "next_after_position": blocks[-1]["position"] if len(rows) > limit else None,
+    }
+
+
+async def stream_lesson(
+    db: AsyncEngine, tenant_id: int, user_id: int, lesson_id: int
+) -> AsyncIterator[dict] | None:
+    """
+    Validate the lesson, then return an async iterator of NDJSON records:
+    {"lesson": ...}, one {"block": ...} per block in position order, and a
+    final {"progress_summary": ...} computed from the streamed rows.
+
+    Rows are read through a server-side cursor so memory stays flat
+    regardless of lesson size. Returns None when not found.
+    """
+    # header and body from the same server
+    db = replicas.for_read(db, user_id)
+    async with hot_path.connect(db) as conn:
+        header = await get_lesson_header(conn, tenant_id, user_id, lesson_id)
+
+    if header is None:
+        return None
+
+    return _stream_lesson_records(db, tenant_id, user_id, lesson_id, header["lesson"])
+
+
+async def progress_events(
+    db: AsyncEngine, tenant_id: int, user_id: int, lesson_id: int
+) -> AsyncIterator[bytes] | dict | None:
+    """
+    Server-sent events of a user's progress on a lesson (see
+    `ProgressListener.sse`). The snapshot is read from the primary after
+    subscribing, so no change committed in between is missed.
+
+    Returns None when not found, {"error": "unavailable"} when the process
+    is not listening or has no room for another subscriber.
+    """
+    subscription = listener.subscribe(user_id, lesson_id)
+    if subscription is None:
+        return {"error": "unavailable"}
+
+    try:
+        async with hot_path.connect(db) as conn:
+            header = await get_lesson_header(conn, tenant_id, user_id, lesson_id)
+    except BaseException:
+        listener.unsubscribe(subscription)
+        raise
+
+    if header is None:
+        listener.unsubscribe(subscription)
+        return None
+
+    return listener.sse(subscription, {"progress_summary": header["progress_summary"]})
+
+
+async def _stream_lesson_records(
+    db: AsyncEngine, tenant_id: int, user_id: int, lesson_id: int, lesson: dict
+) -> AsyncIterator[dict]:
+    params = {
+        "tenant_id": tenant_id,
+        "user_id": user_id,
+        "lesson_id": lesson_id,
+        "after_position": 0,
+    }
+    buffered = {}
+    if conf.PROGRESS_WRITE_BEHIND:
+        buffered = progress_buffer.buffered(user_id, lesson_id)
+    total = seen = completed = 0
+    last_seen_block_id = None
+
+    yield {"lesson": lesson}
+
+    async with db.connect() as conn:
+        result = await conn.stream(text(BLOCKS_WITH_PROGRESS_SQL), params)
+        async for r in result.mappings():
+            block = block_from_row(r)
+            if block["id"] in buffered:
+                block["user_progress"] = max_status(
+                    block["user_progress"], buffered[block["id"]]
+                )
+
+            total += 1
+            if block["user_progress"]:
+                seen += 1
+                last_seen_block_id = block["id"]
+            if block["user_progress"] == "completed":
+                completed += 1
+
+            yield {"block": block}
+
+    yield {
         "progress_summary": {
-            "total_blocks": len(rows),
-            "seen_blocks": sum(1 for s in statuses if s in ("seen", "completed")),
-            "completed_blocks": sum(1 for s in statuses if s == "completed"),
-            "last_seen_block_id": next(
-                (r["block_id"] for r in reversed(rows) if r["progress_status"]),
-                None,
-            ),
-            "completed": all(s == "completed" for s in statuses)
+            "total_blocks": total,
+            "seen_blocks": seen,
+            "completed_blocks": completed,
+            "last_seen_block_id": last_seen_block_id,
+            "completed": completed == total,
         }
     }
 
-    return data
+
+def rollup_summary(row) -> dict:
+    """
+    Progress summary from lessons.block_count and a (possibly missing)
+    user_lesson_progress row.
+    """
+    return {
+        "total_blocks": row["block_count"],
+        "seen_blocks": row["seen_count"] or 0,
+        "completed_blocks": row["completed_count"] or 0,
+        "last_seen_block_id": row["last_seen_block_id"],
+        "completed": bool(row["completed"]),
+    }
+
+
+def summarize_progress(statuses: list[tuple[int, str | None]]) -> dict:
+    """
+    Progress summary from (block_id, status) pairs ordered by position.
+    """
+    return {
+        "total_blocks": len(statuses),
+        "seen_blocks": sum(1 for _, s in statuses if s in ("seen", "completed")),
+        "completed_blocks": sum(1 for _, s in statuses if s == "completed"),
+        "last_seen_block_id": next(
+            (block_id for block_id, s in reversed(statuses) if s),
+            None,
+        ),
+        "completed": all(s == "completed" for _, s in statuses),
+    }
+
+
+UPSERT_PROGRESS = HotQuery("upsert_progress", """
+    WITH ctx AS (
+        -- tenant, user, lesson relationships
+        SELECT l.id AS lesson_id
+        FROM lessons l
+        JOIN users u ON u.id = :user_id AND u.tenant_id = :tenant_id
+        WHERE l.id = :lesson_id AND l.tenant_id = :tenant_id
+    ),
+    target AS (
+        -- block_id must be part of the lesson
+        SELECT lb.block_id, lb.position
+        FROM ctx
+        JOIN lesson_blocks lb
+            ON lb.lesson_id = ctx.lesson_id
+           AND lb.block_id = :block_id
+    ),
+    upserted AS (
+        -- monotonic constraint (don't downgrade completed -> seen)
+        INSERT INTO user_block_progress (user_id, lesson_id, block_id, status, updated_at)
+        SELECT :user_id, :lesson_id, target.block_id, :status, now()
+        FROM target
+        ON CONFLICT (user_id, lesson_id, block_id)
+        DO UPDATE SET
+            status = CASE
+                WHEN user_block_progress.status = 'completed' THEN 'completed'
+                ELSE EXCLUDED.status
+            END,
+            updated_at = now()
+        RETURNING block_id, status
+    ),
+    summary AS (
+        -- rollup as of the statement snapshot, plus this transition
+        SELECT
+            l.block_count AS total_blocks,
+            COALESCE(ulp.seen_count, 0)
+                + (prev.status IS NULL)::int AS seen_blocks,
+            COALESCE(ulp.completed_count, 0)
+                + (up.status = 'completed' AND prev.status IS DISTINCT FROM 'completed')::int
+                AS completed_blocks,
+            CASE
+                WHEN target.position > COALESCE(ulp.last_seen_position, 0)
+                    THEN target.block_id
+                ELSE ulp.last_seen_block_id
+            END AS last_seen_block_id
+        FROM upserted up
+        JOIN target ON target.block_id = up.block_id
+        JOIN lessons l ON l.id = :lesson_id
+        LEFT JOIN user_lesson_progress ulp
+            ON ulp.user_id = :user_id
+           AND ulp.lesson_id = :lesson_id
+        LEFT JOIN user_block_progress prev
+            ON prev.user_id = :user_id
+           AND prev.lesson_id = :lesson_id
+           AND prev.block_id = :block_id
+    )
+    SELECT
+        EXISTS (SELECT 1 FROM ctx) AS lesson_found,
+        (SELECT status FROM upserted) AS stored_status,
+        summary.*
+    FROM (SELECT 1) one
+    LEFT JOIN summary ON TRUE
+""")
 
 
 async def upsert_progress(
-    tenant_id: int, user_id: int, lesson_id: int, block_id: int, status: str
+    db: AsyncEngine,
+    tenant_id: int,
+    user_id: int,
+    lesson_id: int,
+    block_id: int,
+    status: str,
 ) -> dict | None:
     """
     Upsert user progress for a block in a lesson.
 
+    Validation, the monotonic upsert and the progress summary run as one
+    statement (autocommit, a single round trip). The trigger-maintained
+    rollup is not visible to the statement's own snapshot, so the summary
+    applies this transition to the rollup as it was before the upsert.
+
     Returns None if tenant/user/lesson not found or user doesn't belong to tenant.
     Returns {"error": "block_not_in_lesson"} if block_id is not part of the lesson.
     Returns {"stored_status": ..., "progress_summary": ...} on success.
     """
-    db = create_async_engine(conf.POSTGRES_URL)
+    if conf.PROGRESS_WRITE_BEHIND:
+        return await upsert_progress_buffered(
+            db, tenant_id, user_id, lesson_id, block_id, status
+        )
+
     params = {
         "tenant_id": tenant_id,
         "user_id": user_id,
@@ -113,31 +1105,137 @@ async def upsert_progress(
         "status": status,
     }
 
-    async with db.connect() as conn:
-        # Validate tenant, user, lesson relationships
-        validation = (await conn.execute(text("""
-            SELECT 1
+    async with hot_path.connect(db, autocommit=True) as conn:
+        row = await hot_path.fetchrow(conn, UPSERT_PROGRESS, params)
+
+    if not row["lesson_found"]:
+        return None
+
+    if row["stored_status"] is None:
+        return {"error": "block_not_in_lesson"}
+
+    await replicas.mark_write()
+    return {
+        "stored_status": row["stored_status"],
+        "progress_summary": {
+            "total_blocks": row["total_blocks"],
+            "seen_blocks": row["seen_blocks"],
+            "completed_blocks": row["completed_blocks"],
+            "last_seen_block_id": row["last_seen_block_id"],
+            "completed": row["completed_blocks"] == row["total_blocks"],
+        },
+    }
+
+
+LESSON_BLOCK_STATUSES = HotQuery("lesson_block_statuses", """
+    SELECT lb.block_id, ubp.status
+    FROM lessons l
+    JOIN users u ON u.id = :user_id AND u.tenant_id = :tenant_id
+    LEFT JOIN lesson_blocks lb ON lb.lesson_id = l.id
+    LEFT JOIN user_block_progress ubp
+        ON ubp.user_id = :user_id
+       AND ubp.lesson_id = lb.lesson_id
+       AND ubp.block_id = lb.block_id
+    WHERE l.id = :lesson_id AND l.tenant_id = :tenant_id
+    ORDER BY lb.position
+""")
+
+
+async def upsert_progress_buffered(
+    db: AsyncEngine,
+    tenant_id: int,
+    user_id: int,
+    lesson_id: int,
+    block_id: int,
+    status: str,
+) -> dict | None:
+    """
+    Write-behind variant of `upsert_progress` (PROGRESS_WRITE_BEHIND).
+
+    Validates and reads the stored progress in one query, then queues the
+    update in the progress buffer instead of writing it. The response
+    overlays buffered statuses on the stored ones.
+    """
+    params = {"tenant_id": tenant_id, "user_id": user_id, "lesson_id": lesson_id}
+
+    async with hot_path.connect(db) as conn:
+        rows = await hot_path.fetch(conn, LESSON_BLOCK_STATUSES, params)
+
+    if not rows:
+        return None
+
+    statuses = {r["block_id"]: r["status"] for r in rows if r["block_id"] is not None}
+    if block_id not in statuses:
+        return {"error": "block_not_in_lesson"}
+
+    progress_buffer.add(user_id, lesson_id, block_id, status)
+    progress_buffer.overlay(user_id, lesson_id, statuses)
+
+    return {
+        "stored_status": statuses[block_id],
+        "progress_summary": summarize_progress(list(statuses.items())),
+    }
+
+
+async def upsert_progress_batch(
+    db: AsyncEngine,
+    tenant_id: int,
+    user_id: int,
+    lesson_id: int,
+    items: list[tuple[int, str]],
+) -> dict | None:
+    """
+    Upsert user progress for several blocks of a lesson in one transaction.
+
+    `items` are (block_id, status) pairs; repeated block ids are merged keeping
+    the highest status. Same return contract as `upsert_progress`, with
+    {"error": "block_not_in_lesson", "block_ids": [...]} listing every
+    unknown block and {"results": [...], "progress_summary": ...} on success.
+    """
+    statuses: dict[int, str] = {}
+    for block_id, status in items:
+        if statuses.get(block_id) != "completed":
+            statuses[block_id] = status
+
+    if conf.PROGRESS_WRITE_BEHIND:
+        return await upsert_progress_batch_buffered(
+            db, tenant_id, user_id, lesson_id, statuses
+        )
+
+    params = {
+        "tenant_id": tenant_id,
+        "user_id": user_id,
+        "lesson_id": lesson_id,
+        "block_ids": list(statuses),
+        "statuses": list(statuses.values()),
+    }
+
+    async with db.begin() as conn:
+        # Validate tenant, user, lesson relationships and block membership at once
+        rows = (await conn.execute(text("""
+            SELECT lb.block_id
             FROM lessons l
             JOIN users u ON u.id = :user_id AND u.tenant_id = :tenant_id
+            LEFT JOIN lesson_blocks lb
+                ON lb.lesson_id = l.id
+               AND lb.block_id = ANY(:block_ids)
             WHERE l.id = :lesson_id AND l.tenant_id = :tenant_id
-        """), params)).fetchone()
+        """), params)).fetchall()
 
-        if not validation:
+        if not rows:
             return None
 
-        # Check if block_id is part of the lesson
-        block_check = (await conn.execute(text("""
-            SELECT 1 FROM lesson_blocks
-            WHERE lesson_id = :lesson_id AND block_id = :block_id
-        """), params)).fetchone()
-
-        if not block_check:
-            return {"error": "block_not_in_lesson"}
+        found = {r[0] for r in rows}
+        missing = [block_id for block_id in statuses if block_id not in found]
+        if missing:
+            return {"error": "block_not_in_lesson", "block_ids": missing}
 
-        # Upsert progress with monotonic constraint (don't downgrade completed -> seen)
-        await conn.execute(text("""
+        # Multi-row upsert with the monotonic constraint
+        stored = dict((await conn.execute(text("""
             INSERT INTO user_block_progress (user_id, lesson_id, block_id, status, updated_at)
-            VALUES (:user_id, :lesson_id, :block_id, :status, now())
+            SELECT :user_id, :lesson_id, t.block_id, t.status, now()
+            FROM unnest(CAST(:block_ids AS integer[]), CAST(:statuses AS text[]))
+                AS t(block_id, status)
             ON CONFLICT (user_id, lesson_id, block_id)
             DO UPDATE SET
                 status = CASE
@@ -145,45 +1243,78 @@ async def upsert_progress(
                     ELSE EXCLUDED.status
                 END,
                 updated_at = now()
-        """), params)
-        await conn.commit()
-
-        # Get the stored status
-        stored_row = (await conn.execute(text("""
-            SELECT status FROM user_block_progress
-            WHERE user_id = :user_id AND lesson_id = :lesson_id AND block_id = :block_id
-        """), params)).fetchone()
-        stored_status = stored_row[0]
-
-        # Calculate progress summary
-        summary_rows = (await conn.execute(text("""
-            SELECT lb.block_id, ubp.status
-            FROM lesson_blocks lb
-            LEFT JOIN user_block_progress ubp
-                ON ubp.block_id = lb.block_id
-               AND ubp.lesson_id = lb.lesson_id
-               AND ubp.user_id = :user_id
-            WHERE lb.lesson_id = :lesson_id
-            ORDER BY lb.position
-        """), params)).fetchall()
+            RETURNING block_id, status
+        """), params)).fetchall())
 
-        statuses = [r[1] for r in summary_rows]
-        total_blocks = len(summary_rows)
-        seen_blocks = sum(1 for s in statuses if s in ("seen", "completed"))
-        completed_blocks = sum(1 for s in statuses if s == "completed")
-        last_seen_block_id = next(
-            (r[0] for r in reversed(summary_rows) if r[1]),
-            None,
-        )
-        completed = all(s == "completed" for s in statuses)
+        summary = await get_progress_summary(conn, user_id, lesson_id)
+    await replicas.mark_write()
 
     return {
-        "stored_status": stored_status,
-        "progress_summary": {
-            "total_blocks": total_blocks,
-            "seen_blocks": seen_blocks,
-            "completed_blocks": completed_blocks,
-            "last_seen_block_id": last_seen_block_id,
-            "completed": completed,
-        }
+        "results": [
+            {"block_id": block_id, "stored_status": stored[block_id]}
+            for block_id in statuses
+        ],
+        "progress_summary": summary,
     }
+
+
+async def upsert_progress_batch_buffered(
+    db: AsyncEngine,
+    tenant_id: int,
+    user_id: int,
+    lesson_id: int,
+    statuses: dict[int, str],
+) -> dict | None:
+    """
+    Write-behind variant of `upsert_progress_batch` (PROGRESS_WRITE_BEHIND),
+    for the merged {block_id: status} of the batch: validated as a whole,
+    then every update is queued in the progress buffer.
+    """
+    params = {"tenant_id": tenant_id, "user_id": user_id, "lesson_id": lesson_id}
+
+    async with hot_path.connect(db) as conn:
+        rows = await hot_path.fetch(conn, LESSON_BLOCK_STATUSES, params)
+
+    if not rows:
+        return None
+
+    stored = {r["block_id"]: r["status"] for r in rows if r["block_id"] is not None}
+    missing = [block_id for block_id in statuses if block_id not in stored]
+    if missing:
+        return {"error": "block_not_in_lesson", "block_ids": missing}
+
+    for block_id, status in statuses.items():
+        progress_buffer.add(user_id, lesson_id, block_id, status)
+    progress_buffer.overlay(user_id, lesson_id, stored)
+
+    return {
+        "results": [
+            {"block_id": block_id, "stored_status": stored[block_id]}
+            for block_id in statuses
+        ],
+        "progress_summary": summarize_progress(list(stored.items())),
+    }
+
+
+async def get_progress_summary(
+    conn: AsyncConnection, user_id: int, lesson_id: int
+) -> dict:
+    """
+    Progress summary of a user for a lesson, read from the rollup.
+    """
+    row = (await conn.execute(text("""
+        SELECT
+            l.block_count,
+            ulp.seen_count,
+            ulp.completed_count,
+            ulp.last_seen_block_id,
+            ulp.completed
+        FROM lessons l
+        LEFT JOIN user_lesson_progress ulp
+            ON ulp.user_id = :user_id
+           AND ulp.lesson_id = l.id
+        WHERE l.id = :lesson_id
+    """), {"user_id": user_id, "lesson_id": lesson_id})).mappings().one()
+
+    return rollup_summary(row)
+
@@ -0,0 +1,215 @@
+import asyncio
+import logging
+from typing import AsyncIterator
+import asyncpg
+import orjson
+from sqlalchemy.engine import make_url
+from src.conf import AppConfig
+from src.services.instrumentation import registry
+
+conf = AppConfig()
+logging.basicConfig(level=conf.LOG_LEVEL)
+logger = logging.getLogger(__name__)
+
+CHANNEL = "lesson_progress"
+
+EVENTS_RECEIVED = registry.counter(
+    "progress_events_received_total",
+    "lesson_progress notifications received on the LISTEN connection.",
+)
+EVENTS_SENT = registry.counter(
+    "progress_events_sent_total",
+    "Progress events queued to subscribers.",
+)
+SUBSCRIBERS_DROPPED = registry.counter(
+    "progress_event_subscribers_dropped_total",
+    "Subscribers dropped because their queue was full.",
+)
+
+# queue markers besides event dicts
+RESYNC = "resync"
+OVERFLOW = "overflow"
+
+
+class Subscription:
+    """One client's bounded queue of progress events for a (user, lesson)."""
+
+    __slots__ = ("key", "queue", "dropped")
+
+    def __init__(self, key: tuple[int, int], maxsize: int):
+        self.key = key
+        self.queue: asyncio.Queue[dict | str] = asyncio.Queue(maxsize=maxsize)
+        self.dropped = False
+
+
+class ProgressListener:
+    """Fans out lesson_progress notifications to in-process subscribers.
+
+    One dedicated asyncpg connection per process LISTENs (outside the pool,
+    which must not hold a connection forever). Each subscriber gets a
+    queue of `queue_size` events; a subscriber that falls that far behind
+    is dropped, its queue emptied and replaced by an OVERFLOW marker, so a
+    stalled client costs at most `queue_size` events of memory. After a
+    reconnect every subscriber gets a RESYNC marker: events committed while
+    the connection was down are lost.
+    """
+
+    def __init__(self, queue_size: int, max_subscribers: int, heartbeat: float):
+        self.queue_size = queue_size
+        self.max_subscribers = max_subscribers
+        self.heartbeat = heartbeat
+        self._subscribers: dict[tuple[int, int], set[Subscription]] = {}
+        self._count = 0
+        self._dsn: str | None = None
+        self._conn: asyncpg.Connection | None = None
+        self._task: asyncio.Task | None = None
+        self._connected = asyncio.Event()
+        self.connects = 0
+
+    @property
+    def listening(self) -> bool:
+        return self._conn is not None and not self._conn.is_closed()
+
+    async def start(self, url: str, timeout: float = 5.0) -> None:
+        if self._task is not None:
+            return
+        self._dsn = make_url(url).set(drivername="postgresql").render_as_string(hide_password=False)
+        self._connected = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+        try:
+            await asyncio.wait_for(self._connected.wait(), timeout)
+        except TimeoutError:
+            logger.warning("progress listener not connected yet; retrying in the background")
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            conn = None
+            try:
+                conn = await asyncpg.connect(self._dsn)
+                closed = asyncio.Event()
+                conn.add_termination_listener(lambda _: closed.set())
+                await conn.add_listener(CHANNEL, self._on_notify)
+                self._conn = conn
+                self.connects += 1
+                if self.connects > 1:
+                    self._broadcast(RESYNC)
+                self._connected.set()
+                logger.info("listening on %s", CHANNEL)
+
+                while not closed.is_set():
+                    try:
+                        await asyncio.wait_for(closed.wait(), self.heartbeat)
+                    except TimeoutError:
+                        # an idle socket does not notice a vanished server by itself
+                        await conn.execute("SELECT 1", timeout=self.heartbeat)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning("progress listener connection lost: %s", e)
+            finally:
+                self._conn = None
+                if conn is not None and not conn.is_closed():
+                    conn.terminate()
+            await asyncio.sleep(1.0)
+
+    def _on_notify(self, conn, pid: int, channel: str, payload: str) -> None:
+        EVENTS_RECEIVED.inc()
+        event = orjson.loads(payload)
+        subscribers = self._subscribers.get((event["user_id"], event["lesson_id"]))
+        if not subscribers:
+            return
+        event = {
+            "block_id": event["block_id"],
+            "user_progress": event["user_progress"],
+            "progress_summary": event["progress_summary"],
+        }
+        for subscription in list(subscribers):
+            self._offer(subscription, event)
+
+    def _broadcast(self, marker: str) -> None:
+        for subscribers in list(self._subscribers.values()):
+            for subscription in list(subscribers):
+                self._offer(subscription, marker)
+
+    def _offer(self, subscription: Subscription, item: dict | str) -> None:
+        try:
+            subscription.queue.put_nowait(item)
+            EVENTS_SENT.inc()
+        except asyncio.QueueFull:
+            # slow consumer: free its backlog, tell it to start over
+            self.unsubscribe(subscription)
+            subscription.dropped = True
+            SUBSCRIBERS_DROPPED.inc()
+            while not subscription.queue.empty():
+                subscription.queue.get_nowait()
+            subscription.queue.put_nowait(OVERFLOW)
+
+    def subscribe(self, user_id: int, lesson_id: int) -> Subscription | None:
+        """Register for a user's progress on a lesson; None when not listening or full."""
+        if not self.listening or self._count >= self.max_subscribers:
+            return None
+        subscription = Subscription((user_id, lesson_id), self.queue_size)
+        self._subscribers.setdefault(subscription.key, set()).add(subscription)
+        self._count += 1
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        subscribers = self._subscribers.get(subscription.key)
+        if subscribers is None or subscription not in subscribers:
+            return
+        subscribers.discard(subscription)
+        self._count -= 1
+        if not subscribers:
+            del self._subscribers[subscription.key]
+
+    async def sse(self, subscription: Subscription, snapshot: dict) -> AsyncIterator[bytes]:
+        """
+        Server-sent events for a subscription: `snapshot` first, then one
+        `progress` event per change, keep-alive comments while idle. Ends
+        with a `resync` or `overflow` event after which the client should
+        reconnect (and so re-read the snapshot). Unsubscribes when closed.
+        """
+        try:
+            yield b"retry: 2000\nevent: snapshot\ndata: " + orjson.dumps(snapshot) + b"\n\n"
+            while True:
+                try:
+                    item = await asyncio.wait_for(subscription.queue.get(), self.heartbeat)
+                except TimeoutError:
+                    yield b": keep-alive\n\n"
+                    continue
+                if isinstance(item, str):
+                    yield f"event: {item}\ndata: {{}}\n\n".encode()
+                    return
+                yield b"event: progress\ndata: " + orjson.dumps(item) + b"\n\n"
+        finally:
+            self.unsubscribe(subscription)
+
+    def stats(self) -> dict:
+        return {
+            "listening": self.listening,
+            "connects": self.connects,
+            "subscribers": self._count,
+            "keys": len(self._subscribers),
+        }
+
+
+registry.gauge(
+    "progress_event_subscribers",
+    "Open progress event streams in this process.",
+    lambda: {(): listener._count},
+)
+
+listener = ProgressListener(
+    queue_size=conf.PROGRESS_EVENTS_QUEUE_SIZE,
+    max_subscribers=conf.PROGRESS_EVENTS_MAX_SUBSCRIBERS,
+    heartbeat=conf.PROGRESS_EVENTS_HEARTBEAT,
+)
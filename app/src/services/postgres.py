@@ -0,0 +1,172 @@
+import asyncio
+import logging
+import time
+import asyncpg
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
+from src.conf import AppConfig
+from src.services import hot_path
+from src.services.instrumentation import InstrumentedPool, instrument_engine
+
+conf = AppConfig()
+logging.basicConfig(level=conf.LOG_LEVEL)
+logger = logging.getLogger(__name__)
+
+_engine: AsyncEngine | None = None
+
+# pool sizes of the engines built by create_engine (see apply_connection_budget)
+pool_sizes = {
+    "pool_size": conf.POSTGRES_POOL_SIZE,
+    "max_overflow": conf.POSTGRES_POOL_MAX_OVERFLOW,
+}
+
+
+def create_engine(url: str | None = None) -> AsyncEngine:
+    """
+    Build an async engine using the pool settings from AppConfig.
+    """
+    server_settings = {}
+    if conf.POSTGRES_STATEMENT_TIMEOUT:
+        server_settings["statement_timeout"] = str(conf.POSTGRES_STATEMENT_TIMEOUT)
+    if conf.PROGRESS_EVENTS:
+        # progress writes on these connections NOTIFY (db/10-progress-notify-opt-in.sql)
+        server_settings["pair.progress_events"] = "on"
+    connect_args = {"server_settings": server_settings} if server_settings else {}
+
+    return create_async_engine(
+        url or conf.POSTGRES_URL,
+        poolclass=InstrumentedPool,
+        pool_size=pool_sizes["pool_size"],
+        max_overflow=pool_sizes["max_overflow"],
+        pool_timeout=conf.POSTGRES_POOL_TIMEOUT,
+        pool_recycle=conf.POSTGRES_POOL_RECYCLE,
+        pool_pre_ping=conf.POSTGRES_POOL_PRE_PING,
+        connect_args=connect_args,
+    )
+
+
+async def connect() -> AsyncEngine:
+    """
+    Create the process-wide engine (called once from the app lifespan).
+    """
+    global _engine
+    if _engine is None:
+        if conf.POSTGRES_POOL_BUDGET:
+            await apply_connection_budget()
+        _engine = create_engine()
+        instrument_engine(_engine)
+        logger.info(
+            "postgres pool created (size=%s, overflow=%s)",
+            pool_sizes["pool_size"],
+            pool_sizes["max_overflow"],
+        )
+    return _engine
+
+
+def budget_pool_sizes(max_connections: int, reserved: int, workers: int) -> tuple[int, int]:
+    """
+    (pool_size, max_overflow) for one of `workers` workers sharing
+    `max_connections - reserved` connections: the configured sizes, capped
+    at the worker's share. The share also covers the worker's LISTEN
+    connection; it is never below one pooled connection.
+    """
+    share = (max_connections - reserved) // max(workers, 1)
+    if conf.PROGRESS_EVENTS:
+        share -= 1
+    if share < 1:
+        logger.warning(
+            "%s worker(s) do not fit in max_connections=%s (reserved %s); using one connection each",
+            workers, max_connections, reserved,
+        )
+        share = 1
+    pool_size = min(conf.POSTGRES_POOL_SIZE, share)
+    max_overflow = min(conf.POSTGRES_POOL_MAX_OVERFLOW, share - pool_size)
+    return pool_size, max_overflow
+
+
+async def apply_connection_budget(url: str | None = None) -> None:
+    """
+    Size this worker's pools from the server's max_connections, split over
+    APP_INSTANCES * WEB_CONCURRENCY workers. Keeps the configured sizes when
+    the server cannot be asked.
+    """
+    dsn = make_url(url or conf.POSTGRES_URL).set(drivername="postgresql")
+    try:
+        conn = await asyncpg.connect(dsn.render_as_string(hide_password=False), timeout=conf.POSTGRES_POOL_TIMEOUT)
+        try:
+            row = await conn.fetchrow("""
+                SELECT current_setting('max_connections')::int AS max_connections,
+                       current_setting('superuser_reserved_connections')::int AS superuser_reserved
+            """)
+        finally:
+            await conn.close()
+    except Exception as e:
+        logger.warning("cannot read max_connections, keeping the configured pool sizes: %s", e)
+        return
+
+    pool_sizes["pool_size"], pool_sizes["max_overflow"] = budget_pool_sizes(
+        row["max_connections"],
+        row["superuser_reserved"] + conf.POSTGRES_RESERVED_CONNECTIONS,
+        conf.APP_INSTANCES * conf.WEB_CONCURRENCY,
+    )
+
+
+async def warmup(db: AsyncEngine) -> int:
+    """
+    Open the pool's connections ahead of traffic and prepare the hot
+    statements on each, so the first requests of a fresh worker neither
+    connect nor prepare. Best effort: failures are logged, startup goes on.
+    Returns the number of connections warmed up.
+    """
+    size = db.pool.size()
+    barrier = asyncio.Barrier(size)
+    started = time.perf_counter()
+
+    async def hold() -> int:
+        try:
+            async with db.connect() as conn:
+                prepared = await hot_path.prepare(conn)
+                # keep each connection checked out until all are open
+                await barrier.wait()
+                return prepared
+        except BaseException:
+            await barrier.abort()
+            raise
+
+    try:
+        async with asyncio.timeout(conf.POSTGRES_POOL_TIMEOUT):
+            results = await asyncio.gather(*(hold() for _ in range(size)), return_exceptions=True)
+    except TimeoutError:
+        logger.warning("pool warmup timed out")
+        return 0
+
+    failed = [r for r in results if isinstance(r, BaseException)]
+    if failed:
+        logger.warning("pool warmup failed on %s of %s connection(s): %s", len(failed), size, failed[0])
+    logger.info(
+        "pool warmed up: %s connection(s), %s statement(s) prepared in %.0f ms",
+        size - len(failed),
+        sum(r for r in results if isinstance(r, int)),
+        (time.perf_counter() - started) * 1000,
+    )
+    return size - len(failed)
+
+
+async def disconnect() -> None:
+    """
+    Dispose the process-wide engine and close all pooled connections.
+    """
+    global _engine
+    if _engine is not None:
+        await _engine.dispose()
+        _engine = None
+        logger.info("postgres pool disposed")
+
+
+def get_engine() -> AsyncEngine:
+    """
+    FastAPI dependency returning the shared engine.
+    """
+    if _engine is None:
+        raise RuntimeError("postgres engine not initialised (app lifespan not started).")
+    return _engine
@@ -0,0 +1,237 @@
+import asyncio
+import logging
+import time
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncEngine
+from src.conf import AppConfig
+from src.services.replicas import router as replicas
+
+conf = AppConfig()
+logging.basicConfig(level=conf.LOG_LEVEL)
+logger = logging.getLogger(__name__)
+
+STATUS_RANK = {None: 0, "seen": 1, "completed": 2}
+
+
+def max_status(a: str | None, b: str | None) -> str | None:
+    """Monotonic merge of two progress statuses (seen < completed)."""
+    return a if STATUS_RANK[a] >= STATUS_RANK[b] else b
+
+
+class ProgressBuffer:
+    """Write-behind buffer for user_block_progress.
+
+    Updates are coalesced per (user_id, lesson_id, block_id) keeping the
+    highest status, and written with one bulk upsert when the buffer reaches
+    `max_size` keys or every `interval` seconds. Pending and in-flight
+    updates can be overlaid on stored progress to keep responses correct.
+
+    Rows whose user or lesson block was deleted meanwhile are skipped. A
+    failed flush is re-queued up to `max_retries` times, then written row
+    by row so that only the rows that still fail are dropped.
+    """
+
+    max_retries = 3
+    retry_delay = 0.1  # seconds, doubled on each retry when draining in `stop`
+
+    def __init__(self, max_size: int, interval: float):
+        self.max_size = max_size
+        self.interval = interval
+        self._db: AsyncEngine | None = None
+        self._task: asyncio.Task | None = None
+        self._wakeup = asyncio.Event()
+        self._flush_lock = asyncio.Lock()
+        # (user_id, lesson_id) -> {block_id: status}
+        self._pending: dict[tuple[int, int], dict[int, str]] = {}
+        self._inflight: dict[tuple[int, int], dict[int, str]] = {}
+        self._depth = 0
+        self._retries = 0
+        self.received = 0
+        self.flushed_rows = 0
+        self.flushes = 0
+        self.failed_flushes = 0
+        self.dropped_rows = 0
+        self.last_flush_seconds = 0.0
+        self.total_flush_seconds = 0.0
+
+    @property
+    def depth(self) -> int:
+        return self._depth
+
+    def add(self, user_id: int, lesson_id: int, block_id: int, status: str) -> None:
+        self.received += 1
+        self._merge(user_id, lesson_id, block_id, status)
+        if self._depth >= self.max_size:
+            self._wakeup.set()
+
+    def _merge(self, user_id: int, lesson_id: int, block_id: int, status: str) -> None:
+        blocks = self._pending.setdefault((user_id, lesson_id), {})
+        if block_id not in blocks:
+            self._depth += 1
+        blocks[block_id] = max_status(blocks.get(block_id), status)
+
+    def buffered(self, user_id: int, lesson_id: int) -> dict[int, str]:
+        """Buffered (pending and in-flight) statuses of a user for a lesson."""
+        statuses = dict(self._inflight.get((user_id, lesson_id), {}))
+        for block_id, status in self._pending.get((user_id, lesson_id), {}).items():
+            statuses[block_id] = max_status(statuses.get(block_id), status)
+        return statuses
+
+    def overlay(self, user_id: int, lesson_id: int, statuses: dict[int, str | None]) -> dict:
+        """Merge buffered statuses into `statuses` (only for blocks already in it)."""
+        for block_id, status in self.buffered(user_id, lesson_id).items():
+            if block_id in statuses:
+                statuses[block_id] = max_status(statuses[block_id], status)
+        return statuses
+
+    async def start(self, db: AsyncEngine) -> None:
+        self._db = db
+        if self._task is None:
+            # bind the primitives to the running loop
+            self._wakeup = asyncio.Event()
+            self._flush_lock = asyncio.Lock()
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """
+        Stop the flush loop and drain whatever is still buffered, retrying
+        with backoff until the rows are written or given up on.
+        """
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        for attempt in range(self.max_retries + 1):
+            await self.flush()
+            if not self._pending:
+                return
+            await asyncio.sleep(self.retry_delay * 2 ** attempt)
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            await self.flush()
+
+    async def flush(self) -> None:
+        async with self._flush_lock:
+            if not self._pending or self._db is None:
+                return
+
+            self._inflight, self._pending, self._depth = self._pending, {}, 0
+            rows = [
+                (user_id, lesson_id, block_id, status)
+                for (user_id, lesson_id), blocks in self._inflight.items()
+                for block_id, status in blocks.items()
+            ]
+
+            started = time.perf_counter()
+            try:
+                written = await self._write(rows)
+                # before the in-flight overlay is dropped
+                await replicas.mark_flushed({user_id for user_id, _ in self._inflight})
+            except Exception:
+                self.failed_flushes += 1
+                self._retries += 1
+                if self._retries > self.max_retries:
+                    logger.exception("progress flush failed, writing %s rows one by one", len(rows))
+                    self._retries = 0
+                    written = await self._write_each(rows)
+                else:
+                    logger.exception("progress flush failed, re-queueing %s rows", len(rows))
+                    for row in rows:
+                        self._merge(*row)
+                    return
+            finally:
+                self._inflight = {}
+
+            self._retries = 0
+            if written < len(rows):
+                logger.warning("dropped %s buffered progress rows", len(rows) - written)
+                self.dropped_rows += len(rows) - written
+            self.flushes += 1
+            self.flushed_rows += written
+            self.last_flush_seconds = time.perf_counter() - started
+            self.total_flush_seconds += self.last_flush_seconds
+
+    async def _write(self, rows: list[tuple[int, int, int, str]]) -> int:
+        """
+        Upsert `rows` in one statement; rows whose user or lesson block no
+        longer exists are skipped. Returns the number written.
+        """
+        user_ids, lesson_ids, block_ids, statuses = (list(c) for c in zip(*rows))
+        async with self._db.begin() as conn:
+            result = await conn.execute(text("""
+                INSERT INTO user_block_progress (user_id, lesson_id, block_id, status, updated_at)
+                SELECT t.user_id, t.lesson_id, t.block_id, t.status, now()
+                FROM unnest(
+                    CAST(:user_ids AS integer[]),
+                    CAST(:lesson_ids AS integer[]),
+                    CAST(:block_ids AS integer[]),
+                    CAST(:statuses AS text[])
+                ) AS t(user_id, lesson_id, block_id, status)
+                JOIN users u ON u.id = t.user_id
+                JOIN lesson_blocks lb
+                    ON lb.lesson_id = t.lesson_id
+                   AND lb.block_id = t.block_id
+                ON CONFLICT (user_id, lesson_id, block_id)
+                DO UPDATE SET
+                    status = CASE
+                        WHEN user_block_progress.status = 'completed' THEN 'completed'
+                        ELSE EXCLUDED.status
+                    END,
+                    updated_at = now()
+            """), {
+                "user_ids": user_ids,
+                "lesson_ids": lesson_ids,
+                "block_ids": block_ids,
+                "statuses": statuses,
+            })
+        return result.rowcount
+
+    async def _write_each(self, rows: list[tuple[int, int, int, str]]) -> int:
+        """
+        Upsert `rows` one transaction each, after the batch kept failing, so
+        that a row that cannot be written only loses itself.
+        """
+        written = 0
+        flushed = set()
+        for row in rows:
+            try:
+                written += await self._write([row])
+            except Exception:
+                logger.exception("dropping buffered progress row %s", row)
+            else:
+                flushed.add(row[0])
+        try:
+            await replicas.mark_flushed(flushed)
+        except Exception:
+            logger.exception("could not mark progress rows flushed")
+        return written
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self._task is not None,
+            "depth": self._depth,
+            "received": self.received,
+            "flushed_rows": self.flushed_rows,
+            "flushes": self.flushes,
+            "failed_flushes": self.failed_flushes,
+            "dropped_rows": self.dropped_rows,
+            "last_flush_seconds": self.last_flush_seconds,
+            "avg_flush_seconds": self.total_flush_seconds / self.flushes if self.flushes else 0.0,
+            # updates received per row written; 1.0 means nothing was coalesced
+            "coalescing_ratio": self.received / self.flushed_rows if self.flushed_rows else 0.0,
+        }
+
+
+buffer = ProgressBuffer(
+    max_size=conf.PROGRESS_FLUSH_SIZE,
+    interval=conf.PROGRESS_FLUSH_INTERVAL,
+)
@@ -0,0 +1,250 @@
+import asyncio
+import json
+import logging
+import time
+import asyncpg
+from sqlalchemy import text
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.ext.asyncio import AsyncEngine
+from src.conf import AppConfig
+from src.services import hot_path, lessons
+
+conf = AppConfig()
+logging.basicConfig(level=conf.LOG_LEVEL)
+logger = logging.getLogger(__name__)
+
+STATUS_SQL = """
+    SELECT
+        c.relkind = 'p' AS partitioned,
+        (SELECT count(*) FROM pg_inherits WHERE inhparent = c.oid) AS partitions,
+        to_regclass('progress_partitioning_state') IS NOT NULL AS migrating
+    FROM pg_class c
+    WHERE c.oid = 'user_block_progress'::regclass
+"""
+
+STATE_SQL = """
+    SELECT partitions, backfilled_to, backfilled_at, swapped_at, prepared_at
+    FROM progress_partitioning_state
+"""
+
+
+async def status(db: AsyncEngine) -> dict:
+    """Layout of user_block_progress and the state of a migration, if one is in progress."""
+    async with db.connect() as conn:
+        result = dict((await conn.execute(text(STATUS_SQL))).mappings().one())
+        if result["migrating"]:
+            state = (await conn.execute(text(STATE_SQL))).mappings().one()
+            result["migration"] = {
+                key: value.isoformat() if hasattr(value, "isoformat") else value
+                for key, value in state.items()
+            }
+    return result
+
+
+async def prepare(db: AsyncEngine, partitions: int) -> None:
+    """Create the partitioned standby and start mirroring writes into it."""
+    async with db.begin() as conn:
+        await conn.execute(text("SET LOCAL lock_timeout = '5s'"))
+        await conn.execute(text("SELECT progress_partitioning_prepare(:n)"), {"n": partitions})
+
+
+# One batch in key order. FOR KEY SHARE holds off deletes of the batch's
+# rows until it commits, so a row deleted meanwhile is deleted from the
+# copy by the mirror trigger afterwards instead of being resurrected by
+# the copy; updates are not blocked and their mirrored upsert wins over
+# the copy (DO NOTHING). The cursor moves in the same transaction.
+BACKFILL_SQL = """
+    WITH batch AS (
+        SELECT user_id, lesson_id, block_id, status, updated_at
+        FROM user_block_progress
+        WHERE (user_id, lesson_id, block_id) > (:user_id, :lesson_id, :block_id)
+        ORDER BY user_id, lesson_id, block_id
+        LIMIT :batch_size
+        FOR KEY SHARE
+    ),
+    copied AS (
+        INSERT INTO user_block_progress_partitioned (user_id, lesson_id, block_id, status, updated_at)
+        SELECT user_id, lesson_id, block_id, status, updated_at FROM batch
+        ON CONFLICT (user_id, lesson_id, block_id) DO NOTHING
+    )
+    UPDATE progress_partitioning_state
+    SET
+        backfilled_to = COALESCE((
+            SELECT ARRAY[user_id, lesson_id, block_id] FROM batch
+            ORDER BY user_id DESC, lesson_id DESC, block_id DESC
+            LIMIT 1
+        ), backfilled_to),
+        backfilled_at = CASE WHEN (SELECT count(*) FROM batch) < :batch_size THEN now() END
+    RETURNING (SELECT count(*) FROM batch) AS copied, backfilled_to
+"""
+
+
+async def backfill(db: AsyncEngine, batch_size: int = 10000, pause: float = 0.0) -> int:
+    """
+    Copy the live rows into the standby, one transaction per batch.
+
+    Resumes after the last committed batch; `pause` seconds between batches
+    leave the disk and the replicas room. Returns the number of rows copied.
+    """
+    async with db.connect() as conn:
+        state = (await conn.execute(text(STATE_SQL))).mappings().one()
+    if state["swapped_at"] is not None:
+        raise ValueError("the partitioned table is already live")
+    cursor = state["backfilled_to"] or [0, 0, 0]
+
+    copied = 0
+    started = time.perf_counter()
+    while True:
+        async with db.begin() as conn:
+            row = (await conn.execute(text(BACKFILL_SQL), {
+                "user_id": cursor[0],
+                "lesson_id": cursor[1],
+                "block_id": cursor[2],
+                "batch_size": batch_size,
+            })).mappings().one()
+        copied += row["copied"]
+        cursor = row["backfilled_to"] or cursor
+        logger.info("backfilled %s rows up to %s (%.0f rows/s)",
+                    copied, cursor, copied / max(time.perf_counter() - started, 1e-9))
+        if row["copied"] < batch_size:
+            break
+        if pause:
+            await asyncio.sleep(pause)
+
+    async with db.connect() as conn:
+        conn = await conn.execution_options(isolation_level="AUTOCOMMIT")
+        await conn.execute(text("ANALYZE user_block_progress_partitioned"))
+    return copied
+
+
+CHECK_SQL = """
+    SELECT
+        count(*) FILTER (WHERE s.user_id IS NULL) AS missing,
+        count(*) FILTER (WHERE l.user_id IS NULL) AS extra,
+        count(*) FILTER (
+            WHERE l.user_id IS NOT NULL AND s.user_id IS NOT NULL
+              AND (l.status, l.updated_at) IS DISTINCT FROM (s.status, s.updated_at)
+        ) AS different
+    FROM user_block_progress l
+    FULL JOIN {standby} s
+        ON s.user_id = l.user_id
+       AND s.lesson_id = l.lesson_id
+       AND s.block_id = l.block_id
+"""
+
+
+async def check(db: AsyncEngine) -> dict:
+    """
+    Compare the live table and the standby in one snapshot: rows missing
+    from the standby, extra in it, and different. A full scan of both.
+    """
+    current = await status(db)
+    if not current["migrating"]:
+        raise ValueError("no partitioning migration in progress")
+    standby = "user_block_progress_unpartitioned" if current["partitioned"] else "user_block_progress_partitioned"
+    async with db.connect() as conn:
+        conn = await conn.execution_options(isolation_level="REPEATABLE READ")
+        await conn.execute(text("SET LOCAL statement_timeout = 0"))
+        row = (await conn.execute(text(CHECK_SQL.format(standby=standby)))).mappings().one()
+    return {"standby": standby, **row}
+
+
+async def swap(db: AsyncEngine, lock_timeout: float = 2.0, attempts: int = 10) -> None:
+    """
+    Exchange the live table and the standby (either way).
+
+    Waits at most `lock_timeout` seconds for the exclusive lock, so the
+    writes queued behind it stall briefly; gives up after `attempts`.
+    """
+    for attempt in range(1, attempts + 1):
+        try:
+            async with db.begin() as conn:
+                await conn.execute(text(f"SET LOCAL lock_timeout = '{int(lock_timeout * 1000)}ms'"))
+                await conn.execute(text("SELECT progress_partitioning_swap()"))
+            return
+        except DBAPIError as e:
+            if not isinstance(e.orig.__cause__, asyncpg.LockNotAvailableError) or attempt == attempts:
+                raise
+            logger.warning("swap: lock not granted within %ss (attempt %s/%s)", lock_timeout, attempt, attempts)
+            await asyncio.sleep(lock_timeout)
+
+
+async def finish(db: AsyncEngine) -> None:
+    """Keep the partitioned table: stop mirroring and drop the old one."""
+    async with db.begin() as conn:
+        await conn.execute(text("SET LOCAL lock_timeout = '5s'"))
+        await conn.execute(text("SELECT progress_partitioning_finish()"))
+
+
+async def abort(db: AsyncEngine) -> None:
+    """Drop the standby of a migration that was not swapped (or was swapped back)."""
+    async with db.begin() as conn:
+        await conn.execute(text("SET LOCAL lock_timeout = '5s'"))
+        await conn.execute(text("SELECT progress_partitioning_abort()"))
+
+
+# Statements reading or writing user_block_progress by user, with their
+# parameter names: the hot path's, and the rollup rebuild of one user's lesson.
+PRUNING_QUERIES = {
+    **{
+        query.name: (query.sql, query.names)
+        for query in vars(lessons).values()
+        if isinstance(query, hot_path.HotQuery) and "user_block_progress" in query.sql
+    },
+    "rebuild_user_lesson_progress": (
+        "SELECT * FROM user_lesson_progress_expected WHERE lesson_id = $1 AND user_id = $2",
+        ("lesson_id", "user_id"),
+    ),
+}
+PRUNING_PARAMS = {
+    "tenant_id": 1, "user_id": 1, "lesson_id": 1, "block_id": 1,
+    "status": "seen", "after_position": 0, "limit": 50, "lesson_ids": [1, 2],
+}
+
+
+def _literal(value) -> str:
+    if isinstance(value, list):
+        return "ARRAY[" + ", ".join(_literal(v) for v in value) + "]"
+    return str(value) if isinstance(value, int) else "'" + str(value).replace("'", "''") + "'"
+
+
+def _scanned(plan: dict, partitions: set[str]) -> set[str]:
+    found = {plan["Relation Name"]} & partitions if "Relation Name" in plan else set()
+    for child in plan.get("Plans", ()):
+        found |= _scanned(child, partitions)
+    return found
+
+
+async def pruning(db: AsyncEngine) -> list[dict]:
+    """
+    Partitions of user_block_progress each per-user statement touches, for
+    a custom plan (pruned by the planner) and a generic plan (pruned at
+    executor startup, as for the hot path's prepared statements). EXPLAIN
+    only: nothing is executed. Empty when the table is not partitioned.
+    """
+    results = []
+    async with db.connect() as conn:
+        driver = (await conn.get_raw_connection()).driver_connection
+        partitions = {
+            row[0] for row in await driver.fetch(
+                "SELECT relname FROM pg_inherits JOIN pg_class ON oid = inhrelid"
+                " WHERE inhparent = 'user_block_progress'::regclass"
+            )
+        }
+        if not partitions:
+            return results
+
+        for name, (sql, names) in PRUNING_QUERIES.items():
+            args = ", ".join(_literal(PRUNING_PARAMS[n]) for n in names)
+            result = {"query": name, "partitions": len(partitions)}
+            async with driver.transaction():
+                await driver.execute(f"PREPARE pruning_check AS {sql}")
+                for mode in ("custom", "generic"):
+                    await driver.execute(f"SET LOCAL plan_cache_mode = force_{mode}_plan")
+                    plan = await driver.fetchval(f"EXPLAIN (FORMAT JSON) EXECUTE pruning_check({args})")
+                    # a str unless the connection decodes json (SQLAlchemy's pooled ones do)
+                    plan = json.loads(plan) if isinstance(plan, str) else plan
+                    result[mode] = len(_scanned(plan[0]["Plan"], partitions))
+                await driver.execute("DEALLOCATE pruning_check")
+            results.append(result)
+    return results
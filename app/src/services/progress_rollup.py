@@ -0,0 +1,87 @@
+import logging
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncEngine
+from src.conf import AppConfig
+
+conf = AppConfig()
+logging.basicConfig(level=conf.LOG_LEVEL)
+logger = logging.getLogger(__name__)
+
+
+async def rebuild(db: AsyncEngine, lesson_ids: list[int] | None = None) -> int:
+    """
+    Rebuild user_lesson_progress (and lessons.block_count) from scratch.
+
+    Each lesson is rebuilt in its own transaction to keep locks short.
+    Returns the number of lessons rebuilt.
+    """
+    if lesson_ids is None:
+        async with db.connect() as conn:
+            lesson_ids = list((await conn.execute(text(
+                "SELECT id FROM lessons ORDER BY id"
+            ))).scalars())
+
+    for lesson_id in lesson_ids:
+        async with db.begin() as conn:
+            await conn.execute(text("""
+                UPDATE lessons
+                SET block_count = (SELECT count(*) FROM lesson_blocks WHERE lesson_id = :lesson_id)
+                WHERE id = :lesson_id
+            """), {"lesson_id": lesson_id})
+            await conn.execute(
+                text("SELECT rebuild_user_lesson_progress(:lesson_id)"),
+                {"lesson_id": lesson_id},
+            )
+        logger.debug("rebuilt progress rollup for lesson %s", lesson_id)
+
+    return len(lesson_ids)
+
+
+async def check(db: AsyncEngine, lesson_ids: list[int] | None = None) -> list[dict]:
+    """
+    Compare user_lesson_progress with the rollup computed from scratch.
+
+    Returns one row per mismatching (user_id, lesson_id), empty when consistent.
+    """
+    async with db.connect() as conn:
+        rows = (await conn.execute(text("""
+            WITH block_counts AS (
+                SELECT l.id AS lesson_id, l.block_count, count(lb.block_id) AS actual
+                FROM lessons l
+                LEFT JOIN lesson_blocks lb ON lb.lesson_id = l.id
+                WHERE CAST(:lesson_ids AS integer[]) IS NULL
+                   OR l.id = ANY(CAST(:lesson_ids AS integer[]))
+                GROUP BY l.id
+            ),
+            expected AS (
+                SELECT * FROM user_lesson_progress_expected
+                WHERE CAST(:lesson_ids AS integer[]) IS NULL
+                   OR lesson_id = ANY(CAST(:lesson_ids AS integer[]))
+            ),
+            stored AS (
+                SELECT * FROM user_lesson_progress
+                WHERE CAST(:lesson_ids AS integer[]) IS NULL
+                   OR lesson_id = ANY(CAST(:lesson_ids AS integer[]))
+            )
+            SELECT
+                NULL AS user_id,
+                lesson_id,
+                'block_count' AS field,
+                CAST(actual AS text) AS expected,
+                CAST(block_count AS text) AS stored
+            FROM block_counts
+            WHERE block_count <> actual
+            UNION ALL
+            SELECT
+                COALESCE(e.user_id, s.user_id),
+                COALESCE(e.lesson_id, s.lesson_id),
+                'rollup',
+                CAST(ROW(e.seen_count, e.completed_count, e.last_seen_block_id, e.completed) AS text),
+                CAST(ROW(s.seen_count, s.completed_count, s.last_seen_block_id, s.completed) AS text)
+            FROM expected e
+            FULL JOIN stored s USING (user_id, lesson_id)
+            WHERE ROW(e.seen_count, e.completed_count, e.last_seen_block_id, e.completed)
+                IS DISTINCT FROM ROW(s.seen_count, s.completed_count, s.last_seen_block_id, s.completed)
+        """), {"lesson_ids": lesson_ids})).mappings().all()
+
+    return [dict(r) for r in rows]
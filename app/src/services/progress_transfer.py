@@ -0,0 +1,356 @@
+import csv
+import logging
+from datetime import datetime, timezone
+from typing import AsyncIterable, AsyncIterator
+import orjson
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncEngine
+from src.conf import AppConfig
+
+conf = AppConfig()
+logging.basicConfig(level=conf.LOG_LEVEL)
+logger = logging.getLogger(__name__)
+
+FORMATS = ("csv", "ndjson")
+FIELDS = ("user_id", "lesson_id", "block_id", "status", "updated_at")
+REQUIRED = ("user_id", "lesson_id", "block_id", "status")
+STATUSES = ("seen", "completed")
+INT4 = range(-2**31, 2**31)
+
+# export batches: rows per fetch from the server-side cursor and per chunk sent
+EXPORT_BATCH = 1000
+
+
+class Rejects:
+    """Counts of rejected input lines by reason, and the first `limit` of them."""
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.by_reason: dict[str, int] = {}
+        self.samples: list[dict] = []
+
+    def add(self, line: int, reason: str) -> None:
+        self.by_reason[reason] = self.by_reason.get(reason, 0) + 1
+        if len(self.samples) < self.limit:
+            self.samples.append({"line": line, "reason": reason})
+
+    @property
+    def count(self) -> int:
+        return sum(self.by_reason.values())
+
+
+async def iter_lines(chunks: AsyncIterable[bytes]) -> AsyncIterator[tuple[int, bytes]]:
+    """(line number, bytes) of each non-blank line of a byte stream, undecoded."""
+    pending = b""
+    number = 0
+    async for chunk in chunks:
+        pending += chunk
+        *lines, pending = pending.split(b"\n")
+        for line in lines:
+            number += 1
+            if line.strip():
+                yield number, line.rstrip(b"\r")
+    if pending.strip():
+        yield number + 1, pending.rstrip(b"\r")
+
+
+def parse_timestamp(value) -> datetime | None:
+    if value is None or value == "":
+        return None
+    parsed = datetime.fromisoformat(value)
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed
+
+
+def to_record(line: int, values: dict) -> tuple:
+    """Staging row for one input row; raises ValueError/TypeError/KeyError when malformed."""
+    ids = []
+    for field in ("user_id", "lesson_id", "block_id"):
+        value = values[field]
+        if isinstance(value, bool) or isinstance(value, float):
+            raise TypeError(field)
+        value = int(value)
+        if value not in INT4:
+            raise ValueError(field)
+        ids.append(value)
+    return (line, *ids, values["status"], parse_timestamp(values.get("updated_at")))
+
+
+async def staged_records(
+    lines: AsyncIterator[tuple[int, bytes]],
+    fmt: str,
+    columns: list[str] | None,
+    rejects: Rejects,
+    counts: dict,
+) -> AsyncIterator[tuple]:
+    """Parse input lines into staging rows; malformed ones go to `rejects`."""
+    async for line, raw in lines:
+        counts["received"] += 1
+        try:
+            # UnicodeDecodeError is a ValueError: a line that is not UTF-8 is malformed
+            raw = raw.decode()
+            if fmt == "csv":
+                row = next(csv.reader([raw]))
+                if len(row) > len(columns):
+                    raise ValueError("column count")
+                values = dict(zip(columns, row))
+            else:
+                values = orjson.loads(raw)
+                if not isinstance(values, dict):
+                    raise TypeError("not an object")
+            record = to_record(line, values)
+        except (ValueError, TypeError, KeyError, orjson.JSONDecodeError):
+            rejects.add(line, "malformed")
+            continue
+        if record[4] not in STATUSES:
+            rejects.add(line, "invalid_status")
+            continue
+        yield record
+
+
+STAGE_SQL = """
+    CREATE TEMP TABLE progress_import (
+        line       BIGINT NOT NULL,
+        user_id    INTEGER NOT NULL,
+        lesson_id  INTEGER NOT NULL,
+        block_id   INTEGER NOT NULL,
+        status     TEXT NOT NULL,
+        updated_at TIMESTAMPTZ
+    ) ON COMMIT DROP;
+    CREATE TEMP TABLE progress_import_rejects (line BIGINT, reason TEXT) ON COMMIT DROP;
+    CREATE TEMP TABLE progress_import_touched (user_id INTEGER, lesson_id INTEGER) ON COMMIT DROP;
+"""
+
+# Validation and merge in one pass over the staging table. Rows for the
+# same block collapse to the highest status; an existing row only moves
+# from seen to completed (the monotonic rule of upsert_progress), so
+# re-importing a file changes nothing.
+MERGE_SQL = """
+    WITH checked AS (
+        SELECT
+            s.line, s.user_id, s.lesson_id, s.block_id, s.status, s.updated_at,
+            CASE
+                WHEN u.id IS NULL THEN 'user_not_in_tenant'
+                WHEN l.id IS NULL THEN 'lesson_not_in_tenant'
+                WHEN lb.block_id IS NULL THEN 'block_not_in_lesson'
+            END AS reason
+        FROM progress_import s
+        LEFT JOIN users u ON u.id = s.user_id AND u.tenant_id = $1
+        LEFT JOIN lessons l ON l.id = s.lesson_id AND l.tenant_id = $1
+        LEFT JOIN lesson_blocks lb ON lb.lesson_id = s.lesson_id AND lb.block_id = s.block_id
+    ),
+    rejected AS (
+        INSERT INTO progress_import_rejects (line, reason)
+        SELECT line, reason FROM checked WHERE reason IS NOT NULL
+    ),
+    merged AS (
+        INSERT INTO user_block_progress AS p (user_id, lesson_id, block_id, status, updated_at)
+        SELECT DISTINCT ON (user_id, lesson_id, block_id)
+            user_id, lesson_id, block_id, status, COALESCE(updated_at, now())
+        FROM checked
+        WHERE reason IS NULL
+        ORDER BY user_id, lesson_id, block_id, status = 'completed' DESC, updated_at DESC NULLS LAST
+        ON CONFLICT (user_id, lesson_id, block_id)
+        DO UPDATE SET
+            status = 'completed',
+            updated_at = GREATEST(p.updated_at, EXCLUDED.updated_at)
+        WHERE p.status = 'seen' AND EXCLUDED.status = 'completed'
+        RETURNING p.user_id, p.lesson_id, p.block_id
+    ),
+    touched AS (
+        INSERT INTO progress_import_touched (user_id, lesson_id)
+        SELECT DISTINCT user_id, lesson_id FROM merged
+    )
+    SELECT
+        (
+            SELECT count(*)
+            FROM (SELECT DISTINCT user_id, lesson_id, block_id FROM checked WHERE reason IS NULL) k
+        ) AS valid,
+        count(*) FILTER (WHERE NOT existed) AS inserted,
+        count(*) FILTER (WHERE existed) AS upgraded
+    FROM (
+        -- the statement's snapshot does not include its own writes
+        SELECT EXISTS (
+            SELECT 1 FROM user_block_progress e
+            WHERE e.user_id = m.user_id AND e.lesson_id = m.lesson_id AND e.block_id = m.block_id
+        ) AS existed
+        FROM merged m
+    ) m
+"""
+
+# Existing rollups of the touched pairs are locked first: a concurrent
+# upsert then waits for the import to commit and applies its transition
+# on top of the rebuilt row.
+LOCK_ROLLUPS_SQL = """
+    SELECT 1
+    FROM progress_import_touched t
+    JOIN user_lesson_progress p ON p.user_id = t.user_id AND p.lesson_id = t.lesson_id
+    ORDER BY p.user_id, p.lesson_id
+    FOR UPDATE OF p
+"""
+
+# user_lesson_progress_expected for the touched pairs only (a join to the
+# view would aggregate all progress before filtering)
+REBUILD_ROLLUPS_SQL = """
+    INSERT INTO user_lesson_progress AS p (
+        user_id, lesson_id, seen_count, completed_count,
+        last_seen_position, last_seen_block_id, completed, updated_at
+    )
+    SELECT
+        ubp.user_id,
+        ubp.lesson_id,
+        count(*)::int,
+        (count(*) FILTER (WHERE ubp.status = 'completed'))::int,
+        max(lb.position),
+        (array_agg(lb.block_id ORDER BY lb.position DESC))[1],
+        count(*) FILTER (WHERE ubp.status = 'completed') = max(l.block_count),
+        max(ubp.updated_at)
+    FROM progress_import_touched t
+    JOIN user_block_progress ubp ON ubp.user_id = t.user_id AND ubp.lesson_id = t.lesson_id
+    JOIN lesson_blocks lb ON lb.lesson_id = ubp.lesson_id AND lb.block_id = ubp.block_id
+    JOIN lessons l ON l.id = ubp.lesson_id
+    GROUP BY ubp.user_id, ubp.lesson_id
+    ON CONFLICT (user_id, lesson_id) DO UPDATE SET
+        seen_count = EXCLUDED.seen_count,
+        completed_count = EXCLUDED.completed_count,
+        last_seen_position = EXCLUDED.last_seen_position,
+        last_seen_block_id = EXCLUDED.last_seen_block_id,
+        completed = EXCLUDED.completed,
+        updated_at = EXCLUDED.updated_at
+"""
+
+
+async def tenant_exists(db: AsyncEngine, tenant_id: int) -> bool:
+    async with db.connect() as conn:
+        return (await conn.execute(
+            text("SELECT EXISTS (SELECT 1 FROM tenants WHERE id = :tenant_id)"),
+            {"tenant_id": tenant_id},
+        )).scalar_one()
+
+
+async def import_progress(
+    db: AsyncEngine,
+    tenant_id: int,
+    chunks: AsyncIterable[bytes],
+    fmt: str,
+    max_rejects: int | None = None,
+) -> dict | None:
+    """
+    Import a tenant's block progress from CSV (with a header line) or NDJSON
+    with the fields user_id, lesson_id, block_id, status and an optional ISO
+    8601 updated_at (default now).
+
+    Rows stream from `chunks` through COPY into a temporary staging table,
+    are validated against the tenant's users, lessons and lesson blocks and
+    merged in one statement, and the rollups of the touched (user, lesson)
+    pairs are rebuilt; all in one transaction. Memory stays flat regardless
+    of input size.
+
+    Returns None when the tenant does not exist.
+    Returns {"error": "missing_columns", ...} when the CSV header lacks a field.
+    Returns counts of received and rejected lines, of blocks inserted,
+    upgraded (seen to completed) and unchanged, with rejects by reason and
+    the first `max_rejects` rejected lines.
+    """
+    if not await tenant_exists(db, tenant_id):
+        return None
+
+    rejects = Rejects(conf.PROGRESS_IMPORT_MAX_REJECTS if max_rejects is None else max_rejects)
+    counts = {"received": 0}
+    lines = iter_lines(chunks)
+    columns = None
+    if fmt == "csv":
+        header = await anext(lines, None)
+        columns = next(csv.reader([header[1].decode(errors="replace")])) if header else []
+        columns = [c.strip() for c in columns]
+        missing = [f for f in REQUIRED if f not in columns]
+        if missing:
+            return {"error": "missing_columns", "missing": missing}
+
+    async with db.connect() as conn:
+        driver = (await conn.get_raw_connection()).driver_connection
+        async with driver.transaction():
+            await driver.execute("SET LOCAL statement_timeout = 0")
+            await driver.execute("SET LOCAL pair.bulk_progress = 'on'")
+            await driver.execute(STAGE_SQL)
+            await driver.copy_records_to_table(
+                "progress_import",
+                records=staged_records(lines, fmt, columns, rejects, counts),
+                columns=["line", "user_id", "lesson_id", "block_id", "status", "updated_at"],
+            )
+            # temp tables have no statistics until analyzed
+            await driver.execute("ANALYZE progress_import")
+            merged = await driver.fetchrow(MERGE_SQL, tenant_id)
+            await driver.execute("ANALYZE progress_import_touched")
+            await driver.execute(LOCK_ROLLUPS_SQL)
+            await driver.execute(REBUILD_ROLLUPS_SQL)
+
+            for r in await driver.fetch(
+                "SELECT reason, count(*) AS n FROM progress_import_rejects GROUP BY reason"
+            ):
+                rejects.by_reason[r["reason"]] = rejects.by_reason.get(r["reason"], 0) + r["n"]
+            room = rejects.limit - len(rejects.samples)
+            if room > 0:
+                rejects.samples.extend(dict(r) for r in await driver.fetch(
+                    "SELECT line, reason FROM progress_import_rejects ORDER BY line LIMIT $1", room
+                ))
+
+    rejects.samples.sort(key=lambda r: r["line"])
+    report = {
+        "received": counts["received"],
+        "inserted": merged["inserted"],
+        "upgraded": merged["upgraded"],
+        "unchanged": merged["valid"] - merged["inserted"] - merged["upgraded"],
+        "rejected": rejects.count,
+        "rejects_by_reason": rejects.by_reason,
+        "rejects": rejects.samples,
+    }
+    logger.info("imported progress for tenant %s: %s", tenant_id, {
+        k: v for k, v in report.items() if k != "rejects"
+    })
+    return report
+
+
+EXPORT_SQL = text("""
+    SELECT ubp.user_id, ubp.lesson_id, ubp.block_id, ubp.status, ubp.updated_at
+    FROM users u
+    JOIN user_block_progress ubp ON ubp.user_id = u.id
+    WHERE u.tenant_id = :tenant_id
+    ORDER BY ubp.user_id, ubp.lesson_id, ubp.block_id
+""")
+
+
+async def export_progress(
+    db: AsyncEngine, tenant_id: int, fmt: str
+) -> AsyncIterator[bytes] | None:
+    """
+    Validate the tenant, then return an async iterator over its block
+    progress as CSV (with a header line) or NDJSON, in the import format.
+
+    Rows are read through a server-side cursor in one transaction, so the
+    export is a consistent snapshot and memory stays flat regardless of
+    the tenant's size. Returns None when the tenant does not exist.
+    """
+    if not await tenant_exists(db, tenant_id):
+        return None
+    return _export_chunks(db, tenant_id, fmt)
+
+
+async def _export_chunks(db: AsyncEngine, tenant_id: int, fmt: str) -> AsyncIterator[bytes]:
+    if fmt == "csv":
+        yield (",".join(FIELDS) + "\r\n").encode()
+
+    async with db.connect() as conn:
+        await conn.execute(text("SET LOCAL statement_timeout = 0"))
+        result = await conn.stream(
+            EXPORT_SQL.execution_options(yield_per=EXPORT_BATCH), {"tenant_id": tenant_id}
+        )
+        async for rows in result.partitions():
+            if fmt == "csv":
+                yield "".join(
+                    f"{r.user_id},{r.lesson_id},{r.block_id},{r.status},{r.updated_at.isoformat()}\r\n"
+                    for r in rows
+                ).encode()
+            else:
+                yield b"".join(orjson.dumps(r._asdict()) + b"\n" for r in rows)
@@ -0,0 +1,262 @@
+import asyncio
+import bisect
+import itertools
+import logging
+import time
+from collections import deque
+from contextvars import ContextVar
+from sqlalchemy import text
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncEngine
+from src.conf import AppConfig
+from src.services import hot_path, postgres
+from src.services.hot_path import HotQuery
+from src.services.health import pool_status
+from src.services.instrumentation import instrument_engine
+
+conf = AppConfig()
+logging.basicConfig(level=conf.LOG_LEVEL)
+logger = logging.getLogger(__name__)
+
+# WAL positions as byte offsets, comparable across primary and standbys
+PRIMARY_LSN = text("SELECT (pg_current_wal_lsn() - '0/0')::bigint")
+REPLAY_LSN = text("""
+    SELECT pg_is_in_recovery() AS standby, (pg_last_wal_replay_lsn() - '0/0')::bigint AS lsn
+""")
+# read after a commit: a standby that replayed this far has the committed rows
+COMMIT_LSN = HotQuery("commit_lsn", "SELECT (pg_current_wal_insert_lsn() - '0/0')::bigint AS lsn")
+
+# LSN the current request's reads must see: the write token the client sent,
+# and the commit LSN of the request's own write (see `ReplicaRouter.read_after`)
+_read_after: ContextVar[int | None] = ContextVar("replica_read_after", default=None)
+_written: ContextVar[int | None] = ContextVar("replica_written", default=None)
+
+
+def format_lsn(lsn: int) -> str:
+    """Byte offset -> pg_lsn text form ("16/B374D848")."""
+    return f"{lsn >> 32:X}/{lsn & 0xFFFFFFFF:X}"
+
+
+def parse_lsn(token: str | None) -> int | None:
+    """pg_lsn text form -> byte offset; None when missing or malformed."""
+    high, _, low = (token or "").partition("/")
+    try:
+        high, low = int(high, 16), int(low, 16)
+    except ValueError:
+        return None
+    if high < 0 or not 0 <= low <= 0xFFFFFFFF:
+        return None
+    return (high << 32) + low
+
+
+class Replica:
+    """A streaming replica and how far it has replayed the primary's WAL."""
+
+    __slots__ = ("url", "engine", "lsn", "caught_up_at", "error")
+
+    def __init__(self, url: str):
+        self.url = url
+        self.engine: AsyncEngine | None = None
+        self.lsn: int | None = None
+        # monotonic start time of the newest primary sample this replica has replayed
+        self.caught_up_at = float("-inf")
+        self.error: str | None = None
+
+    def stats(self, now: float) -> dict:
+        return {
+            "url": make_url(self.url).render_as_string(hide_password=True),
+            "lsn": self.lsn,
+            "lag_seconds": round(now - self.caught_up_at, 3) if self.lsn is not None else None,
+            "error": self.error,
+            "pool": pool_status(self.engine) if self.engine is not None else {},
+        }
+
+
+class ReplicaRouter:
+    """Routes lesson reads to streaming replicas, keeping read-your-writes.
+
+    A background loop samples the primary's WAL position and each replica's
+    replay position every `interval` seconds. A replica has caught up with a
+    sample once it replayed past the sample's LSN; replicas that have not
+    caught up with any sample of the last `max_lag` seconds get no reads.
+
+    Read-your-writes across workers rides on a write token: writers call
+    `mark_write` once their transaction committed, which reads the primary's
+    WAL position; the API returns it to the client (`written`), which sends
+    it back with its next requests (`read_after`). Those reads go to a
+    replica only once the replica's replay LSN is at or past the token, and
+    to the primary until then. Write-behind flushes, whose requests already
+    got their response, leave per-user marks instead (`mark_flushed`); like
+    the write-behind overlay they hold within the process.
+    """
+
+    def __init__(self, urls: list[str], interval: float, max_lag: float):
+        self.interval = interval
+        self.max_lag = max_lag
+        self.replicas = [Replica(url) for url in urls]
+        self._primary: AsyncEngine | None = None
+        self._task: asyncio.Task | None = None
+        # (monotonic start, primary lsn) of recent samples, oldest first
+        self._samples: deque[tuple[float, int]] = deque(maxlen=max(int(max_lag / interval) + 2, 2))
+        # user_id -> (monotonic time, commit lsn) of their last flushed write
+        self._flushed: dict[int, tuple[float, int]] = {}
+        self._next = itertools.count()
+        self.replica_reads = 0
+        self.primary_reads = 0
+        self.sticky_reads = 0
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.replicas)
+
+    async def start(self, primary: AsyncEngine) -> None:
+        if not self.enabled or self._task is not None:
+            return
+        self._primary = primary
+        for replica in self.replicas:
+            replica.engine = postgres.create_engine(replica.url)
+            instrument_engine(replica.engine, primary=False)
+            if conf.APP_WARMUP:
+                await postgres.warmup(replica.engine)
+        # replicas take reads only once a first sample says they are current
+        await self.poll()
+        self._task = asyncio.create_task(self._run())
+        logger.info("routing lesson reads to %s replica(s)", len(self.replicas))
+
+    async def stop(self) -> None:
+        self._primary = None
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        for replica in self.replicas:
+            if replica.engine is not None:
+                await replica.engine.dispose()
+                replica.engine = None
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            await self.poll()
+
+    async def poll(self) -> None:
+        """Sample the primary's WAL position, then each replica's replay position."""
+        started = time.monotonic()
+        try:
+            async with asyncio.timeout(self.max_lag):
+                async with self._primary.connect() as conn:
+                    lsn = (await conn.execute(PRIMARY_LSN)).scalar_one()
+        except Exception as e:
+            # replicas age out of max_lag without new samples
+            logger.warning("replica poll: cannot sample the primary: %s", e)
+            return
+        self._samples.append((started, lsn))
+
+        await asyncio.gather(*(self._poll_replica(replica) for replica in self.replicas))
+
+        # a mark older than max_lag cannot exclude any replica still taking reads
+        horizon = time.monotonic() - self.max_lag
+        self._flushed = {user_id: mark for user_id, mark in self._flushed.items() if mark[0] > horizon}
+
+    async def _poll_replica(self, replica: Replica) -> None:
+        try:
+            async with asyncio.timeout(self.max_lag):
+                async with replica.engine.connect() as conn:
+                    row = (await conn.execute(REPLAY_LSN)).one()
+        except Exception as e:
+            replica.error = f"{type(e).__name__}: {e}"
+            return
+        if not row.standby:
+            # LSNs of an unrelated server say nothing about replication
+            replica.error = "not a standby (pg_is_in_recovery() is false)"
+            return
+
+        replica.error = None
+        replica.lsn = row.lsn
+        lsns = [sample_lsn for _, sample_lsn in self._samples]
+        passed = bisect.bisect_right(lsns, row.lsn)
+        if passed:
+            replica.caught_up_at = max(replica.caught_up_at, self._samples[passed - 1][0])
+
+    async def _commit_lsn(self) -> int | None:
+        try:
+            async with hot_path.connect(self._primary) as conn:
+                return (await hot_path.fetchrow(conn, COMMIT_LSN, {}))["lsn"]
+        except Exception as e:
+            # the write stands; only its reads may be served stale
+            logger.warning("cannot read the commit lsn: %s", e)
+            return None
+
+    async def mark_write(self) -> None:
+        """Take the current request's write token once its write committed."""
+        if self._primary is not None:
+            _written.set(await self._commit_lsn())
+
+    async def mark_flushed(self, user_ids) -> None:
+        """Record that buffered writes of `user_ids` just committed."""
+        if self._primary is None:
+            return
+        lsn = await self._commit_lsn()
+        if lsn is not None:
+            mark = (time.monotonic(), lsn)
+            for user_id in user_ids:
+                self._flushed[user_id] = mark
+
+    def read_after(self, token: str | None) -> None:
+        """Start a request whose reads must see the write token `token` (if any)."""
+        _read_after.set(parse_lsn(token))
+        _written.set(None)
+
+    def written(self) -> str | None:
+        """Write token of the current request's write, to return to the client."""
+        lsn = _written.get()
+        return format_lsn(lsn) if lsn is not None else None
+
+    def for_read(self, primary: AsyncEngine, user_id: int | None) -> AsyncEngine:
+        """
+        Engine to read `user_id`'s lesson data from (None for data of no
+        particular user): a current replica past the request's write token,
+        else the primary.
+        """
+        if self._primary is None:
+            return primary
+
+        now = time.monotonic()
+        current = [
+            r for r in self.replicas
+            if r.error is None and now - r.caught_up_at <= self.max_lag
+        ]
+        flushed = self._flushed.get(user_id)
+        marks = (_read_after.get(), _written.get(), flushed[1] if flushed else None)
+        needed = max((lsn for lsn in marks if lsn is not None), default=None)
+        if needed is not None and current:
+            current = [r for r in current if r.lsn >= needed]
+            if not current:
+                self.sticky_reads += 1
+        if not current:
+            self.primary_reads += 1
+            return primary
+
+        self.replica_reads += 1
+        return current[next(self._next) % len(current)].engine
+
+    def stats(self) -> dict:
+        now = time.monotonic()
+        return {
+            "enabled": self._primary is not None,
+            "replica_reads": self.replica_reads,
+            "primary_reads": self.primary_reads,
+            "sticky_reads": self.sticky_reads,
+            "pending_flushes": len(self._flushed),
+            "replicas": [replica.stats(now) for replica in self.replicas],
+        }
+
+
+router = ReplicaRouter(
+    urls=[url.strip() for url in conf.POSTGRES_REPLICA_URLS.split(",") if url.strip()],
+    interval=conf.REPLICA_POLL_INTERVAL,
+    max_lag=conf.REPLICA_MAX_LAG,
+)
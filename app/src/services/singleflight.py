@@ -0,0 +1,79 @@
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Hashable
+from src.conf import AppConfig
+from src.services.instrumentation import registry
+
+conf = AppConfig()
+logging.basicConfig(level=conf.LOG_LEVEL)
+logger = logging.getLogger(__name__)
+
+CALLS = registry.counter(
+    "singleflight_calls_total",
+    "Single-flight calls by flight, as the leader running the load or a follower sharing it.",
+    ("flight", "role"),
+)
+
+
+class SingleFlight:
+    """Coalesces concurrent loads of the same key into one in-flight call.
+
+    The first caller for a key (the leader) runs the load; callers arriving
+    while it is in flight (followers) await the leader's result or exception
+    instead of running their own. Nothing is kept once the load finished:
+    caching is up to the caller. Not thread safe; meant to be used from a
+    single asyncio event loop.
+
+    A leader that is cancelled (its client went away) does not fail its
+    followers: the first of them to notice runs the load again.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._inflight: dict[Hashable, asyncio.Future] = {}
+        self.leaders = 0
+        self.followers = 0
+
+    async def do(self, key: Hashable, load: Callable[[], Awaitable[Any]]) -> Any:
+        while True:
+            future = self._inflight.get(key)
+            if future is None:
+                break
+            self.followers += 1
+            CALLS.inc(flight=self.name, role="follower")
+            try:
+                return await asyncio.shield(future)
+            except asyncio.CancelledError:
+                if not future.cancelled() or asyncio.current_task().cancelling():
+                    raise
+                # the leader was cancelled, not us: take over
+
+        future = asyncio.get_running_loop().create_future()
+        # followers may be gone by the time it fails; nobody else reads the exception
+        future.add_done_callback(lambda f: f.cancelled() or f.exception())
+        self._inflight[key] = future
+        self.leaders += 1
+        CALLS.inc(flight=self.name, role="leader")
+        try:
+            result = await load()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            if self._inflight.get(key) is future:
+                del self._inflight[key]
+
+    def stats(self) -> dict:
+        calls = self.leaders + self.followers
+        return {
+            "in_flight": len(self._inflight),
+            "leaders": self.leaders,
+            "followers": self.followers,
+            "coalesced_ratio": round(self.followers / calls, 4) if calls else 0.0,
+        }
@@ -0,0 +1,61 @@
+import gzip
+
+try:
+    from compression import zstd  # Python 3.14+
+
+    def _zstd(body: bytes) -> bytes:
+        return zstd.compress(body, level=3)
+except ImportError:
+    try:
+        import zstandard
+
+        _zstd = zstandard.ZstdCompressor(level=3).compress
+    except ImportError:
+        _zstd = None
+
+# Content-Encoding -> compress function, in order of preference
+ENCODERS = {
+    **({"zstd": _zstd} if _zstd is not None else {}),
+    "gzip": lambda body: gzip.compress(body, compresslevel=6, mtime=0),
+}
+
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    """
+    `If-None-Match` check (weak comparison, as RFC 9110 requires for it):
+    true when the header lists `etag`, with or without W/, or is "*".
+    """
+    opaque = etag.removeprefix("W/")
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate == "*" or candidate.removeprefix("W/") == opaque:
+            return True
+    return False
+
+
+def negotiate_encoding(accept_encoding: str | None) -> str | None:
+    """
+    Content-Encoding among ENCODERS for an `Accept-Encoding` header: the
+    highest q-value, ties going to our order of preference. None for
+    identity (no header, nothing acceptable).
+    """
+    if not accept_encoding:
+        return None
+    accepted = {}
+    for item in accept_encoding.split(","):
+        coding, _, params = item.strip().partition(";")
+        q = 1.0
+        for param in params.split(";"):
+            name, _, value = param.strip().partition("=")
+            if name.lower() == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        accepted[coding.strip().lower()] = q
+    best, best_q = None, 0.0
+    for coding in ENCODERS:
+        q = accepted.get(coding, accepted.get("*", 0.0))
+        if q > best_q:
+            best, best_q = coding, q
+    return best
@@ -0,0 +1,198 @@
+import fcntl
+import logging
+import mmap
+import os
+import struct
+import zlib
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+# bump when the layout changes: segments of another format are never attached
+FORMAT = 1
+MAGIC = b"PAIRSHM" + bytes([FORMAT])
+
+# magic, slot count, data capacity, ring head, fills, evictions
+HEADER = struct.Struct("<8sIxxxxQQQQ")
+HEAD = struct.Struct("<Q")
+HEAD_AT = 24
+FILLS_AT = 32
+EVICTIONS_AT = 40
+HEADER_SIZE = 64
+
+# seq, version, tenant_id, lesson_id, ring offset, length, crc32
+SLOT = struct.Struct("<QQiiQII")
+SEQ = struct.Struct("<Q")
+SLOT_FIELDS = struct.Struct("<QiiQII")
+PROBE = 8
+# average blob size the slot table is sized for
+SLOT_BYTES = 4096
+
+
+class SharedCache:
+    """Fixed-size cache of blobs in a memory-mapped file shared by the processes of a host.
+
+    Entries are keyed by (tenant_id, lesson_id) and tagged with a version;
+    a lookup for another version misses. The file holds a slot table
+    (open addressing over a window of PROBE slots) and a data ring: blobs
+    are appended at the ring head, so memory is bounded by `size` and the
+    oldest blobs are overwritten first. A full probe window evicts its
+    oldest entry.
+
+    Reads take no lock: each slot is a seqlock (odd while a writer updates
+    it), a blob counts as overwritten once the head moved a ring length past
+    it, and a crc32 over the copied bytes rejects anything torn. Writers
+    serialize on an flock of the file. A reader never blocks; at worst it
+    misses.
+
+    The file is created and laid out by the first process to attach; the
+    name carries the format and size so differently configured processes
+    do not share it. Attaching happens on first use; when it fails the
+    cache stays disabled.
+    """
+
+    def __init__(self, path: str, size: int):
+        self.path = f"{path}.{FORMAT}.{size}"
+        self.size = size
+        self.slots = max(PROBE, size // SLOT_BYTES)
+        self.data_at = -(-(HEADER_SIZE + self.slots * SLOT.size) // 64) * 64
+        self.capacity = size - self.data_at
+        self._fd: int | None = None
+        self._map: mmap.mmap | None = None
+        self._failed = False
+        self.hits = 0
+        self.misses = 0
+        self.torn = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.size > 0 and not self._failed
+
+    def _attach(self) -> mmap.mmap | None:
+        if self._map is not None or not self.enabled:
+            return self._map
+        if self.capacity < SLOT_BYTES:
+            logger.warning("shared cache of %s bytes is too small, disabled", self.size)
+            self._failed = True
+            return None
+        try:
+            fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+            with _flock(fd):
+                if os.fstat(fd).st_size != self.size:
+                    os.ftruncate(fd, self.size)
+                mapped = mmap.mmap(fd, self.size)
+                if mapped[:8] != MAGIC:
+                    mapped[:self.data_at] = bytes(self.data_at)
+                    HEADER.pack_into(mapped, 0, MAGIC, self.slots, self.capacity, 0, 0, 0)
+        except OSError as e:
+            logger.warning("shared cache %s unavailable, disabled: %s", self.path, e)
+            self._failed = True
+            return None
+        self._fd, self._map = fd, mapped
+        return mapped
+
+    def close(self) -> None:
+        if self._map is not None:
+            self._map.close()
+            os.close(self._fd)
+            self._map = self._fd = None
+
+    def _probe(self, tenant_id: int, lesson_id: int):
+        start = ((tenant_id * 0x9E3779B1) ^ lesson_id) % self.slots
+        for i in range(PROBE):
+            yield HEADER_SIZE + ((start + i) % self.slots) * SLOT.size
+
+    def get(self, key: tuple[int, int], version: int) -> bytes | None:
+        """The blob stored for `key` at `version`, or None."""
+        mapped = self._attach()
+        if mapped is None:
+            return None
+        tenant_id, lesson_id = key
+        for at in self._probe(tenant_id, lesson_id):
+            seq, entry_version, t, l, offset, length, crc = SLOT.unpack_from(mapped, at)
+            if seq & 1 or length == 0 or (t, l) != key:
+                continue
+            if entry_version != version:
+                break
+
+            start = self.data_at + offset % self.capacity
+            blob = mapped[start:start + length]
+            overwritten = HEAD.unpack_from(mapped, HEAD_AT)[0] - offset > self.capacity
+            if overwritten or SEQ.unpack_from(mapped, at)[0] != seq or zlib.crc32(blob) != crc:
+                self.torn += 1
+                break
+            self.hits += 1
+            return blob
+
+        self.misses += 1
+        return None
+
+    def set(self, key: tuple[int, int], version: int, blob: bytes) -> bool:
+        """Store `blob` for `key` at `version`; False when disabled or too large."""
+        mapped = self._attach()
+        if mapped is None or not 0 < len(blob) <= self.capacity // 4:
+            return False
+        tenant_id, lesson_id = key
+
+        with _flock(self._fd):
+            head = HEAD.unpack_from(mapped, HEAD_AT)[0]
+            offset = head
+            if offset % self.capacity + len(blob) > self.capacity:
+                # blobs never wrap: skip the ring's tail
+                offset += self.capacity - offset % self.capacity
+            # readers of blobs in the region see it moved before it is overwritten
+            HEAD.pack_into(mapped, HEAD_AT, offset + len(blob))
+            start = self.data_at + offset % self.capacity
+            mapped[start:start + len(blob)] = blob
+
+            at = self._pick_slot(mapped, tenant_id, lesson_id, head)
+            seq = SEQ.unpack_from(mapped, at)[0]
+            SEQ.pack_into(mapped, at, seq + 1)
+            SLOT_FIELDS.pack_into(
+                mapped, at + SEQ.size, version, tenant_id, lesson_id, offset, len(blob), zlib.crc32(blob)
+            )
+            SEQ.pack_into(mapped, at, seq + 2)
+            HEAD.pack_into(mapped, FILLS_AT, HEAD.unpack_from(mapped, FILLS_AT)[0] + 1)
+        return True
+
+    def _pick_slot(self, mapped: mmap.mmap, tenant_id: int, lesson_id: int, head: int) -> int:
+        """Slot for the key: its own, else a free or overwritten one, else the oldest."""
+        free = oldest = None
+        oldest_offset = None
+        for at in self._probe(tenant_id, lesson_id):
+            _, _, t, l, offset, length, _ = SLOT.unpack_from(mapped, at)
+            if length and (t, l) == (tenant_id, lesson_id):
+                return at
+            if length == 0 or head - offset > self.capacity:
+                free = free if free is not None else at
+            elif oldest_offset is None or offset < oldest_offset:
+                oldest, oldest_offset = at, offset
+        if free is not None:
+            return free
+        HEAD.pack_into(mapped, EVICTIONS_AT, HEAD.unpack_from(mapped, EVICTIONS_AT)[0] + 1)
+        return oldest
+
+    def stats(self) -> dict:
+        stats = {
+            "enabled": self.enabled,
+            "path": self.path,
+            "size": self.size,
+            "slots": self.slots,
+            "hits": self.hits,
+            "misses": self.misses,
+            "torn_reads": self.torn,
+        }
+        if self._map is not None:
+            _, _, _, head, fills, evictions = HEADER.unpack_from(self._map, 0)
+            # shared by all attached processes
+            stats.update(used=min(head, self.capacity), fills=fills, evictions=evictions)
+        return stats
+
+
+@contextmanager
+def _flock(fd: int):
+    fcntl.flock(fd, fcntl.LOCK_EX)
+    try:
+        yield
+    finally:
+        fcntl.flock(fd, fcntl.LOCK_UN)
@@ -0,0 +1,36 @@
+"""
+Fixtures shared by the integration tests.
+
+They require a running PostgreSQL database with seed data.
+"""
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import text
+from src import services as svc
+from src.main import app
+
+
+@pytest.fixture(scope="module")
+def client():
+    """Test client; entering it runs the app lifespan (postgres pool)."""
+    with TestClient(app) as client:
+        yield client
+
+
+def execute_sql(client, sql: str, params: dict | None = None) -> list | None:
+    """Run a statement on the app's engine, inside the client's event loop; its rows, if any."""
+    async def run():
+        async with svc.postgres.get_engine().begin() as conn:
+            result = await conn.execute(text(sql), params or {})
+            return result.all() if result.returns_rows else None
+
+    return client.portal.call(run)
+
+
+@pytest.fixture
+def no_progress(client):
+    """User 11 starts, and leaves the test, without progress on lesson 100."""
+    sql = "DELETE FROM user_block_progress WHERE user_id = 11 AND lesson_id = 100"
+    execute_sql(client, sql)
+    yield
+    execute_sql(client, sql)
@@ -0,0 +1,233 @@
+"""
+Tests for per-tenant admission control (src.services.admission).
+
+The API test requires a running PostgreSQL database with seed data.
+"""
+import asyncio
+from fastapi.testclient import TestClient
+from src import services as svc
+from src.main import app
+from src.services import admission
+from src.services.admission import Budget, parse_weights
+
+
+def budget(slots=2, tenant_share=1.0, timeout=1.0, max_queue=16, weights=None):
+    return Budget("test", slots=slots, tenant_share=tenant_share, timeout=timeout,
+                  max_queue=max_queue, weights=weights)
+
+
+async def serve_in_turn(slots: Budget, tenant_ids: list[int]) -> list[int]:
+    """Queue one request per tenant id behind full slots, then release one at a time."""
+    order = []
+
+    async def request(tenant_id):
+        assert await slots.acquire(tenant_id) is None
+        order.append(tenant_id)
+
+    holders = [slots.acquire(0) for _ in range(slots.slots)]
+    await asyncio.gather(*holders)
+    tasks = []
+    for tenant_id in tenant_ids:
+        tasks.append(asyncio.create_task(request(tenant_id)))
+        await asyncio.sleep(0)
+
+    slots.release(0, 0.01)
+    for _ in tenant_ids:
+        await asyncio.sleep(0)
+        slots.release(order[-1], 0.01)
+    await asyncio.gather(*tasks)
+    return order
+
+
+class TestBudget:
+    """Tests for Budget"""
+
+    def test_lends_idle_slots_beyond_the_share(self):
+        """Should admit a lone tenant at once while slots are free, even beyond its share."""
+        slots = budget(slots=4, tenant_share=0.5, timeout=0.02)
+
+        async def run():
+            admitted = [await slots.acquire(1) for _ in range(4)]
+            shed = await slots.acquire(1)
+            return admitted, shed
+
+        admitted, shed = asyncio.run(run())
+        assert admitted == [None] * 4
+        assert shed["status"] == 429 and shed["error"] == "queue_timeout" and shed["retry_after"] >= 1
+        stats = slots.stats()
+        assert stats["tenants"]["1"] == {"active": 4, "waiting": 0}
+        assert (stats["admitted"], stats["shed_429"], stats["shed_503"]) == (4, 1, 0)
+
+    def test_share_holds_while_others_wait(self):
+        """Should give a freed slot to a waiting tenant below its share before one holding more."""
+        slots = budget(slots=2, tenant_share=0.5, timeout=5)
+
+        async def run():
+            order = []
+
+            async def request(tenant_id):
+                assert await slots.acquire(tenant_id) is None
+                order.append(tenant_id)
+
+            await slots.acquire(1)
+            await slots.acquire(1)
+            tasks = []
+            for tenant_id in (1, 2):
+                tasks.append(asyncio.create_task(request(tenant_id)))
+                await asyncio.sleep(0)
+            for _ in range(2):
+                slots.release(1, 0.0)
+                await asyncio.sleep(0)
+            await asyncio.gather(*tasks)
+            slots.release(1, 0.0)
+            slots.release(2, 0.0)
+            return order
+
+        assert asyncio.run(run()) == [2, 1]
+        assert slots.tenants == {} and slots.in_use == 0
+
+    def test_service_busy_is_a_503(self):
+        """Should shed with 503 when the slots are taken by other tenants."""
+        slots = budget(slots=2, tenant_share=0.5, timeout=0.02)
+
+        async def run():
+            await slots.acquire(1)
+            await slots.acquire(2)
+            return await slots.acquire(3)
+
+        assert asyncio.run(run())["status"] == 503
+
+    def test_full_queue_sheds_at_once(self):
+        """Should not queue more than max_queue requests of a tenant."""
+        slots = budget(slots=1, max_queue=1, timeout=5)
+
+        async def run():
+            await slots.acquire(1)
+            waiting = asyncio.create_task(slots.acquire(1))
+            await asyncio.sleep(0)
+            shed = await slots.acquire(1)
+            slots.release(1, 0.0)
+            return shed, await waiting
+
+        shed, admitted = asyncio.run(run())
+        assert shed["error"] == "queue_full"
+        assert admitted is None
+
+    def test_fair_between_tenants(self):
+        """Should interleave tenants instead of serving a backlog first come, first served."""
+        slots = budget(slots=1)
+        assert asyncio.run(serve_in_turn(slots, [1, 1, 1, 1, 2, 2])) == [1, 2, 1, 2, 1, 1]
+
+    def test_weighted(self):
+        """Should serve a tenant of weight 2 twice as often."""
+        slots = budget(slots=1, weights={2: 2.0})
+        assert asyncio.run(serve_in_turn(slots, [1, 1, 1, 2, 2, 2, 2])) == [1, 2, 2, 1, 2, 2, 1]
+
+    def test_cancelled_waiter_leaves_the_queue(self):
+        """Should drop a waiter whose request went away, without leaking a slot."""
+        slots = budget(slots=1, timeout=5)
+
+        async def run():
+            await slots.acquire(1)
+            waiting = asyncio.create_task(slots.acquire(2))
+            await asyncio.sleep(0)
+            waiting.cancel()
+            await asyncio.gather(waiting, return_exceptions=True)
+            slots.release(1, 0.0)
+
+        asyncio.run(run())
+        assert (slots.in_use, slots.stats()["waiting"]) == (0, 0)
+
+    def test_idle_tenants_forgotten(self):
+        """Should keep no state for tenants that hold and await nothing."""
+        slots = budget(slots=1, max_queue=1, timeout=0.02)
+
+        async def run():
+            await slots.acquire(1)
+            shed = await slots.acquire(2)
+            assert shed["error"] == "queue_timeout"
+            assert set(slots.tenants) == {1}
+            waiting = asyncio.create_task(slots.acquire(3))
+            await asyncio.sleep(0)
+            slots.release(1, 0.0)
+            assert await waiting is None
+            slots.release(3, 0.0)
+
+        asyncio.run(run())
+        assert slots.tenants == {}
+        assert slots.stats()["tenants"] == {}
+
+    def test_tenant_at_its_share_keeps_its_place(self):
+        """Should pass over a waiting tenant holding its full share, and serve it once it releases."""
+        slots = budget(slots=2, tenant_share=0.5, timeout=5)
+
+        async def run():
+            order = []
+
+            async def request(tenant_id):
+                assert await slots.acquire(tenant_id) is None
+                order.append(tenant_id)
+
+            await slots.acquire(1)
+            await slots.acquire(2)
+            tasks = []
+            for tenant_id in (1, 3, 4):
+                tasks.append(asyncio.create_task(request(tenant_id)))
+                await asyncio.sleep(0)
+            for tenant_id in (2, 3):
+                slots.release(tenant_id, 0.0)
+                await asyncio.sleep(0)
+            assert (order, slots.in_use) == ([3, 4], 2)
+            # nobody else is waiting: the slot is lent beyond the share
+            slots.release(4, 0.0)
+            await asyncio.gather(*tasks)
+            slots.release(1, 0.0)
+            slots.release(1, 0.0)
+            return order
+
+        assert asyncio.run(run()) == [3, 4, 1]
+        assert slots.tenants == {} and slots.in_use == 0
+
+    def test_tenant_labels_bounded(self, monkeypatch):
+        """Should label weighted and the first few tenants by id, the rest as other."""
+        monkeypatch.setattr(admission, "_labelled", set())
+        monkeypatch.setattr(admission, "weights", {7: 2.0})
+        monkeypatch.setattr(admission.conf, "ADMISSION_METRIC_TENANTS", 2)
+        labels = [admission.tenant_label(t) for t in (1, 2, 3, 7, 1, 4)]
+        assert labels == ["1", "2", "other", "7", "1", "other"]
+
+    def test_parse_weights(self):
+        """Should skip malformed and non-positive weights."""
+        assert parse_weights("7:4, 12:0.5,x:1,3:0,") == {7: 4.0, 12: 0.5}
+
+
+class TestLessonAdmission:
+    """Tests for admission on the lesson routes"""
+
+    def test_shed_with_retry_after(self, monkeypatch):
+        """Should shed a tenant holding more than its share with 429 and Retry-After, and still serve others."""
+        reads = svc.admission.reads
+        with TestClient(app) as client:
+            configured = reads.slots
+            monkeypatch.setattr(reads, "timeout", 0.02)
+            monkeypatch.setattr(reads, "tenant_share", 0.5)
+            reads.resize(2)
+            try:
+                for _ in range(2):
+                    assert client.portal.call(reads.acquire, 1) is None
+                response = client.get("/api/v1/tenants/1/users/10/lessons/100")
+                assert response.status_code == 429
+                assert int(response.headers["Retry-After"]) >= 1
+
+                reads.release(1, 0.0)
+                assert client.get("/api/v1/tenants/2/users/20/lessons/200").status_code == 200
+                reads.release(1, 0.0)
+                assert client.get("/api/v1/tenants/1/users/10/lessons/100").status_code == 200
+                stats = client.get("/api/admissionz").json()["reads"]
+            finally:
+                reads.resize(configured)
+
+        assert stats["in_use"] == 0
+        assert stats["shed_429"] >= 1
+        assert stats["tenants"] == {}
+        assert "admission_shed_total" in client.get("/metrics").text
@@ -0,0 +1,53 @@
+"""
+Unit tests for the in-process LRU cache.
+"""
+import time
+from src.utils.cache import LRUCache
+
+
+class TestLRUCache:
+    """Tests for src.utils.cache.LRUCache"""
+
+    def test_hit_and_miss(self):
+        cache = LRUCache(maxsize=2, ttl=60)
+        assert cache.get("a") is None
+        cache.set("a", 1)
+        assert cache.get("a") == 1
+
+        stats = cache.stats()
+        assert stats["hits"] == 1
+        assert stats["misses"] == 1
+
+    def test_evicts_least_recently_used(self):
+        cache = LRUCache(maxsize=2, ttl=60)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        cache.get("a")
+        cache.set("c", 3)
+
+        assert cache.get("b") is None
+        assert cache.get("a") == 1
+        assert cache.get("c") == 3
+        assert cache.stats()["evictions"] == 1
+
+    def test_ttl_expiry(self):
+        cache = LRUCache(maxsize=2, ttl=0.01)
+        cache.set("a", 1)
+        time.sleep(0.02)
+
+        assert cache.get("a") is None
+        assert cache.stats()["expirations"] == 1
+
+    def test_version_mismatch_invalidates(self):
+        cache = LRUCache(maxsize=2, ttl=60)
+        cache.set("a", 1, version=1)
+
+        assert cache.get("a", version=1) == 1
+        assert cache.get("a", version=2) is None
+        assert len(cache) == 0
+        assert cache.stats()["invalidations"] == 1
+
+    def test_zero_size_disables(self):
+        cache = LRUCache(maxsize=0, ttl=60)
+        cache.set("a", 1)
+        assert cache.get("a") is None
@@ -0,0 +1,74 @@
+"""
+Tests for the liveness/readiness endpoints and the background health check.
+
+These tests require a running PostgreSQL database.
+"""
+from src import services as svc
+
+
+class TestHealth:
+    """Tests for /api/livez, /api/readyz and /api/healthz"""
+
+    def test_live_and_ready(self, client):
+        """Should be ready once the startup check has pinged postgres."""
+        assert client.get("/api/livez").status_code == 200
+
+        response = client.get("/api/readyz")
+        assert response.status_code == 200
+        data = response.json()
+        assert data["ready"] is True
+        assert data["postgres"]["ok"] is True
+        assert data["postgres"]["ping_ms"] >= 0
+        assert data["postgres"]["pool"]["size"] == svc.health.conf.POSTGRES_POOL_SIZE
+
+        response = client.get("/api/healthz")
+        assert response.status_code == 200
+        assert response.json() == {"health": {"postgres": "OK"}}
+
+    def test_probes_do_not_query(self, client):
+        """Should answer from the cached result without a database round trip."""
+        route = svc.instrumentation.REQUEST_QUERIES
+        client.get("/api/readyz")
+        client.get("/api/livez")
+        assert route.count(route="/api/readyz") >= 1
+        assert route.sum(route="/api/readyz") == 0
+        assert route.sum(route="/api/livez") == 0
+
+    def test_not_ready_over_ping_threshold(self, client, monkeypatch):
+        """Should fail readiness (not liveness) when ping latency is too high."""
+        monkeypatch.setattr(svc.health.conf, "HEALTH_MAX_PING_MS", -1.0)
+
+        response = client.get("/api/readyz")
+        assert response.status_code == 503
+        assert response.json()["reasons"][0].startswith("ping")
+        assert client.get("/api/healthz").status_code == 503
+        assert client.get("/api/livez").status_code == 200
+
+    def test_not_ready_over_pool_wait_threshold(self, client, monkeypatch):
+        monkeypatch.setattr(svc.health.conf, "HEALTH_MAX_POOL_WAIT_MS", -1.0)
+
+        response = client.get("/api/readyz")
+        assert response.status_code == 503
+        assert response.json()["reasons"][0].startswith("pool wait")
+
+    def test_not_ready_when_stale(self, client, monkeypatch):
+        """Should fail readiness when the monitor stopped producing results."""
+        monkeypatch.setattr(svc.health.conf, "HEALTH_STALE_AFTER", -1.0)
+        assert client.get("/api/readyz").status_code == 503
+
+    def test_failed_ping_is_cached(self, client, monkeypatch):
+        """Should record a timed-out check as a failure with the pool wait."""
+        monitor = svc.health.monitor
+        monkeypatch.setattr(monitor, "timeout", 0)
+        try:
+            result = client.portal.call(monitor.check)
+            assert result["ok"] is False
+            assert "no answer" in result["error"]
+
+            response = client.get("/api/readyz")
+            assert response.status_code == 503
+            assert any("ping failed" in r for r in response.json()["reasons"])
+        finally:
+            monkeypatch.undo()
+            client.portal.call(monitor.check)
+        assert client.get("/api/readyz").status_code == 200
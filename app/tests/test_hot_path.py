@@ -0,0 +1,97 @@
+"""
+Tests for the asyncpg hot path (named prepared statements per connection).
+
+The database tests require a running PostgreSQL database with seed data.
+"""
+from src import services as svc
+from src.services.hot_path import HotQuery, StatementCache
+
+LESSON_URL = "/api/v1/tenants/1/users/10/lessons/100"
+
+COUNT_QUERY = HotQuery("test_count", """
+    SELECT count(*) AS n FROM lesson_blocks WHERE lesson_id = :lesson_id AND position > :after
+""")
+
+
+def run_on_connection(client, fn):
+    """Run `fn(conn)` on a hot-path connection inside the client's event loop."""
+    async def run():
+        async with svc.hot_path.connect(svc.postgres.get_engine()) as conn:
+            return await fn(conn)
+
+    return client.portal.call(run)
+
+
+class TestHotQuery:
+    """Tests for src.services.hot_path.HotQuery"""
+
+    def test_compiles_named_to_positional(self):
+        query = HotQuery("q", "SELECT :b, CAST(:a AS int), :b, (x IS NULL)::int")
+        assert query.sql == "SELECT $1, CAST($2 AS int), $1, (x IS NULL)::int"
+        assert query.args({"a": 1, "b": 2}) == (2, 1)
+
+
+class TestHotPath:
+    """Tests for the hot path against the database"""
+
+    def test_same_responses_on_both_paths(self, client, monkeypatch):
+        """Should return identical lesson, list and blocks responses."""
+        urls = [LESSON_URL, "/api/v1/tenants/1/users/10/lessons", f"{LESSON_URL}/blocks?limit=2"]
+        hot = [client.get(url).json() for url in urls]
+
+        monkeypatch.setattr(svc.hot_path.conf, "POSTGRES_HOT_PATH", False)
+        svc.lessons.skeleton_cache.clear()
+        plain = [client.get(url).json() for url in urls]
+
+        assert hot == plain
+
+    def test_statements_prepared_once_per_connection(self, client):
+        """Should reuse the prepared statement on later calls."""
+        async def calls(conn):
+            prepares = svc.hot_path.stats["prepares"]
+            rows = [
+                await conn.fetchrow(COUNT_QUERY, {"lesson_id": 100, "after": after})
+                for after in (0, 1, 2)
+            ]
+            return rows, svc.hot_path.stats["prepares"] - prepares
+
+        rows, prepared = run_on_connection(client, calls)
+        assert [r["n"] for r in rows] == [3, 2, 1]
+        assert prepared <= 1
+
+    def test_reprepares_after_deallocate(self, client):
+        """Should recover when the session lost its prepared statements."""
+        async def calls(conn):
+            await conn.fetchrow(COUNT_QUERY, {"lesson_id": 100, "after": 0})
+            # as after a DISCARD, for this statement only (asyncpg keeps its own)
+            for r in await conn.driver.fetch(
+                "SELECT name FROM pg_prepared_statements WHERE name LIKE 'hot_test_count_%'"
+            ):
+                await conn.driver.execute(f'DEALLOCATE "{r["name"]}"')
+            reprepares = svc.hot_path.stats["reprepares"]
+            row = await conn.fetchrow(COUNT_QUERY, {"lesson_id": 100, "after": 0})
+            return row, svc.hot_path.stats["reprepares"] - reprepares
+
+        row, reprepared = run_on_connection(client, calls)
+        assert row["n"] == 3
+        assert reprepared == 1
+
+    def test_statement_cache_is_bounded(self, client):
+        """Should evict the least recently used statement past maxsize."""
+        queries = [HotQuery(f"test_bounded_{i}", f"SELECT {i} AS i") for i in range(3)]
+
+        async def calls(conn):
+            cache = StatementCache(maxsize=2)
+            for query in queries:
+                await cache.get(conn.driver, query)
+            return list(cache._statements)
+
+        assert run_on_connection(client, calls) == ["test_bounded_1", "test_bounded_2"]
+
+    def test_hot_queries_are_counted(self, client):
+        """Should report raw driver queries in the per-request metrics."""
+        route = "/api/v1/tenants/{tenant_id}/users/{user_id}/lessons"
+        histogram = svc.instrumentation.REQUEST_QUERIES
+        before = histogram.sum(route=route)
+        assert client.get("/api/v1/tenants/1/users/10/lessons").status_code == 200
+        assert histogram.sum(route=route) == before + 1
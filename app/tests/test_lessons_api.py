@@ -4,18 +4,19 @@ Integration tests for the lessons API endpoints.
 These tests require a running PostgreSQL database with seed data.
 Run with: cd app && uv run pytest tests/
 """
+import json
 import pytest
-from fastapi.testclient import TestClient
-from src.main import app
-
-
-client = TestClient(app)
+from src import services as svc
+from src.api.v1 import lessons as lessons_api
+from src.api.v1.lessons import Root
+from src.utils.http import ENCODERS, negotiate_encoding
+from tests.conftest import execute_sql
 
 
 class TestGetLesson:
     """Tests for GET /tenants/{tenant_id}/users/{user_id}/lessons/{lesson_id}"""
 
-    def test_get_lesson_success(self):
+    def test_get_lesson_success(self, client):
         """Should return lesson with blocks and progress for valid tenant/user/lesson."""
         response = client.get("/api/v1/tenants/1/users/10/lessons/100")
         assert response.status_code == 200
@@ -44,7 +45,7 @@ class TestGetLesson:
         assert "tenant_id" in first_block["variant"]
         assert "data" in first_block["variant"]
 
-    def test_get_lesson_tenant_override_variant(self):
+    def test_get_lesson_tenant_override_variant(self, client):
         """Should return tenant-specific variant when available."""
         response = client.get("/api/v1/tenants/1/users/10/lessons/100")
         assert response.status_code == 200
@@ -56,7 +57,7 @@ class TestGetLesson:
         assert block_200["variant"]["id"] == 1100
         assert block_200["variant"]["tenant_id"] == 1
 
-    def test_get_lesson_default_variant(self):
+    def test_get_lesson_default_variant(self, client):
         """Should return default variant when no tenant override exists."""
         response = client.get("/api/v1/tenants/1/users/10/lessons/100")
         assert response.status_code == 200
@@ -67,7 +68,7 @@ class TestGetLesson:
         assert block_201["id"] == 201
         assert block_201["variant"]["tenant_id"] is None
 
-    def test_get_lesson_progress_summary(self):
+    def test_get_lesson_progress_summary(self, client):
         """Should return correct progress summary based on seed data."""
         response = client.get("/api/v1/tenants/1/users/10/lessons/100")
         assert response.status_code == 200
@@ -82,7 +83,7 @@ class TestGetLesson:
         assert summary["last_seen_block_id"] == 201
         assert summary["completed"] is False
 
-    def test_get_lesson_user_progress_on_blocks(self):
+    def test_get_lesson_user_progress_on_blocks(self, client):
         """Should return correct user_progress for each block."""
         response = client.get("/api/v1/tenants/1/users/10/lessons/100")
         assert response.status_code == 200
@@ -95,34 +96,34 @@ class TestGetLesson:
         assert blocks[1]["user_progress"] == "seen"
         assert blocks[2]["user_progress"] is None
 
-    def test_get_lesson_not_found_invalid_tenant(self):
+    def test_get_lesson_not_found_invalid_tenant(self, client):
         """Should return 404 for non-existent tenant."""
         response = client.get("/api/v1/tenants/999/users/10/lessons/100")
         assert response.status_code == 404
 
-    def test_get_lesson_not_found_invalid_user(self):
+    def test_get_lesson_not_found_invalid_user(self, client):
         """Should return 404 for non-existent user."""
         response = client.get("/api/v1/tenants/1/users/999/lessons/100")
         assert response.status_code == 404
 
-    def test_get_lesson_not_found_invalid_lesson(self):
+    def test_get_lesson_not_found_invalid_lesson(self, client):
         """Should return 404 for non-existent lesson."""
         response = client.get("/api/v1/tenants/1/users/10/lessons/999")
         assert response.status_code == 404
 
-    def test_get_lesson_cross_tenant_user_not_allowed(self):
+    def test_get_lesson_cross_tenant_user_not_allowed(self, client):
         """Should return 404 when user doesn't belong to tenant."""
         # User 20 belongs to tenant 2, not tenant 1
         response = client.get("/api/v1/tenants/1/users/20/lessons/100")
         assert response.status_code == 404
 
-    def test_get_lesson_cross_tenant_lesson_not_allowed(self):
+    def test_get_lesson_cross_tenant_lesson_not_allowed(self, client):
         """Should return 404 when lesson doesn't belong to tenant."""
         # Lesson 200 belongs to tenant 2, not tenant 1
         response = client.get("/api/v1/tenants/1/users/10/lessons/200")
         assert response.status_code == 404
 
-    def test_get_lesson_globex_different_block_order(self):
+    def test_get_lesson_globex_different_block_order(self, client):
         """Should return blocks in correct order for Globex (different from Acme)."""
         response = client.get("/api/v1/tenants/2/users/20/lessons/200")
         assert response.status_code == 200
@@ -132,11 +133,360 @@ class TestGetLesson:
         block_ids = [b["id"] for b in data["blocks"]]
         assert block_ids == [200, 202, 201]
 
+    def test_get_lesson_fast_path_matches_validated_model(self, client):
+        """Should return exactly what validating through Root would produce."""
+        response = client.get("/api/v1/tenants/1/users/10/lessons/100")
+
+        data = client.portal.call(
+            svc.lessons.get_lesson, svc.postgres.get_engine(), 1, 10, 100
+        )
+        assert response.json() == Root.model_validate(data).model_dump()
+
+    def test_get_lesson_cache_invalidated_on_variant_update(self, client):
+        """Should serve fresh variant data after block_variants changes."""
+        client.get("/api/v1/tenants/1/users/10/lessons/100")
+
+        execute_sql(
+            client,
+            "UPDATE block_variants SET data = data || '{\"edited\": true}', updated_at = now() WHERE id = 1001",
+        )
+        try:
+            response = client.get("/api/v1/tenants/1/users/10/lessons/100")
+            assert response.status_code == 200
+            assert response.json()["blocks"][1]["variant"]["data"]["edited"] is True
+        finally:
+            execute_sql(
+                client,
+                "UPDATE block_variants SET data = data - 'edited' WHERE id = 1001",
+            )
+
+        response = client.get("/api/v1/tenants/1/users/10/lessons/100")
+        assert "edited" not in response.json()["blocks"][1]["variant"]["data"]
+
+
+class TestConditionalGet:
+    """Tests for ETags and If-None-Match on the lesson and lesson content endpoints"""
+
+    LESSON_URL = "/api/v1/tenants/1/users/11/lessons/100"
+    CONTENT_URL = "/api/v1/tenants/1/lessons/100/content"
+
+    def test_not_modified_without_assembly(self, client):
+        """Should answer a matching If-None-Match with 304 after one query."""
+        response = client.get(self.LESSON_URL)
+        etag = response.headers["etag"]
+        assert response.headers["cache-control"] == "private, no-cache"
+
+        route = "/api/v1/tenants/{tenant_id}/users/{user_id}/lessons/{lesson_id}"
+        queries = svc.instrumentation.REQUEST_QUERIES
+        before = queries.sum(route=route)
+        response = client.get(self.LESSON_URL, headers={"If-None-Match": f'"x", W/{etag}'})
+        assert response.status_code == 304
+        assert response.content == b""
+        assert response.headers["etag"] == etag
+        assert queries.sum(route=route) == before + 1
+
+    def test_etag_changes_with_progress_and_content(self, client, no_progress):
+        """Should serve a fresh body after the user's progress or the lesson content changed."""
+        etag = client.get(self.LESSON_URL).headers["etag"]
+        client.put(f"{self.LESSON_URL}/progress", json={"block_id": 202, "status": "seen"})
+        response = client.get(self.LESSON_URL, headers={"If-None-Match": etag})
+        assert response.status_code == 200
+        assert response.headers["etag"] != etag
+
+        etag = response.headers["etag"]
+        # repeating a stored status changes nothing in the response
+        client.put(f"{self.LESSON_URL}/progress", json={"block_id": 202, "status": "seen"})
+        assert client.get(self.LESSON_URL, headers={"If-None-Match": etag}).status_code == 304
+
+        execute_sql(client, "UPDATE lessons SET title = title || '!' WHERE id = 100")
+        try:
+            response = client.get(self.LESSON_URL, headers={"If-None-Match": etag})
+            assert response.status_code == 200
+            assert response.json()["lesson"]["title"] == "AI Basics!"
+        finally:
+            execute_sql(client, "UPDATE lessons SET title = 'AI Basics' WHERE id = 100")
+
+    def test_not_found_ignores_if_none_match(self, client):
+        """Should 404 rather than 304 for another tenant's lesson."""
+        response = client.get("/api/v1/tenants/2/users/20/lessons/100", headers={"If-None-Match": "*"})
+        assert response.status_code == 404
+
+    def test_content_etag_shared_by_users(self, client, no_progress):
+        """Should serve the user-independent part with a public, content-versioned ETag."""
+        response = client.get(self.CONTENT_URL)
+        assert response.status_code == 200
+        assert response.headers["cache-control"].startswith("public")
+
+        data = response.json()
+        lesson = client.get("/api/v1/tenants/1/users/10/lessons/100").json()
+        assert data["lesson"] == lesson["lesson"]
+        assert data["blocks"] == [
+            {k: v for k, v in block.items() if k != "user_progress"} for block in lesson["blocks"]
+        ]
+
+        etag = response.headers["etag"]
+        client.put(f"{self.LESSON_URL}/progress", json={"block_id": 200, "status": "seen"})
+        assert client.get(self.CONTENT_URL, headers={"If-None-Match": etag}).status_code == 304
+
+        execute_sql(
+            client,
+            "UPDATE block_variants SET data = data || '{\"edited\": true}' WHERE id = 1100",
+        )
+        try:
+            response = client.get(self.CONTENT_URL, headers={"If-None-Match": etag})
+            assert response.status_code == 200
+            assert response.headers["etag"] != etag
+        finally:
+            execute_sql(client, "UPDATE block_variants SET data = data - 'edited' WHERE id = 1100")
+
+    def test_content_not_found_for_other_tenant(self, client):
+        """Should 404 for a lesson of another tenant."""
+        assert client.get("/api/v1/tenants/2/lessons/100/content").status_code == 404
+
+
+class TestSparseFieldsets:
+    """Tests for `fields` on the lesson GET and the lesson variants endpoint"""
+
+    LESSON_URL = "/api/v1/tenants/1/users/10/lessons/100"
+    VARIANTS_URL = "/api/v1/tenants/1/lessons/100/variants"
+
+    def test_fields_narrow_the_blocks(self, client):
+        """Should return only the id and the requested block fields, same values as the full lesson."""
+        full = client.get(self.LESSON_URL).json()
+        response = client.get(self.LESSON_URL, params={"fields": "position, user_progress"})
+        assert response.status_code == 200
+        assert response.headers["etag"] == client.get(self.LESSON_URL).headers["etag"]
+
+        data = response.json()
+        assert data["lesson"] == full["lesson"]
+        assert data["progress_summary"] == full["progress_summary"]
+        assert data["blocks"] == [
+            {"id": b["id"], "position": b["position"], "user_progress": b["user_progress"]}
+            for b in full["blocks"]
+        ]
+
+    def test_variant_payloads_only_when_asked(self, client):
+        """Should leave variant data out, and not load it, unless variant.data is asked for."""
+        full = client.get(self.LESSON_URL).json()
+        svc.lessons.skeleton_cache.clear()
+        svc.lessons.outline_cache.clear()
+
+        blocks = client.get(self.LESSON_URL, params={"fields": "type,variant"}).json()["blocks"]
+        assert blocks == [
+            {"id": b["id"], "type": b["type"],
+             "variant": {"id": b["variant"]["id"], "tenant_id": b["variant"]["tenant_id"]}}
+            for b in full["blocks"]
+        ]
+        assert len(svc.lessons.skeleton_cache) == 0 and len(svc.lessons.outline_cache) == 1
+
+        blocks = client.get(self.LESSON_URL, params={"fields": "variant.data"}).json()["blocks"]
+        assert blocks == [{"id": b["id"], "variant": b["variant"]} for b in full["blocks"]]
+
+    def test_unknown_field(self, client):
+        """Should reject fields that are not block fields."""
+        response = client.get(self.LESSON_URL, params={"fields": "type,secret"})
+        assert response.status_code == 422
+        assert "secret" in response.json()["detail"]
+
+    def test_variants_by_block_ids(self, client):
+        """Should return the requested blocks' variants in position order, skipping other blocks."""
+        full = client.get(self.LESSON_URL).json()
+        response = client.get(self.VARIANTS_URL, params={"block_ids": [202, 200, 999]})
+        assert response.status_code == 200
+        assert response.json() == {
+            "blocks": [{"id": b["id"], "variant": b["variant"]} for b in full["blocks"] if b["id"] != 201]
+        }
+
+        etag = response.headers["etag"]
+        assert etag == client.get("/api/v1/tenants/1/lessons/100/content").headers["etag"]
+        route = "/api/v1/tenants/{tenant_id}/lessons/{lesson_id}/variants"
+        queries = svc.instrumentation.REQUEST_QUERIES
+        before = queries.sum(route=route)
+        response = client.get(self.VARIANTS_URL, params={"block_ids": [200]}, headers={"If-None-Match": etag})
+        assert response.status_code == 304
+        # answered from the lesson header, without reading the payloads
+        assert queries.sum(route=route) == before + 1
+
+        assert client.get(self.VARIANTS_URL, params={"block_ids": [999]}).json() == {"blocks": []}
+
+    def test_variants_tenant_isolation(self, client):
+        """Should 404 for another tenant's lesson and resolve the tenant's own overrides."""
+        assert client.get("/api/v1/tenants/2/lessons/100/variants", params={"block_ids": [200]}).status_code == 404
+        assert client.get(self.VARIANTS_URL).status_code == 422
+
+        ours = client.get(self.VARIANTS_URL, params={"block_ids": [200]}).json()["blocks"][0]["variant"]
+        theirs = client.get("/api/v1/tenants/2/lessons/200/variants", params={"block_ids": [200]}).json()
+        assert ours["tenant_id"] == 1
+        assert theirs["blocks"][0]["variant"]["tenant_id"] is None
+
+
+class TestLessonBundle:
+    """Tests for POST /tenants/{tenant_id}/users/{user_id}/lessons/bundle"""
+
+    BUNDLE_URL = "/api/v1/tenants/1/users/10/lessons/bundle"
+
+    def test_bundle_matches_get_lesson(self, client):
+        """Should assemble each lesson as GET does, with variants listed once by id."""
+        full = client.get("/api/v1/tenants/1/users/10/lessons/100").json()
+        response = client.post(self.BUNDLE_URL, json={"lesson_ids": [999, 100, 100]})
+        assert response.status_code == 200
+
+        data = response.json()
+        assert data["missing"] == [999]
+        [lesson] = data["lessons"]
+        variants = {v["id"]: v for v in data["variants"]}
+        assert lesson["lesson"] == full["lesson"]
+        assert lesson["progress_summary"] == full["progress_summary"]
+        assert [
+            {**{k: v for k, v in b.items() if k != "variant_id"}, "variant": variants[b["variant_id"]]}
+            for b in lesson["blocks"]
+        ] == full["blocks"]
+
+    def test_shared_variants_sent_once(self, client):
+        """Should send a variant used by several lessons of the bundle once."""
+        execute_sql(client, "INSERT INTO lessons (id, tenant_id, slug, title) VALUES (9100, 1, 'recap', 'Recap')")
+        try:
+            execute_sql(client, "INSERT INTO lesson_blocks (lesson_id, block_id, position) VALUES (9100, 202, 1), (9100, 200, 2)")
+            data = client.post(self.BUNDLE_URL, json={"lesson_ids": [9100, 100]}).json()
+        finally:
+            execute_sql(client, "DELETE FROM lessons WHERE id = 9100")
+
+        assert [lesson["lesson"]["id"] for lesson in data["lessons"]] == [9100, 100]
+        assert [b["id"] for b in data["lessons"][0]["blocks"]] == [202, 200]
+        assert sorted(v["id"] for v in data["variants"]) == [1001, 1002, 1100]
+        assert all(v["data"] is not None for v in data["variants"])
+
+    def test_bundle_tenant_isolation(self, client):
+        """Should list another tenant's lessons as missing and 404 for another tenant's user."""
+        data = client.post(self.BUNDLE_URL, json={"lesson_ids": [200]}).json()
+        assert data == {"lessons": [], "variants": [], "missing": [200]}
+
+        response = client.post("/api/v1/tenants/1/users/20/lessons/bundle", json={"lesson_ids": [100]})
+        assert response.status_code == 404
+        assert client.post(self.BUNDLE_URL, json={"lesson_ids": []}).status_code == 422
+
+    @pytest.mark.parametrize("encoding", ["gzip", "zstd"])
+    def test_bundle_compressed(self, client, monkeypatch, encoding):
+        """Should compress with the encoding the client accepts."""
+        if encoding not in ENCODERS:
+            pytest.skip(f"{encoding} not available")
+        monkeypatch.setattr(lessons_api.conf, "LESSON_BUNDLE_COMPRESS_MIN_BYTES", 0)
+        plain = client.post(self.BUNDLE_URL, json={"lesson_ids": [100]}, headers={"Accept-Encoding": "identity"})
+        assert "content-encoding" not in plain.headers
+
+        response = client.post(
+            self.BUNDLE_URL, json={"lesson_ids": [100]}, headers={"Accept-Encoding": f"{encoding};q=1, br;q=0.5"},
+        )
+        assert response.headers["content-encoding"] == encoding
+        assert response.headers["vary"] == "Accept-Encoding"
+        assert response.json() == plain.json()
+
+    def test_negotiate_encoding(self):
+        """Should pick the highest q-value, ties to the server's preference."""
+        preferred = next(iter(ENCODERS))
+        assert negotiate_encoding(None) is None
+        assert negotiate_encoding("br") is None
+        assert negotiate_encoding("gzip;q=0.8, deflate") == "gzip"
+        assert negotiate_encoding("gzip;q=0") is None
+        assert negotiate_encoding("*") == preferred
+        assert negotiate_encoding("gzip, *;q=0.1") == "gzip"
+
+
+class TestResolvedBlockVariant:
+    """Tests for the resolved_block_variant table kept by the block_variants trigger"""
+
+    def variant_ids(self, client, tenant_id: int, user_id: int, lesson_id: int) -> dict:
+        lesson = client.get(f"/api/v1/tenants/{tenant_id}/users/{user_id}/lessons/{lesson_id}").json()
+        return {b["id"]: b["variant"]["id"] for b in lesson["blocks"]}
+
+    def assert_consistent(self, client):
+        assert execute_sql(client, """
+            (SELECT * FROM resolved_block_variant EXCEPT SELECT * FROM resolved_block_variant_expected)
+            UNION ALL
+            (SELECT * FROM resolved_block_variant_expected EXCEPT SELECT * FROM resolved_block_variant)
+        """) == []
+
+    def test_override_insert_update_delete(self, client):
+        """Should follow a tenant override through insert, retarget and delete."""
+        self.assert_consistent(client)
+        execute_sql(
+            client,
+            "INSERT INTO block_variants (id, block_id, tenant_id, data) VALUES (9101, 201, 1, '{}')",
+        )
+        try:
+            assert self.variant_ids(client, 1, 10, 100)[201] == 9101
+            assert self.variant_ids(client, 2, 20, 200)[201] == 1001
+            self.assert_consistent(client)
+
+            execute_sql(client, "UPDATE block_variants SET tenant_id = 2 WHERE id = 9101")
+            assert self.variant_ids(client, 1, 10, 100)[201] == 1001
+            assert self.variant_ids(client, 2, 20, 200)[201] == 9101
+            self.assert_consistent(client)
+        finally:
+            execute_sql(client, "DELETE FROM block_variants WHERE id = 9101")
+
+        assert self.variant_ids(client, 2, 20, 200)[201] == 1001
+        self.assert_consistent(client)
+
+    def test_tenants_without_overrides_share_default_rows(self, client):
+        """Should store defaults once, under tenant 0, and only overrides per tenant."""
+        rows = execute_sql(
+            client, "SELECT tenant_id, block_id, variant_id FROM resolved_block_variant ORDER BY 1, 2"
+        )
+        assert [tuple(r) for r in rows] == [
+            (0, 200, 1000), (0, 201, 1001), (0, 202, 1002), (1, 200, 1100), (2, 202, 1200),
+        ]
+
+
+class TestListLessons:
+    """Tests for GET /tenants/{tenant_id}/users/{user_id}/lessons"""
+
+    def test_list_lessons_success(self, client):
+        """Should list the tenant's lessons with the user's progress summary."""
+        response = client.get("/api/v1/tenants/1/users/10/lessons")
+        assert response.status_code == 200
+
+        data = response.json()
+        assert [item["lesson"]["id"] for item in data["items"]] == [100]
+        assert data["items"][0]["lesson"]["slug"] == "ai-basics"
+        assert data["next_after_id"] is None
+
+        lesson = client.get("/api/v1/tenants/1/users/10/lessons/100").json()
+        assert data["items"][0]["progress_summary"] == lesson["progress_summary"]
+
+    def test_list_lessons_keyset_pagination(self, client):
+        """Should page with after_id and stop when there are no more lessons."""
+        execute_sql(client, "INSERT INTO lessons (id, tenant_id, slug, title) VALUES (9100, 1, 'extra', 'Extra')")
+        try:
+            first = client.get("/api/v1/tenants/1/users/10/lessons?limit=1").json()
+            assert [item["lesson"]["id"] for item in first["items"]] == [100]
+            assert first["next_after_id"] == 100
+
+            second = client.get(
+                f"/api/v1/tenants/1/users/10/lessons?limit=1&after_id={first['next_after_id']}"
+            ).json()
+            assert [item["lesson"]["id"] for item in second["items"]] == [9100]
+            assert second["items"][0]["progress_summary"]["total_blocks"] == 0
+            assert second["next_after_id"] is None
+        finally:
+            execute_sql(client, "DELETE FROM lessons WHERE id = 9100")
+
+    def test_list_lessons_empty_page(self, client):
+        """Should return an empty page past the last lesson."""
+        response = client.get("/api/v1/tenants/1/users/10/lessons?after_id=100000")
+        assert response.status_code == 200
+        assert response.json() == {"items": [], "next_after_id": None}
+
+    def test_list_lessons_cross_tenant_user_not_allowed(self, client):
+        """Should return 404 when user doesn't belong to tenant."""
+        response = client.get("/api/v1/tenants/1/users/20/lessons")
+        assert response.status_code == 404
+
 
 class TestUpsertProgress:
     """Tests for PUT /tenants/{tenant_id}/users/{user_id}/lessons/{lesson_id}/progress"""
 
-    def test_upsert_progress_seen_success(self):
+    def test_upsert_progress_seen_success(self, client, no_progress):
         """Should successfully mark a block as seen."""
         response = client.put(
             "/api/v1/tenants/1/users/11/lessons/100/progress",
@@ -149,7 +499,7 @@ class TestUpsertProgress:
         assert "progress_summary" in data
         assert data["progress_summary"]["seen_blocks"] >= 1
 
-    def test_upsert_progress_completed_success(self):
+    def test_upsert_progress_completed_success(self, client, no_progress):
         """Should successfully mark a block as completed."""
         response = client.put(
             "/api/v1/tenants/1/users/11/lessons/100/progress",
@@ -161,7 +511,7 @@ class TestUpsertProgress:
         assert data["stored_status"] == "completed"
         assert data["progress_summary"]["completed_blocks"] >= 1
 
-    def test_upsert_progress_idempotent(self):
+    def test_upsert_progress_idempotent(self, client, no_progress):
         """Should be idempotent - same request returns same result."""
         payload = {"block_id": 202, "status": "seen"}
 
@@ -178,7 +528,7 @@ class TestUpsertProgress:
         assert response2.status_code == 200
         assert response1.json()["stored_status"] == response2.json()["stored_status"]
 
-    def test_upsert_progress_monotonic_no_downgrade(self):
+    def test_upsert_progress_monotonic_no_downgrade(self, client, no_progress):
         """Should not downgrade completed to seen (monotonic constraint)."""
         # First mark as completed
         response1 = client.put(
@@ -196,7 +546,7 @@ class TestUpsertProgress:
         assert response2.status_code == 200
         assert response2.json()["stored_status"] == "completed"
 
-    def test_upsert_progress_upgrade_seen_to_completed(self):
+    def test_upsert_progress_upgrade_seen_to_completed(self, client):
         """Should allow upgrading from seen to completed."""
         # First mark as seen
         client.put(
@@ -212,7 +562,7 @@ class TestUpsertProgress:
         assert response.status_code == 200
         assert response.json()["stored_status"] == "completed"
 
-    def test_upsert_progress_block_not_in_lesson(self):
+    def test_upsert_progress_block_not_in_lesson(self, client):
         """Should return 400 when block_id is not part of the lesson."""
         # Block 999 doesn't exist
         response = client.put(
@@ -221,7 +571,7 @@ class TestUpsertProgress:
         )
         assert response.status_code == 400
 
-    def test_upsert_progress_invalid_tenant(self):
+    def test_upsert_progress_invalid_tenant(self, client):
         """Should return 404 for non-existent tenant."""
         response = client.put(
             "/api/v1/tenants/999/users/10/lessons/100/progress",
@@ -229,7 +579,7 @@ class TestUpsertProgress:
         )
         assert response.status_code == 404
 
-    def test_upsert_progress_invalid_user(self):
+    def test_upsert_progress_invalid_user(self, client):
         """Should return 404 for non-existent user."""
         response = client.put(
             "/api/v1/tenants/1/users/999/lessons/100/progress",
@@ -237,7 +587,7 @@ class TestUpsertProgress:
         )
         assert response.status_code == 404
 
-    def test_upsert_progress_invalid_lesson(self):
+    def test_upsert_progress_invalid_lesson(self, client):
         """Should return 404 for non-existent lesson."""
         response = client.put(
             "/api/v1/tenants/1/users/10/lessons/999/progress",
@@ -245,7 +595,7 @@ class TestUpsertProgress:
         )
         assert response.status_code == 404
 
-    def test_upsert_progress_cross_tenant_not_allowed(self):
+    def test_upsert_progress_cross_tenant_not_allowed(self, client):
         """Should return 404 when user doesn't belong to tenant."""
         # User 20 belongs to tenant 2, not tenant 1
         response = client.put(
@@ -254,7 +604,7 @@ class TestUpsertProgress:
         )
         assert response.status_code == 404
 
-    def test_upsert_progress_invalid_status(self):
+    def test_upsert_progress_invalid_status(self, client):
         """Should return 422 for invalid status value."""
         response = client.put(
             "/api/v1/tenants/1/users/10/lessons/100/progress",
@@ -262,7 +612,7 @@ class TestUpsertProgress:
         )
         assert response.status_code == 422
 
-    def test_upsert_progress_missing_block_id(self):
+    def test_upsert_progress_missing_block_id(self, client):
         """Should return 422 for missing block_id."""
         response = client.put(
             "/api/v1/tenants/1/users/10/lessons/100/progress",
@@ -270,7 +620,7 @@ class TestUpsertProgress:
         )
         assert response.status_code == 422
 
-    def test_upsert_progress_missing_status(self):
+    def test_upsert_progress_missing_status(self, client):
         """Should return 422 for missing status."""
         response = client.put(
             "/api/v1/tenants/1/users/10/lessons/100/progress",
@@ -278,7 +628,7 @@ class TestUpsertProgress:
         )
         assert response.status_code == 422
 
-    def test_upsert_progress_returns_updated_summary(self):
+    def test_upsert_progress_returns_updated_summary(self, client, no_progress):
         """Should return updated progress summary after upsert."""
         # Mark all blocks as completed for user 11
         for block_id in [200, 201, 202]:
@@ -299,3 +649,321 @@ class TestUpsertProgress:
         assert summary["completed_blocks"] == 3
         assert summary["seen_blocks"] == 3
         assert summary["completed"] is True
+
+
+class TestUpsertProgressBatch:
+    """Tests for PUT /tenants/{tenant_id}/users/{user_id}/lessons/{lesson_id}/progress/batch"""
+
+    def test_upsert_progress_batch_success(self, client):
+        """Should store every block and return per-block statuses with one summary."""
+        response = client.put(
+            "/api/v1/tenants/2/users/20/lessons/200/progress/batch",
+            json={"items": [
+                {"block_id": 200, "status": "completed"},
+                {"block_id": 202, "status": "seen"},
+            ]}
+        )
+        assert response.status_code == 200
+
+        data = response.json()
+        assert [r["block_id"] for r in data["results"]] == [200, 202]
+        assert data["results"][0]["stored_status"] == "completed"
+        assert data["progress_summary"]["total_blocks"] == 3
+        assert data["progress_summary"]["seen_blocks"] >= 2
+
+    def test_upsert_progress_batch_monotonic_and_duplicates(self, client, no_progress):
+        """Should keep completed over seen, within the batch and against stored rows."""
+        client.put(
+            "/api/v1/tenants/1/users/11/lessons/100/progress",
+            json={"block_id": 200, "status": "completed"}
+        )
+        response = client.put(
+            "/api/v1/tenants/1/users/11/lessons/100/progress/batch",
+            json={"items": [
+                {"block_id": 200, "status": "seen"},
+                {"block_id": 201, "status": "completed"},
+                {"block_id": 201, "status": "seen"},
+            ]}
+        )
+        assert response.status_code == 200
+        assert response.json()["results"] == [
+            {"block_id": 200, "stored_status": "completed"},
+            {"block_id": 201, "stored_status": "completed"},
+        ]
+
+    def test_upsert_progress_batch_block_not_in_lesson(self, client):
+        """Should return 400 and write nothing when any block is not part of the lesson."""
+        response = client.put(
+            "/api/v1/tenants/1/users/10/lessons/100/progress/batch",
+            json={"items": [
+                {"block_id": 202, "status": "completed"},
+                {"block_id": 999, "status": "seen"},
+            ]}
+        )
+        assert response.status_code == 400
+
+        lesson = client.get("/api/v1/tenants/1/users/10/lessons/100").json()
+        assert lesson["blocks"][2]["user_progress"] is None
+
+    def test_upsert_progress_batch_cross_tenant_not_allowed(self, client):
+        """Should return 404 when user doesn't belong to tenant."""
+        response = client.put(
+            "/api/v1/tenants/1/users/20/lessons/100/progress/batch",
+            json={"items": [{"block_id": 200, "status": "seen"}]}
+        )
+        assert response.status_code == 404
+
+    def test_upsert_progress_batch_empty(self, client):
+        """Should return 422 for an empty batch."""
+        response = client.put(
+            "/api/v1/tenants/1/users/10/lessons/100/progress/batch",
+            json={"items": []}
+        )
+        assert response.status_code == 422
+
+
+class TestProgressWriteBehind:
+    """Tests for PUT .../progress with PROGRESS_WRITE_BEHIND enabled"""
+
+    @pytest.fixture
+    def progress_buffer(self, client, monkeypatch):
+        monkeypatch.setattr(svc.lessons.conf, "PROGRESS_WRITE_BEHIND", True)
+        buffer = svc.progress_buffer.buffer
+        client.portal.call(buffer.start, svc.postgres.get_engine())
+        yield buffer
+        client.portal.call(buffer.stop)
+
+    def test_buffered_upsert_overlays_summary(self, client, progress_buffer):
+        """Should answer with buffered state before and after the flush."""
+        for status in ("completed", "seen"):
+            response = client.put(
+                "/api/v1/tenants/2/users/20/lessons/200/progress",
+                json={"block_id": 201, "status": status}
+            )
+            assert response.status_code == 200
+            assert response.json()["stored_status"] == "completed"
+            assert response.json()["progress_summary"]["completed_blocks"] >= 1
+
+        lesson = client.get("/api/v1/tenants/2/users/20/lessons/200").json()
+        assert lesson["blocks"][2]["user_progress"] == "completed"
+
+        client.portal.call(progress_buffer.flush)
+        assert progress_buffer.depth == 0
+
+        lesson = client.get("/api/v1/tenants/2/users/20/lessons/200").json()
+        assert lesson["blocks"][2]["user_progress"] == "completed"
+
+    def test_no_etag_while_progress_is_buffered(self, client, progress_buffer):
+        """Should not tag or 304 a response that overlays unwritten progress."""
+        url = "/api/v1/tenants/2/users/20/lessons/200"
+        etag = client.get(url).headers["etag"]
+        client.put(f"{url}/progress", json={"block_id": 202, "status": "seen"})
+
+        response = client.get(url, headers={"If-None-Match": etag})
+        assert response.status_code == 200
+        assert "etag" not in response.headers
+
+        client.portal.call(progress_buffer.flush)
+        assert "etag" in client.get(url).headers
+
+    def test_buffered_upsert_validation(self, client, progress_buffer):
+        """Should keep the 404/400 outcomes and buffer nothing for them."""
+        response = client.put(
+            "/api/v1/tenants/1/users/20/lessons/100/progress",
+            json={"block_id": 200, "status": "seen"}
+        )
+        assert response.status_code == 404
+
+        response = client.put(
+            "/api/v1/tenants/1/users/10/lessons/100/progress",
+            json={"block_id": 999, "status": "seen"}
+        )
+        assert response.status_code == 400
+        assert progress_buffer.depth == 0
+
+
+    def test_buffered_batch_upsert(self, client, progress_buffer):
+        """Should queue a batch in the buffer and answer with the buffered state."""
+        url = "/api/v1/tenants/2/users/20/lessons/200"
+        response = client.put(
+            f"{url}/progress/batch",
+            json={"items": [{"block_id": 201, "status": "completed"}, {"block_id": 202, "status": "seen"}]}
+        )
+        assert response.status_code == 200
+        results = response.json()["results"]
+        assert results[0] == {"block_id": 201, "stored_status": "completed"}
+        assert results[1]["stored_status"] in ("seen", "completed")
+        assert progress_buffer.depth == 2
+
+        client.portal.call(progress_buffer.flush)
+        assert progress_buffer.depth == 0
+        assert client.get(url).json()["blocks"][2]["user_progress"] == "completed"
+
+    def test_buffered_batch_validation(self, client, progress_buffer):
+        """Should reject a batch with unknown blocks and buffer none of it."""
+        response = client.put(
+            "/api/v1/tenants/2/users/20/lessons/200/progress/batch",
+            json={"items": [{"block_id": 201, "status": "seen"}, {"block_id": 999, "status": "seen"}]}
+        )
+        assert response.status_code == 400
+        assert progress_buffer.depth == 0
+
+    def test_flush_skips_rows_that_no_longer_exist(self, client, progress_buffer):
+        """Should write the valid rows of a flush and drop only the stale ones."""
+        dropped = progress_buffer.dropped_rows
+        # as if block 999 had been deleted after the update was acknowledged
+        progress_buffer.add(20, 200, 999, "seen")
+        progress_buffer.add(20, 200, 201, "completed")
+
+        client.portal.call(progress_buffer.flush)
+        assert progress_buffer.depth == 0
+        assert progress_buffer.dropped_rows - dropped == 1
+        lesson = client.get("/api/v1/tenants/2/users/20/lessons/200").json()
+        assert lesson["blocks"][2]["user_progress"] == "completed"
+
+    def test_failing_batch_written_row_by_row(self, client, progress_buffer, monkeypatch):
+        """Should fall back to one write per row once the batch has failed max_retries times."""
+        write = progress_buffer._write
+
+        async def write_one(rows):
+            if len(rows) > 1:
+                raise RuntimeError("batch failed")
+            return await write(rows)
+
+        monkeypatch.setattr(progress_buffer, "_write", write_one)
+        monkeypatch.setattr(progress_buffer, "max_retries", 1)
+        dropped = progress_buffer.dropped_rows
+        progress_buffer.add(20, 200, 201, "completed")
+        progress_buffer.add(20, 200, 202, "seen")
+
+        client.portal.call(progress_buffer.flush)
+        assert progress_buffer.depth == 2
+
+        client.portal.call(progress_buffer.flush)
+        assert progress_buffer.depth == 0
+        assert progress_buffer.dropped_rows == dropped
+        lesson = client.get("/api/v1/tenants/2/users/20/lessons/200").json()
+        assert lesson["blocks"][1]["user_progress"] in ("seen", "completed")
+        assert lesson["blocks"][2]["user_progress"] == "completed"
+
+    def test_stop_retries_before_giving_up(self, client, progress_buffer, monkeypatch):
+        """Should retry the final flush with backoff instead of dropping the rows."""
+        write = progress_buffer._write
+        failures = []
+
+        async def flaky(rows):
+            if len(failures) < 2:
+                failures.append(1)
+                raise RuntimeError("database unavailable")
+            return await write(rows)
+
+        monkeypatch.setattr(progress_buffer, "_write", flaky)
+        monkeypatch.setattr(progress_buffer, "retry_delay", 0.01)
+        dropped, flushes = progress_buffer.dropped_rows, progress_buffer.flushes
+        progress_buffer.add(20, 200, 202, "seen")
+
+        client.portal.call(progress_buffer.stop)
+        assert len(failures) == 2
+        assert progress_buffer.flushes - flushes == 1
+        assert progress_buffer.dropped_rows == dropped
+        assert progress_buffer.depth == 0
+
+
+class TestProgressRollup:
+    """Tests for the user_lesson_progress rollup"""
+
+    def test_rollup_consistent_after_upserts(self, client):
+        """Should match the from-scratch rollup after single and batch upserts."""
+        client.put(
+            "/api/v1/tenants/2/users/20/lessons/200/progress",
+            json={"block_id": 202, "status": "seen"}
+        )
+        client.put(
+            "/api/v1/tenants/2/users/20/lessons/200/progress/batch",
+            json={"items": [
+                {"block_id": 202, "status": "completed"},
+                {"block_id": 201, "status": "seen"},
+            ]}
+        )
+
+        mismatches = client.portal.call(
+            svc.progress_rollup.check, svc.postgres.get_engine()
+        )
+        assert mismatches == []
+
+    def test_summary_matches_between_put_and_get(self, client, no_progress):
+        """Should report the same summary from the PUT statement and the GET rollup read."""
+        put = client.put(
+            "/api/v1/tenants/1/users/11/lessons/100/progress",
+            json={"block_id": 201, "status": "seen"}
+        ).json()
+        get = client.get("/api/v1/tenants/1/users/11/lessons/100").json()
+
+        assert put["progress_summary"] == get["progress_summary"]
+
+
+class TestLessonBlocksPage:
+    """Tests for GET /tenants/{tenant_id}/users/{user_id}/lessons/{lesson_id}/blocks"""
+
+    def test_blocks_page_keyset(self, client):
+        """Should page blocks by position and match the full lesson."""
+        full = client.get("/api/v1/tenants/1/users/10/lessons/100").json()
+
+        first = client.get("/api/v1/tenants/1/users/10/lessons/100/blocks?limit=2").json()
+        assert [b["position"] for b in first["blocks"]] == [1, 2]
+        assert first["next_after_position"] == 2
+
+        second = client.get(
+            "/api/v1/tenants/1/users/10/lessons/100/blocks?limit=2&after_position=2"
+        ).json()
+        assert [b["position"] for b in second["blocks"]] == [3]
+        assert second["next_after_position"] is None
+
+        assert first["blocks"] + second["blocks"] == full["blocks"]
+        assert first["lesson"] == full["lesson"]
+        assert first["progress_summary"] == full["progress_summary"]
+
+    def test_blocks_page_block_without_variant(self, client):
+        """Should give a block without any variant a null variant, as GET and the stream do."""
+        execute_sql(client, "INSERT INTO blocks (id, block_type) VALUES (9200, 'markdown')")
+        execute_sql(client, "INSERT INTO lessons (id, tenant_id, slug, title) VALUES (9100, 1, 'draft', 'Draft')")
+        try:
+            execute_sql(client, "INSERT INTO lesson_blocks (lesson_id, block_id, position) VALUES (9100, 9200, 1)")
+            url = "/api/v1/tenants/1/users/10/lessons/9100"
+            full = client.get(url).json()
+            page = client.get(f"{url}/blocks").json()
+            stream = [json.loads(line) for line in client.get(f"{url}/stream").text.splitlines()]
+        finally:
+            execute_sql(client, "DELETE FROM lessons WHERE id = 9100")
+            execute_sql(client, "DELETE FROM blocks WHERE id = 9200")
+
+        assert full["blocks"][0]["variant"] is None
+        assert page["blocks"] == full["blocks"]
+        assert stream[1] == {"block": full["blocks"][0]}
+
+    def test_blocks_page_cross_tenant_not_allowed(self, client):
+        """Should return 404 when lesson doesn't belong to tenant."""
+        response = client.get("/api/v1/tenants/1/users/10/lessons/200/blocks")
+        assert response.status_code == 404
+
+
+class TestStreamLesson:
+    """Tests for GET /tenants/{tenant_id}/users/{user_id}/lessons/{lesson_id}/stream"""
+
+    def test_stream_lesson_ndjson(self, client):
+        """Should stream lesson, blocks in order and a final summary."""
+        full = client.get("/api/v1/tenants/1/users/10/lessons/100").json()
+
+        response = client.get("/api/v1/tenants/1/users/10/lessons/100/stream")
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("application/x-ndjson")
+
+        records = [json.loads(line) for line in response.text.splitlines()]
+        assert records[0] == {"lesson": full["lesson"]}
+        assert [r["block"] for r in records[1:-1]] == full["blocks"]
+        assert records[-1] == {"progress_summary": full["progress_summary"]}
+
+    def test_stream_lesson_not_found(self, client):
+        """Should return 404 before streaming for a cross-tenant user."""
+        response = client.get("/api/v1/tenants/1/users/20/lessons/100/stream")
+        assert response.status_code == 404
@@ -0,0 +1,169 @@
+"""
+Tests for the progress event stream (LISTEN/NOTIFY fan-out and SSE).
+
+The database tests require a running PostgreSQL database with seed data.
+"""
+import asyncio
+import json
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import text
+from src import services as svc
+from src import main
+from src.main import app
+from src.services.listener import OVERFLOW, ProgressListener
+from tests.conftest import execute_sql
+
+LESSON_URL = "/api/v1/tenants/1/users/11/lessons/100"
+
+
+@pytest.fixture(scope="module")
+def client():
+    """Test client with PROGRESS_EVENTS on, in place of the shared one (its lifespan also LISTENs)."""
+    with pytest.MonkeyPatch.context() as patch:
+        patch.setattr(main.conf, "PROGRESS_EVENTS", True)
+        patch.setattr(svc.postgres.conf, "PROGRESS_EVENTS", True)
+        with TestClient(app) as client:
+            yield client
+
+
+def notify(listener: ProgressListener, user_id: int, lesson_id: int, block_id: int) -> None:
+    listener._on_notify(None, 0, "lesson_progress", json.dumps({
+        "user_id": user_id,
+        "lesson_id": lesson_id,
+        "block_id": block_id,
+        "user_progress": "seen",
+        "progress_summary": {"seen_blocks": 1},
+    }))
+
+
+def parse_sse(chunk: bytes) -> tuple[str, dict]:
+    fields = dict(
+        line.split(": ", 1) for line in chunk.decode().strip().split("\n") if ": " in line
+    )
+    return fields["event"], json.loads(fields["data"])
+
+
+class TestProgressListener:
+    """Tests for ProgressListener fan-out, on the app's listen connection"""
+
+    def test_event_on_commit(self, client):
+        """Should push the block change and updated summary after a PUT commits."""
+        listener = svc.listener.listener
+        assert listener.listening
+
+        execute_sql(client, "DELETE FROM user_block_progress WHERE user_id = 11 AND lesson_id = 100 AND block_id = 202")
+        subscription = listener.subscribe(11, 100)
+        try:
+            response = client.put(f"{LESSON_URL}/progress", json={"block_id": 202, "status": "completed"})
+            assert response.status_code == 200
+
+            async def next_event():
+                return await asyncio.wait_for(subscription.queue.get(), 5)
+
+            event = client.portal.call(next_event)
+            assert event["block_id"] == 202
+            assert event["user_progress"] == "completed"
+            assert event["progress_summary"] == response.json()["progress_summary"]
+        finally:
+            listener.unsubscribe(subscription)
+        assert listener.stats()["subscribers"] == 0
+
+    def test_no_event_without_session_opt_in(self, client):
+        """Should publish nothing for writes of sessions without pair.progress_events."""
+        listener = svc.listener.listener
+
+        async def write_without_events():
+            async with svc.postgres.get_engine().begin() as conn:
+                await conn.execute(text("SET LOCAL pair.progress_events = 'off'"))
+                await conn.execute(text(
+                    "DELETE FROM user_block_progress WHERE user_id = 11 AND lesson_id = 100 AND block_id IN (200, 201)"
+                ))
+                await conn.execute(text(
+                    "INSERT INTO user_block_progress (user_id, lesson_id, block_id, status) VALUES (11, 100, 200, 'seen')"
+                ))
+
+        subscription = listener.subscribe(11, 100)
+        try:
+            client.portal.call(write_without_events)
+            response = client.put(f"{LESSON_URL}/progress", json={"block_id": 201, "status": "seen"})
+            assert response.status_code == 200
+
+            async def next_event():
+                return await asyncio.wait_for(subscription.queue.get(), 5)
+
+            # the first event is the PUT's
+            assert client.portal.call(next_event)["block_id"] == 201
+            assert subscription.queue.empty()
+        finally:
+            listener.unsubscribe(subscription)
+
+    def test_other_users_not_delivered(self, client):
+        """Should only deliver events for the subscribed (user, lesson)."""
+        listener = svc.listener.listener
+        subscription = listener.subscribe(10, 100)
+        try:
+            notify(listener, 11, 100, 200)
+            assert subscription.queue.empty()
+        finally:
+            listener.unsubscribe(subscription)
+
+    def test_slow_consumer_dropped(self, client):
+        """Should drop a subscriber whose queue is full and keep only an overflow marker."""
+        listener = ProgressListener(queue_size=2, max_subscribers=10, heartbeat=15.0)
+        listener._conn = svc.listener.listener._conn
+        subscription = listener.subscribe(11, 100)
+
+        for block_id in (200, 201, 202):
+            notify(listener, 11, 100, block_id)
+
+        assert subscription.dropped
+        assert subscription.queue.qsize() == 1
+        assert subscription.queue.get_nowait() == OVERFLOW
+        assert listener.stats()["subscribers"] == 0
+
+    def test_subscriber_limit(self, client):
+        """Should refuse subscribers past max_subscribers."""
+        listener = ProgressListener(queue_size=2, max_subscribers=1, heartbeat=15.0)
+        listener._conn = svc.listener.listener._conn
+        assert listener.subscribe(11, 100) is not None
+        assert listener.subscribe(11, 100) is None
+
+    def test_sse_stream(self, client):
+        """Should emit the snapshot, progress events, and end on overflow."""
+        async def read():
+            listener = ProgressListener(queue_size=1, max_subscribers=10, heartbeat=15.0)
+            listener._conn = svc.listener.listener._conn
+            subscription = listener.subscribe(11, 100)
+            stream = listener.sse(subscription, {"progress_summary": {"seen_blocks": 0}})
+            chunks = [await anext(stream)]
+            notify(listener, 11, 100, 200)
+            chunks.append(await anext(stream))
+            notify(listener, 11, 100, 201)
+            notify(listener, 11, 100, 202)
+            chunks.append(await anext(stream))
+            return chunks, [chunk async for chunk in stream]
+
+        chunks, rest = client.portal.call(read)
+        events = [parse_sse(chunk) for chunk in chunks]
+        assert events[0] == ("snapshot", {"progress_summary": {"seen_blocks": 0}})
+        assert events[1][0] == "progress" and events[1][1]["block_id"] == 200
+        assert events[2] == ("overflow", {})
+        assert rest == []
+
+
+class TestProgressEventsEndpoint:
+    """Tests for GET .../lessons/{lesson_id}/events"""
+
+    def test_not_found(self, client):
+        """Should 404 for a lesson of another tenant, leaving no subscriber behind."""
+        response = client.get("/api/v1/tenants/2/users/20/lessons/100/events")
+        assert response.status_code == 404
+        assert svc.listener.listener.stats()["subscribers"] == 0
+
+    def test_unavailable_when_full(self, client, monkeypatch):
+        """Should answer 503 with Retry-After when no subscriber can be added."""
+        monkeypatch.setattr(svc.listener.listener, "max_subscribers", 0)
+        response = client.get(f"{LESSON_URL}/events")
+        assert response.status_code == 503
+        assert response.headers["retry-after"]
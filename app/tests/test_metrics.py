@@ -0,0 +1,141 @@
+"""
+Tests for the Prometheus registry, the request instrumentation and the
+slow-request profiler.
+
+The API tests require a running PostgreSQL database with seed data.
+"""
+import json
+import time
+import pytest
+from src import api, services as svc
+from src.utils.metrics import Registry
+
+
+class TestRegistry:
+    """Tests for src.utils.metrics"""
+
+    def test_counter_with_labels(self):
+        registry = Registry()
+        counter = registry.counter("jobs_total", "Jobs.", ("kind",))
+        counter.inc(kind="a")
+        counter.inc(2, kind="a")
+        counter.inc(kind='b"c')
+
+        assert counter.value(kind="a") == 3
+        text = registry.render()
+        assert "# TYPE jobs_total counter" in text
+        assert 'jobs_total{kind="a"} 3' in text
+        assert 'jobs_total{kind="b\\"c"} 1' in text
+
+    def test_histogram_buckets_are_cumulative(self):
+        registry = Registry()
+        histogram = registry.histogram("latency_seconds", "Latency.", buckets=(0.1, 1.0))
+        for value in (0.05, 0.1, 0.5, 3.0):
+            histogram.observe(value)
+
+        lines = registry.render().splitlines()
+        assert 'latency_seconds_bucket{le="0.1"} 2' in lines
+        assert 'latency_seconds_bucket{le="1"} 3' in lines
+        assert 'latency_seconds_bucket{le="+Inf"} 4' in lines
+        assert "latency_seconds_count 4" in lines
+        assert histogram.sum() == pytest.approx(3.65)
+
+    def test_gauge_reads_callback(self):
+        registry = Registry()
+        registry.gauge("pool", "Pool.", lambda: {("idle",): 2}, ("state",))
+        assert 'pool{state="idle"} 2' in registry.render()
+
+    def test_duplicate_name_rejected(self):
+        registry = Registry()
+        registry.counter("x_total", "X.")
+        with pytest.raises(ValueError):
+            registry.counter("x_total", "X.")
+
+
+class TestMetricsEndpoint:
+    """Tests for GET /metrics"""
+
+    route = "/api/v1/tenants/{tenant_id}/users/{user_id}/lessons/{lesson_id}"
+
+    def test_records_round_trips_per_route(self, client):
+        """Should count requests and queries under the route template."""
+        histogram = svc.instrumentation.REQUEST_QUERIES
+        before_requests = histogram.count(route=self.route)
+        before_queries = histogram.sum(route=self.route)
+
+        for _ in range(2):
+            assert client.get("/api/v1/tenants/1/users/10/lessons/100").status_code == 200
+
+        assert histogram.count(route=self.route) == before_requests + 2
+        # at least the lesson/progress query on every request
+        assert histogram.sum(route=self.route) >= before_queries + 2
+
+        response = client.get("/metrics")
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("text/plain")
+        body = response.text
+        assert f'http_request_duration_seconds_count{{method="GET",route="{self.route}",status="200"}}' in body
+        assert "db_pool_checkout_wait_seconds_count" in body
+        assert 'db_pool_connections{state="checked_out"}' in body
+
+    def test_unmatched_paths_share_a_label(self, client):
+        """Should not create one series per unknown path."""
+        client.get("/does-not-exist/1")
+        client.get("/does-not-exist/2")
+        body = client.get("/metrics").text
+        assert 'route="unmatched",status="404"' in body
+        assert "/does-not-exist" not in body
+
+
+class TestSlowRequestProfiler:
+    """Tests for the opt-in profiler and GET /api/profilez"""
+
+    @pytest.fixture
+    def profiling(self, monkeypatch):
+        conf = svc.instrumentation.conf
+        monkeypatch.setattr(conf, "PROFILER_ENABLED", True)
+        monkeypatch.setattr(conf, "PROFILER_SLOW_MS", 0.0)
+        monkeypatch.setattr(conf, "PROFILER_SAMPLE_RATE", 1.0)
+        monkeypatch.setattr(api.v1.admin.conf, "ADMIN_TOKEN", "s3cret")
+        svc.instrumentation.profiler.captures.clear()
+
+    def wait_for_capture(self, client, path: str):
+        # the polls are captured too: look for the request under test
+        for _ in range(50):
+            response = client.get("/api/profilez", headers={"authorization": "Bearer s3cret"})
+            captures = [c for c in response.json()["profiler"]["captures"] if c["path"] == path]
+            if captures:
+                return captures[-1]
+            time.sleep(0.05)
+        pytest.fail("no capture recorded")
+
+    def test_captures_explain_analyze_plans(self, client, profiling):
+        """Should keep the slow request with a plan for its statements."""
+        path = "/api/v1/tenants/1/users/10/lessons/100"
+        assert client.get(path).status_code == 200
+
+        capture = self.wait_for_capture(client, path)
+        assert capture["route"] == TestMetricsEndpoint.route
+        assert capture["queries"] >= 1
+        statement = capture["statements"][0]
+        assert "user_block_progress" in statement["statement"] or "lesson_blocks" in statement["statement"]
+        assert statement["plan"][0]["Plan"]["Actual Loops"] >= 1
+
+    def test_explains_the_upsert(self, client, profiling):
+        """Should explain writes too, without executing them again."""
+        path = "/api/v1/tenants/2/users/20/lessons/200/progress"
+        response = client.put(path, json={"block_id": 202, "status": "seen"})
+        assert response.status_code == 200
+
+        capture = self.wait_for_capture(client, path)
+        assert capture["method"] == "PUT"
+        upsert = next(
+            s for s in capture["statements"] if "INSERT INTO user_block_progress" in s["statement"]
+        )
+        plan = json.dumps(upsert["plan"])
+        assert '"ModifyTable"' in plan
+        assert "Actual Loops" not in plan
+
+    def test_profilez_requires_admin_token(self, client, profiling):
+        """Should refuse the captures (statements and parameters) without the admin token."""
+        assert client.get("/api/profilez").status_code == 401
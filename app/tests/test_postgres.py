@@ -0,0 +1,53 @@
+"""
+Tests for pool sizing and startup warmup (src.services.postgres).
+
+The warmup test requires a running PostgreSQL database.
+"""
+from fastapi.testclient import TestClient
+from src import services as svc
+from src.main import app
+from src.services import hot_path, postgres
+
+
+class TestConnectionBudget:
+    """Tests for budget_pool_sizes"""
+
+    def test_configured_sizes_when_they_fit(self, monkeypatch):
+        """Should keep the configured sizes when the worker's share is larger."""
+        monkeypatch.setattr(postgres.conf, "POSTGRES_POOL_SIZE", 10)
+        monkeypatch.setattr(postgres.conf, "POSTGRES_POOL_MAX_OVERFLOW", 5)
+        assert postgres.budget_pool_sizes(max_connections=200, reserved=13, workers=4) == (10, 5)
+
+    def test_capped_at_the_share(self, monkeypatch):
+        """Should cut overflow first, then the pool, to the share minus the listen connection."""
+        monkeypatch.setattr(postgres.conf, "POSTGRES_POOL_SIZE", 10)
+        monkeypatch.setattr(postgres.conf, "POSTGRES_POOL_MAX_OVERFLOW", 5)
+        monkeypatch.setattr(postgres.conf, "PROGRESS_EVENTS", True)
+        # 100 - 13 over 8 workers: 10 each, one of them listens
+        assert postgres.budget_pool_sizes(max_connections=100, reserved=13, workers=8) == (9, 0)
+        assert postgres.budget_pool_sizes(max_connections=100, reserved=13, workers=16) == (4, 0)
+
+    def test_at_least_one_connection(self):
+        """Should still give every worker one connection when the budget is exhausted."""
+        assert postgres.budget_pool_sizes(max_connections=20, reserved=13, workers=64) == (1, 0)
+
+
+class TestWarmup:
+    """Tests for warmup"""
+
+    def test_pool_open_and_statements_prepared(self):
+        """Should leave pool_size connections open, each with the hot statements prepared."""
+        with TestClient(app) as client:
+            db = svc.postgres.get_engine()
+            assert client.portal.call(postgres.warmup, db) == db.pool.size()
+            assert db.pool.checkedin() == db.pool.size()
+
+            async def cached_statements():
+                async with hot_path.connect(db) as conn:
+                    return [
+                        query in conn.statements
+                        for query in vars(svc.lessons).values()
+                        if isinstance(query, hot_path.HotQuery)
+                    ]
+
+            assert all(client.portal.call(cached_statements))
@@ -0,0 +1,80 @@
+"""
+Tests for the online partitioning of user_block_progress (src.services.progress_partitioning).
+
+These tests require a running PostgreSQL database with seed data. They
+migrate the live table and swap it back, leaving it unpartitioned.
+"""
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy.exc import DBAPIError
+from src import services as svc
+from src.main import app
+from src.services import progress_partitioning
+
+LESSON_URL = "/api/v1/tenants/1/users/11/lessons/100"
+
+
+@pytest.fixture
+def client():
+    """Test client; any migration left over by a failed test is swapped back and dropped."""
+    with TestClient(app) as client:
+        yield client
+        db = svc.postgres.get_engine()
+        state = client.portal.call(progress_partitioning.status, db)
+        if state["migrating"]:
+            if state["partitioned"]:
+                client.portal.call(progress_partitioning.swap, db)
+            client.portal.call(progress_partitioning.abort, db)
+
+
+def call(client, function, *args):
+    return client.portal.call(function, svc.postgres.get_engine(), *args)
+
+
+class TestMigration:
+    """Tests for prepare, backfill, check, swap and abort"""
+
+    def test_online_migration_and_rollback(self, client, no_progress):
+        """Should keep both tables in sync through the migration and the API working on either."""
+        client.put(f"{LESSON_URL}/progress", json={"block_id": 200, "status": "completed"})
+
+        call(client, progress_partitioning.prepare, 4)
+        # written while the backfill has not reached these rows: mirrored
+        client.put(f"{LESSON_URL}/progress", json={"block_id": 201, "status": "seen"})
+        assert call(client, progress_partitioning.backfill, 1) >= 2
+        assert call(client, progress_partitioning.check) == {
+            "standby": "user_block_progress_partitioned", "missing": 0, "extra": 0, "different": 0,
+        }
+
+        call(client, progress_partitioning.swap)
+        assert call(client, progress_partitioning.status)["partitions"] == 4
+        assert all(r["custom"] == r["generic"] == 1 for r in call(client, progress_partitioning.pruning))
+
+        # monotonic upsert on the partitioned table
+        response = client.put(f"{LESSON_URL}/progress", json={"block_id": 200, "status": "seen"})
+        assert response.json()["stored_status"] == "completed"
+        client.put(f"{LESSON_URL}/progress", json={"block_id": 202, "status": "seen"})
+        lesson = client.get(LESSON_URL).json()
+        assert [b["user_progress"] for b in lesson["blocks"]] == ["completed", "seen", "seen"]
+        assert lesson["progress_summary"]["seen_blocks"] == 3
+        assert call(client, svc.progress_rollup.check, [100]) == []
+
+        # the old table was kept current: swap back
+        assert call(client, progress_partitioning.check)["missing"] == 0
+        call(client, progress_partitioning.swap)
+        assert client.get(LESSON_URL).json() == lesson
+        call(client, progress_partitioning.abort)
+        assert call(client, progress_partitioning.status) == {
+            "partitioned": False, "partitions": 0, "migrating": False,
+        }
+
+    def test_steps_out_of_order(self, client):
+        """Should refuse to swap before a backfill, and to prepare twice."""
+        with pytest.raises(DBAPIError, match="nothing to swap"):
+            call(client, progress_partitioning.swap)
+        call(client, progress_partitioning.prepare, 2)
+        with pytest.raises(DBAPIError, match="already in progress"):
+            call(client, progress_partitioning.prepare, 2)
+        with pytest.raises(DBAPIError, match="backfill has not finished"):
+            call(client, progress_partitioning.swap)
+        assert call(client, progress_partitioning.pruning) == []
@@ -0,0 +1,168 @@
+"""
+Tests for bulk progress import/export (src.services.progress_transfer).
+
+These tests require a running PostgreSQL database with seed data.
+"""
+import asyncio
+import json
+import pytest
+from fastapi.testclient import TestClient
+from src import api
+from src import services as svc
+from src.main import app
+from src.services.progress_transfer import iter_lines
+from tests.conftest import execute_sql
+
+IMPORT_URL = "/api/v1/admin/tenants/1/progress/import"
+EXPORT_URL = "/api/v1/admin/tenants/1/progress/export"
+
+
+ADMIN_TOKEN = "s3cret"
+
+
+@pytest.fixture(scope="module")
+def client():
+    """Test client sending the admin token, in place of the shared one."""
+    with pytest.MonkeyPatch.context() as patch:
+        patch.setattr(api.v1.admin.conf, "ADMIN_TOKEN", ADMIN_TOKEN)
+        with TestClient(app, headers={"authorization": f"Bearer {ADMIN_TOKEN}"}) as client:
+            yield client
+
+
+def statuses(client) -> dict[int, str]:
+    return dict(execute_sql(
+        client, "SELECT block_id, status FROM user_block_progress WHERE user_id = 11 AND lesson_id = 100"
+    ))
+
+
+class TestIterLines:
+    """Tests for iter_lines"""
+
+    def test_lines_across_chunks(self):
+        """Should split lines across chunk boundaries, numbering blank lines too."""
+        async def run():
+            async def chunks():
+                for chunk in (b"a,b\r\n1,", b"2\n\n3,4", b"\n5,6"):
+                    yield chunk
+            return [line async for line in iter_lines(chunks())]
+
+        assert asyncio.run(run()) == [(1, b"a,b"), (2, b"1,2"), (4, b"3,4"), (5, b"5,6")]
+
+
+class TestProgressImport:
+    """Tests for POST /api/v1/admin/tenants/{tenant_id}/progress/import"""
+
+    def test_import_csv(self, client, no_progress):
+        """Should merge valid rows, keep the highest status and report rejected lines."""
+        body = "\n".join([
+            "user_id,lesson_id,block_id,status,updated_at",
+            "11,100,200,completed,2025-01-01T00:00:00Z",
+            "11,100,200,seen,2025-02-01T00:00:00Z",
+            "11,100,201,seen",
+            "20,100,200,seen",
+            "11,200,200,seen",
+            "11,100,999,seen",
+            "11,100,202,done",
+            "eleven,100,202,seen",
+        ])
+        response = client.post(IMPORT_URL, content=body, headers={"content-type": "text/csv"})
+        assert response.status_code == 200
+
+        report = response.json()
+        assert report["received"] == 8
+        assert (report["inserted"], report["upgraded"], report["unchanged"]) == (2, 0, 0)
+        assert report["rejected"] == 5
+        assert report["rejects"] == [
+            {"line": 5, "reason": "user_not_in_tenant"},
+            {"line": 6, "reason": "lesson_not_in_tenant"},
+            {"line": 7, "reason": "block_not_in_lesson"},
+            {"line": 8, "reason": "invalid_status"},
+            {"line": 9, "reason": "malformed"},
+        ]
+        assert statuses(client) == {200: "completed", 201: "seen"}
+
+    def test_import_is_monotonic(self, client, no_progress):
+        """Should upgrade seen to completed, never downgrade, and change nothing on re-import."""
+        first = '{"user_id": 11, "lesson_id": 100, "block_id": 200, "status": "completed"}\n' \
+                '{"user_id": 11, "lesson_id": 100, "block_id": 201, "status": "seen"}\n'
+        second = '{"user_id": 11, "lesson_id": 100, "block_id": 200, "status": "seen"}\n' \
+                 '{"user_id": 11, "lesson_id": 100, "block_id": 201, "status": "completed"}\n'
+        client.post(f"{IMPORT_URL}?format=ndjson", content=first)
+
+        report = client.post(f"{IMPORT_URL}?format=ndjson", content=second).json()
+        assert (report["inserted"], report["upgraded"], report["unchanged"]) == (0, 1, 1)
+        assert statuses(client) == {200: "completed", 201: "completed"}
+
+        report = client.post(f"{IMPORT_URL}?format=ndjson", content=second).json()
+        assert (report["inserted"], report["upgraded"], report["unchanged"]) == (0, 0, 2)
+
+    def test_undecodable_line_rejected(self, client, no_progress):
+        """Should reject a line that is not UTF-8 as malformed and import the others."""
+        body = b'{"user_id": 11, "lesson_id": 100, "block_id": 200, "status": "seen"}\n' \
+               b'{"user_id": 11, "lesson_id": 100, "block_id": 201, "status": "se\xffen"}\n'
+        response = client.post(f"{IMPORT_URL}?format=ndjson", content=body)
+        assert response.status_code == 200
+        assert response.json()["rejects"] == [{"line": 2, "reason": "malformed"}]
+        assert statuses(client) == {200: "seen"}
+
+    def test_rollup_rebuilt(self, client, no_progress):
+        """Should leave the progress rollup consistent and visible on the lesson."""
+        body = "user_id,lesson_id,block_id,status\n" + "".join(
+            f"11,100,{block_id},completed\n" for block_id in (200, 201, 202)
+        )
+        client.post(IMPORT_URL, content=body)
+
+        assert client.portal.call(svc.progress_rollup.check, svc.postgres.get_engine(), [100]) == []
+        summary = client.get("/api/v1/tenants/1/users/11/lessons/100").json()["progress_summary"]
+        assert summary["completed_blocks"] == 3
+        assert summary["completed"] is True
+
+    def test_errors(self, client):
+        """Should 404 for an unknown tenant and 400 for a CSV header without required fields."""
+        assert client.post("/api/v1/admin/tenants/999/progress/import", content="").status_code == 404
+        response = client.post(IMPORT_URL, content="user_id,lesson_id\n11,100\n")
+        assert response.status_code == 400
+        assert "block_id" in response.json()["detail"]
+
+    def test_admin_token(self, client, monkeypatch):
+        """Should require the bearer token, and refuse everyone when ADMIN_TOKEN is unset."""
+        assert client.get(EXPORT_URL, headers={"authorization": "Bearer wrong"}).status_code == 401
+        assert client.get(EXPORT_URL, headers={"authorization": ""}).status_code == 401
+        assert client.get(EXPORT_URL).status_code == 200
+
+        monkeypatch.setattr(api.v1.admin.conf, "ADMIN_TOKEN", "")
+        assert client.get(EXPORT_URL).status_code == 403
+        assert client.post(IMPORT_URL, content="").status_code == 403
+
+
+class TestProgressExport:
+    """Tests for GET /api/v1/admin/tenants/{tenant_id}/progress/export"""
+
+    def test_export_csv(self, client):
+        """Should stream the tenant's progress only, in the import format."""
+        response = client.get(EXPORT_URL)
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("text/csv")
+
+        lines = response.text.splitlines()
+        assert lines[0] == "user_id,lesson_id,block_id,status,updated_at"
+        users = {int(line.split(",")[0]) for line in lines[1:]}
+        assert users <= {10, 11}
+        assert "10,100,200,completed," in response.text
+
+    def test_export_ndjson_round_trip(self, client, no_progress):
+        """Should export rows that import back unchanged."""
+        client.post(IMPORT_URL, content="user_id,lesson_id,block_id,status\n11,100,201,seen\n")
+
+        response = client.get(f"{EXPORT_URL}?format=ndjson")
+        rows = [json.loads(line) for line in response.text.splitlines()]
+        assert {"user_id": 11, "lesson_id": 100, "block_id": 201, "status": "seen"}.items() \
+            <= next(r for r in rows if r["user_id"] == 11).items()
+
+        report = client.post(f"{IMPORT_URL}?format=ndjson", content=response.content).json()
+        assert report["rejected"] == 0
+        assert report["inserted"] == report["upgraded"] == 0
+
+    def test_unknown_tenant(self, client):
+        """Should 404 for an unknown tenant."""
+        assert client.get("/api/v1/admin/tenants/999/progress/export").status_code == 404
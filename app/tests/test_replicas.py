@@ -0,0 +1,145 @@
+"""
+Tests for read-replica routing (src.services.replicas).
+
+The routing tests use stand-in engines. The replication test needs a
+streaming standby of the test database in POSTGRES_REPLICA_URLS (see
+docker-compose.replica.yml) and is skipped without one.
+"""
+import asyncio
+import time
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import text
+from src import services as svc
+from src.main import app
+from src.services.replicas import ReplicaRouter, format_lsn, parse_lsn
+
+PRIMARY = object()
+
+
+def started_router(replicas: int = 2, max_lag: float = 5.0) -> ReplicaRouter:
+    """Router with stand-in engines, as after `start`, without a poll loop."""
+    router = ReplicaRouter([f"postgresql+asyncpg://replica{i}/db" for i in range(replicas)], 0.1, max_lag)
+    router._primary = PRIMARY
+    for i, replica in enumerate(router.replicas):
+        replica.engine = f"replica{i}"
+        replica.lsn = 100
+        replica.caught_up_at = time.monotonic()
+    return router
+
+
+class TestReplicaRouter:
+    """Tests for ReplicaRouter.for_read"""
+
+    def test_primary_when_not_started(self):
+        """Should read from the primary without replicas or before start."""
+        assert ReplicaRouter([], 0.1, 5.0).for_read(PRIMARY, 10) is PRIMARY
+        assert ReplicaRouter(["postgresql+asyncpg://r/db"], 0.1, 5.0).for_read(PRIMARY, 10) is PRIMARY
+
+    def test_round_robin_over_current_replicas(self):
+        """Should spread reads over replicas that are within max_lag."""
+        router = started_router()
+        assert {router.for_read(PRIMARY, 10) for _ in range(4)} == {"replica0", "replica1"}
+        assert router.replica_reads == 4
+
+    def test_lagging_or_failing_replicas_get_no_reads(self):
+        """Should skip replicas past max_lag or with a failed poll."""
+        router = started_router()
+        router.replicas[0].caught_up_at = time.monotonic() - 10
+        assert {router.for_read(PRIMARY, 10) for _ in range(4)} == {"replica1"}
+
+        router.replicas[1].error = "ConnectionRefusedError"
+        assert router.for_read(PRIMARY, 10) is PRIMARY
+        assert router.primary_reads == 1
+
+    def test_read_after_write_token(self):
+        """Should keep reads carrying a write token on the primary until a replica replayed past it."""
+        router = started_router()
+        router.read_after(format_lsn(150))
+
+        assert router.for_read(PRIMARY, 10) is PRIMARY
+        assert router.sticky_reads == 1
+
+        router.replicas[1].lsn = 150
+        assert router.for_read(PRIMARY, 10) == "replica1"
+
+        # requests without a token (or with a malformed one) are not affected
+        for token in (None, "garbage"):
+            router.read_after(token)
+            assert router.for_read(PRIMARY, 10) != PRIMARY
+
+    def test_own_write_token(self):
+        """Should hand out the commit LSN of the request's write, and read it back."""
+        router = started_router()
+
+        async def commit_lsn():
+            return 150
+
+        async def run():
+            router._commit_lsn = commit_lsn
+            router.read_after(None)
+            await router.mark_write()
+            return router.written(), router.for_read(PRIMARY, 10)
+
+        assert asyncio.run(run()) == ("0/96", PRIMARY)
+        assert router.written() is None
+
+    def test_flushed_writes(self):
+        """Should keep a user whose buffered writes were flushed on the primary until replayed."""
+        router = started_router()
+
+        async def commit_lsn():
+            return 150
+
+        router._commit_lsn = commit_lsn
+        asyncio.run(router.mark_flushed({10}))
+        assert router.for_read(PRIMARY, 10) is PRIMARY
+        # other users are not affected
+        assert router.for_read(PRIMARY, 11) != PRIMARY
+
+        router.replicas[0].lsn = 150
+        assert router.for_read(PRIMARY, 10) == "replica0"
+
+    def test_lsn_text_form(self):
+        """Should round-trip the pg_lsn text form and reject malformed tokens."""
+        assert format_lsn((0x16 << 32) + 0xB374D848) == "16/B374D848"
+        assert parse_lsn("16/B374D848") == (0x16 << 32) + 0xB374D848
+        assert [parse_lsn(t) for t in (None, "", "16", "x/1", "-1/0", "0/100000000")] == [None] * 6
+
+
+@pytest.mark.skipif(not svc.replicas.router.enabled, reason="POSTGRES_REPLICA_URLS not set")
+class TestReplication:
+    """Tests against a streaming standby"""
+
+    def test_progress_read_after_write(self):
+        """Should serve a user's own write on the next GET, and later reads from the replica."""
+        with TestClient(app) as client:
+            router = svc.replicas.router
+            url = "/api/v1/tenants/1/users/11/lessons/100"
+            assert router.stats()["enabled"]
+
+            async def reset():
+                async with svc.postgres.get_engine().begin() as conn:
+                    await conn.execute(text("DELETE FROM user_block_progress WHERE user_id = 11 AND lesson_id = 100"))
+
+            client.portal.call(reset)
+            for block_id in (200, 201, 202):
+                response = client.put(f"{url}/progress", json={"block_id": block_id, "status": "completed"})
+                token = response.headers["x-progress-lsn"]
+                # quoted in the Set-Cookie header (it contains "/")
+                assert client.cookies["progress_lsn"].strip('"') == token
+                lesson = client.get(url).json()
+                statuses = {b["id"]: b["user_progress"] for b in lesson["blocks"]}
+                assert statuses[block_id] == "completed"
+
+            # the token alone, as another worker would receive it
+            client.cookies.clear()
+            lesson = client.get(url, headers={"X-Progress-LSN": token}).json()
+            assert lesson["progress_summary"]["completed"] is True
+
+            deadline = time.monotonic() + 5
+            reads = router.replica_reads
+            while router.replica_reads == reads and time.monotonic() < deadline:
+                time.sleep(router.interval)
+                client.get(url)
+            assert router.replica_reads > reads
@@ -0,0 +1,106 @@
+"""
+Tests for the shared-memory lesson skeleton cache (src.utils.shm_cache).
+
+The lesson test requires a running PostgreSQL database with seed data.
+"""
+import multiprocessing
+from fastapi.testclient import TestClient
+from src import services as svc
+from src.main import app
+from src.utils.shm_cache import SLOT, SharedCache
+
+SIZE = 1 << 16
+
+
+def fill_in_child(path: str, size: int) -> None:
+    SharedCache(path, size).set((1, 100), 7, b"from the child")
+
+
+class TestSharedCache:
+    """Tests for SharedCache"""
+
+    def test_set_and_get(self, tmp_path):
+        """Should return a blob for its key and version only."""
+        cache = SharedCache(str(tmp_path / "cache"), SIZE)
+        assert cache.get((1, 100), 1) is None
+        assert cache.set((1, 100), 1, b"blob")
+
+        assert cache.get((1, 100), 1) == b"blob"
+        assert cache.get((1, 100), 2) is None
+        assert cache.get((2, 100), 1) is None
+        assert (cache.hits, cache.misses) == (1, 3)
+
+    def test_shared_between_processes(self, tmp_path):
+        """Should serve a blob filled by another process."""
+        path = str(tmp_path / "cache")
+        cache = SharedCache(path, SIZE)
+        cache.get((1, 100), 7)
+
+        process = multiprocessing.get_context("spawn").Process(target=fill_in_child, args=(path, SIZE))
+        process.start()
+        process.join(30)
+
+        assert cache.get((1, 100), 7) == b"from the child"
+        assert cache.stats()["fills"] == 1
+
+    def test_bounded_with_oldest_evicted(self, tmp_path):
+        """Should stay within its size, overwriting the oldest blobs first."""
+        cache = SharedCache(str(tmp_path / "cache"), SIZE)
+        blob = b"x" * 1000
+        for lesson_id in range(200):
+            assert cache.set((1, lesson_id), 1, blob)
+
+        assert (tmp_path / cache.path.rsplit("/", 1)[1]).stat().st_size == SIZE
+        assert cache.get((1, 0), 1) is None
+        assert cache.get((1, 199), 1) == blob
+        assert cache.stats()["used"] <= cache.capacity
+
+    def test_torn_blob_rejected(self, tmp_path):
+        """Should miss, not return corrupt bytes, when a blob changed under its slot."""
+        cache = SharedCache(str(tmp_path / "cache"), SIZE)
+        cache.set((1, 100), 1, b"blob")
+        cache._map[cache.data_at] = ord("X")
+
+        assert cache.get((1, 100), 1) is None
+        assert cache.torn == 1
+
+    def test_writer_in_progress_is_a_miss(self, tmp_path):
+        """Should not read a slot whose seqlock is odd."""
+        cache = SharedCache(str(tmp_path / "cache"), SIZE)
+        cache.set((1, 100), 1, b"blob")
+        at = next(at for at in cache._probe(1, 100) if SLOT.unpack_from(cache._map, at)[5])
+        cache._map[at] += 1
+
+        assert cache.get((1, 100), 1) is None
+
+    def test_too_large_or_disabled(self, tmp_path):
+        """Should refuse blobs over a quarter of the ring, and do nothing when disabled."""
+        cache = SharedCache(str(tmp_path / "cache"), SIZE)
+        assert not cache.set((1, 100), 1, b"x" * SIZE)
+
+        disabled = SharedCache(str(tmp_path / "off"), 0)
+        assert not disabled.enabled
+        assert not disabled.set((1, 100), 1, b"blob")
+        assert disabled.get((1, 100), 1) is None
+
+
+class TestSharedSkeletons:
+    """Tests for the shared tier of get_lesson_skeleton"""
+
+    def test_skeleton_served_from_shared_cache(self, tmp_path, monkeypatch):
+        """Should fill the shared cache on a miss and serve other workers' misses from it."""
+        shared = SharedCache(str(tmp_path / "cache"), 1 << 20)
+        monkeypatch.setattr(svc.lessons, "shared_skeletons", shared)
+        url = "/api/v1/tenants/1/users/10/lessons/100"
+
+        with TestClient(app) as client:
+            svc.lessons.skeleton_cache.clear()
+            expected = client.get(url).json()
+            assert shared.stats()["fills"] == 1
+
+            # as in another worker: nothing in the process cache
+            svc.lessons.skeleton_cache.clear()
+            leaders = svc.lessons.skeleton_flights.leaders
+            assert client.get(url).json() == expected
+            assert shared.hits == 1
+            assert svc.lessons.skeleton_flights.leaders == leaders
@@ -0,0 +1,150 @@
+"""
+Tests for request coalescing (src.services.singleflight).
+
+The lesson test requires a running PostgreSQL database with seed data.
+"""
+import asyncio
+from fastapi.testclient import TestClient
+from src import services as svc
+from src.main import app
+from src.services.singleflight import SingleFlight
+
+
+class TestSingleFlight:
+    """Tests for SingleFlight.do"""
+
+    def test_concurrent_calls_share_one_load(self):
+        """Should run the load once for concurrent callers of a key, and again afterwards."""
+        flight = SingleFlight("test")
+        loads = []
+
+        async def load():
+            loads.append(1)
+            await asyncio.sleep(0.01)
+            return object()
+
+        async def run():
+            results = await asyncio.gather(*(flight.do("k", load) for _ in range(5)))
+            later = await flight.do("k", load)
+            return results, later
+
+        results, later = asyncio.run(run())
+        assert len(loads) == 2
+        assert all(r is results[0] for r in results)
+        assert later is not results[0]
+        assert flight.stats() == {"in_flight": 0, "leaders": 2, "followers": 4, "coalesced_ratio": 0.6667}
+
+    def test_keys_do_not_share(self):
+        """Should not coalesce different keys."""
+        flight = SingleFlight("test")
+
+        async def run():
+            async def load(value):
+                await asyncio.sleep(0.01)
+                return value
+            return await asyncio.gather(flight.do("a", lambda: load(1)), flight.do("b", lambda: load(2)))
+
+        assert asyncio.run(run()) == [1, 2]
+        assert flight.leaders == 2
+
+    def test_exception_shared(self):
+        """Should raise the leader's exception in its followers."""
+        flight = SingleFlight("test")
+
+        async def load():
+            await asyncio.sleep(0.01)
+            raise ValueError("boom")
+
+        async def run():
+            return await asyncio.gather(*(flight.do("k", load) for _ in range(3)), return_exceptions=True)
+
+        assert [type(r) for r in asyncio.run(run())] == [ValueError] * 3
+        assert flight.stats()["in_flight"] == 0
+
+    def test_cancelled_leader_hands_over(self):
+        """Should let a follower run the load when the leader is cancelled."""
+        flight = SingleFlight("test")
+        loads = []
+
+        async def load():
+            loads.append(1)
+            await asyncio.sleep(0.05)
+            return len(loads)
+
+        async def run():
+            leader = asyncio.create_task(flight.do("k", load))
+            await asyncio.sleep(0)
+            follower = asyncio.create_task(flight.do("k", load))
+            await asyncio.sleep(0.01)
+            leader.cancel()
+            return await follower
+
+        assert asyncio.run(run()) == 2
+        assert len(loads) == 2
+
+
+class TestLessonCoalescing:
+    """Tests for coalesced lesson skeleton loads"""
+
+    def test_concurrent_assemblies_share_the_skeleton_query(self):
+        """Should load a lesson's skeleton once for concurrent requests of different users."""
+        flights = svc.lessons.skeleton_flights
+        with TestClient(app) as client:
+            async def run():
+                svc.lessons.skeleton_cache.clear()
+                db = svc.postgres.get_engine()
+                return await asyncio.gather(*(
+                    svc.lessons.get_lesson(db, 1, user_id, 100) for user_id in (10, 11) * 4
+                ))
+
+            leaders, followers = flights.leaders, flights.followers
+            hits = svc.lessons.skeleton_cache.hits
+            lessons = client.portal.call(run)
+            stats = client.get("/api/cachez").json()["lesson_skeleton_flights"]
+
+        assert flights.leaders - leaders == 1
+        # requests arriving after the load finished hit the cache instead
+        assert flights.followers - followers + svc.lessons.skeleton_cache.hits - hits == 7
+        assert flights.followers > followers
+        assert stats["in_flight"] == 0
+        assert len({tuple(b["id"] for b in lesson["blocks"]) for lesson in lessons}) == 1
+        # progress stays per user
+        assert {lesson["blocks"][0]["user_progress"] for lesson in lessons[::2]} == {"completed"}
+
+
+    def test_followers_hold_no_connection(self, monkeypatch):
+        """Should check out one connection for the skeleton query of concurrent cold reads."""
+        fetch = svc.lessons.hot_path.fetch
+        checked_out = []
+
+        def in_use():
+            # primary and replica pools: the reads may be routed to either
+            engines = [svc.postgres.get_engine()]
+            engines += [r.engine for r in svc.replicas.router.replicas if r.engine is not None]
+            return sum(engine.pool.checkedout() for engine in engines)
+
+        async def slow_skeleton_fetch(conn, query, params):
+            if query is svc.lessons.LESSON_SKELETON:
+                # let the other reads join the flight
+                await asyncio.sleep(0.05)
+                checked_out.append(in_use())
+            return await fetch(conn, query, params)
+
+        with TestClient(app) as client:
+            monkeypatch.setattr(svc.lessons.hot_path, "fetch", slow_skeleton_fetch)
+
+            async def run():
+                svc.lessons.skeleton_cache.clear()
+                db = svc.postgres.get_engine()
+                idle = in_use()
+                lessons = await asyncio.gather(*(
+                    svc.lessons.get_lesson_json(db, 1, user_id, 100) for user_id in (10, 11) * 4
+                ))
+                return idle, lessons
+
+            followers = svc.lessons.skeleton_flights.followers
+            idle, lessons = client.portal.call(run)
+
+        assert all(lesson is not None for lesson in lessons)
+        assert svc.lessons.skeleton_flights.followers - followers == 7
+        assert checked_out == [idle + 1]
@@ -1,7 +1,7 @@
 #!/usr/bin/env bash
 set -euo pipefail
 
-BASE_URL="${BASE_URL:-http://localhost:8000}"
+BASE_URL="${BASE_URL:-http://localhost:8000/api/v1}"
 
 echo "1) GET assembled lesson for tenant=1 user=10 lesson=100"
 curl -sS "$BASE_URL/tenants/1/users/10/lessons/100" | jq .